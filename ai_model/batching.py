@@ -0,0 +1,115 @@
+"""
+Micro-batching stage in front of the food classifier.
+
+Concurrent callers (Pi camera, Android, web UI) submit one image each; a single
+worker thread groups pending images into batches of up to max_batch_size, or
+whatever arrived within max_latency_ms of the first one, runs one batched
+forward pass and hands each caller its own result.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("FOOD_BATCH_MAX", "8"))
+DEFAULT_MAX_LATENCY_MS = float(os.environ.get("FOOD_BATCH_WAIT_MS", "5"))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects single-image requests and runs them through classify_batch in groups.
+
+    classify_batch takes a list of inputs and returns one result per input, or a
+    Future of that list (e.g. from a process pool); the worker then moves on to
+    the next batch without waiting, so several batches can be in flight.
+    """
+
+    def __init__(self, classify_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_latency_ms=DEFAULT_MAX_LATENCY_MS):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self._classify_batch = classify_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency_s = max_latency_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches_run = 0
+        self.items_run = 0
+        self._worker = threading.Thread(target=self._run, name="food-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue one input; returns a Future resolving to its result."""
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def classify(self, item, timeout=None):
+        """Blocking submit(): wait for this caller's own result."""
+        return self.submit(item).result(timeout=timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            items = [item for item, _ in batch]
+            try:
+                results = self._classify_batch(items)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+            if isinstance(results, Future):
+                results.add_done_callback(lambda f, batch=batch: self._finish_future(batch, f))
+            else:
+                self._finish(batch, results)
+
+    def _finish(self, batch, results):
+        self.batches_run += 1
+        self.items_run += len(batch)
+        for (_, fut), result in zip(batch, results):
+            fut.set_result(result)
+
+    def _finish_future(self, batch, results):
+        if results.exception() is not None:
+            self._fail(batch, results.exception())
+        else:
+            self._finish(batch, results.result())
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, fut in batch:
+            fut.set_exception(error)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency_s * 1000.0,
+            "queued": self._queue.qsize(),
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "avg_batch_size": round(self.items_run / self.batches_run, 2) if self.batches_run else None,
+        }
@@ -1,95 +1,290 @@
+"""
+Food classification entry points used by the web app.
+
+Importing this module is cheap: no TensorFlow or TFLite import happens until
+a backend is loaded (ai_model.model_registry), on warm-up or on first use.
+Sensor-only nodes can turn classification off with SMART_MEAL_ML=0 (or
+`python web_app/app.py --no-ml`); the classify functions then raise
+ClassifierDisabled.
+"""
 import os
+import threading
+from collections import OrderedDict
 
-TF_AVAILABLE = False
-TFLITE_AVAILABLE = False
-TFLITE_MODEL_PATH = os.environ.get("FOOD_TFLITE_MODEL") or os.path.join(
-    os.path.dirname(__file__), "food_model.tflite"
+from ai_model.batching import MicroBatcher
+from ai_model.inference_pool import INFERENCE_PROCESSES, INFERENCE_QUEUE_MAX, INFERENCE_TIMEOUT_S, InferencePool
+from ai_model.model_registry import (
+    IMAGENET_TO_FOOD,
+    TFLITE_MODEL_PATH,
+    get_registry,
+    warm_up,
+    warm_up_in_background,
 )
+from ai_model.preprocess import plate_regions
+from ai_model.result_cache import cache_key, get_result_cache
+
+ML_ENABLED = os.environ.get("SMART_MEAL_ML", "1") != "0"
+# Tiles per side for multi-item plates (classify_regions): 2 -> whole image + 4 tiles.
+PLATE_GRID = int(os.environ.get("PLATE_GRID", "2"))
+
+
+class ClassifierDisabled(RuntimeError):
+    """Food classification is turned off on this node (SMART_MEAL_ML=0 / --no-ml)."""
 
-try:
-    import tensorflow as tf
-    import numpy as np
-    from tensorflow.keras.applications.mobilenet_v2 import (
-        MobileNetV2,
-        preprocess_input,
-        decode_predictions,
-    )
-    from tensorflow.keras.preprocessing import image
-    TF_AVAILABLE = True
-except ImportError:
-    pass
-
-try:
-    import tflite_runtime.interpreter as tflite
-    TFLITE_AVAILABLE = True
-except ImportError:
-    pass
-
-
-# ImageNet class index -> our nutrition DB key (for TFLite with ImageNet model)
-IMAGENET_TO_FOOD = {
-    949: "orange",
-    952: "banana",
-    967: "apple",      # Granny_Smith
-    927: "pizza",
-    933: "french_fries",
-    964: "salad",      # head cabbage
-}
+
+def disable_ml():
+    """Turn classification off for this process (sensor-only node)."""
+    global ML_ENABLED
+    ML_ENABLED = False
+
+
+def _require_ml():
+    if not ML_ENABLED:
+        raise ClassifierDisabled("Food recognition is disabled on this node")
 
 
 def _classify_tflite(img_path):
-    """Run TFLite model (e.g. on Pi). Expects model with ImageNet-style input 224x224, float."""
-    if not os.path.isfile(TFLITE_MODEL_PATH):
-        return None
-    interp = tflite.Interpreter(model_path=TFLITE_MODEL_PATH)
-    interp.allocate_tensors()
-    input_idx = interp.get_input_details()[0]["index"]
-    input_shape = interp.get_input_details()[0]["shape"]
-    try:
-        from PIL import Image
-        import numpy as np
-        img = Image.open(img_path).resize((input_shape[1], input_shape[2]))
-        x = np.array(img, dtype=np.float32) / 127.5 - 1.0
-        if len(x.shape) == 2:
-            x = np.stack([x] * 3, axis=-1)
-        x = np.expand_dims(x, axis=0)
-        interp.set_tensor(input_idx, x)
-        interp.invoke()
-        out = interp.get_tensor(interp.get_output_details()[0]["index"])
-        idx = int(out[0].argmax())
-        prob = float(out[0].max())
-        # Map ImageNet index to food label so get_food_label + DB lookup can work
-        label = IMAGENET_TO_FOOD.get(idx, f"class_{idx}")
-        return [("tflite", label, prob)]
-    except Exception:
+    """Run TFLite model (e.g. on Pi) using the shared, already-allocated interpreter."""
+    backend = get_registry().get("tflite")
+    if backend is None:
         return None
+    return backend.classify(img_path)
+
+
+def _normalize(results):
+    return [(str(s), str(label), float(p)) for s, label, p in (results or [])]
+
+
+def _classifier_key(image_bytes, kind="classifier"):
+    """Cache key for image bytes under the model that answers now (backend, model file, labels)."""
+    return cache_key(image_bytes, kind, get_registry().fingerprint())
+
+
+def _cacheable(result):
+    return get_registry().cacheable(result)
+
+
+def _cached(image, compute):
+    """Serve results for raw image bytes from the content-addressed cache."""
+    if not isinstance(image, (bytes, bytearray)):
+        return compute()
+    key = _classifier_key(bytes(image))
+    result = get_result_cache().get_or_compute(key, lambda: _normalize(compute()), _cacheable)
+    return [tuple(r) for r in result] if result else result
 
 
 def classify_food(img_path=None):
-    if TFLITE_AVAILABLE:
-        result = _classify_tflite(img_path)
-        if result:
-            return result
-    if TF_AVAILABLE:
-        import numpy as np
-        from tensorflow.keras.applications.mobilenet_v2 import (
-            MobileNetV2,
-            preprocess_input,
-            decode_predictions,
-        )
-        from tensorflow.keras.preprocessing import image
-        model = MobileNetV2(weights="imagenet")
-        img = image.load_img(img_path, target_size=(224, 224))
-        x = image.img_to_array(img)
-        x = np.expand_dims(x, axis=0)
-        x = preprocess_input(x)
-        preds = model.predict(x)
-        return decode_predictions(preds, top=3)[0]
+    """Classify a food image with the first working backend (TFLite, Keras, then mock).
+
+    img_path may also be raw bytes, a file-like stream or a NumPy array; images are
+    decoded in memory by ai_model.preprocess. Models are loaded once per process
+    by ai_model.model_registry and reused.
+    """
+    _require_ml()
+    result = _cached(img_path, lambda: get_registry().classify(img_path))
+    if result:
+        return result
     return [("mock", "apple", 0.95)]
 
 
+_batcher = None
+_pool = None
+_batcher_lock = threading.Lock()
+
+
+def get_inference_pool():
+    """Shared process pool when INFERENCE_PROCESSES > 0, else None (inference runs in-thread).
+
+    The queue holds at least one plate's regions (PLATE_GRID ** 2 + 1), which
+    classify_regions() reserves together.
+    """
+    global _pool
+    if _pool is None and INFERENCE_PROCESSES > 0:
+        with _batcher_lock:
+            if _pool is None:
+                _pool = InferencePool(INFERENCE_PROCESSES, max(INFERENCE_QUEUE_MAX, PLATE_GRID * PLATE_GRID + 1))
+    return _pool
+
+
+def get_batcher():
+    """Shared micro-batcher (FOOD_BATCH_MAX images or FOOD_BATCH_WAIT_MS per forward pass)."""
+    global _batcher
+    if _batcher is None:
+        pool = get_inference_pool()
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(pool.classify_batch if pool else get_registry().classify_batch)
+    return _batcher
+
+
+def _reset_batcher():
+    # The batcher's worker thread and the pool's processes don't survive fork (gunicorn preload_app).
+    global _batcher, _pool
+    _batcher = _pool = None
+
+
+os.register_at_fork(after_in_child=_reset_batcher)
+
+
+def queue_stats():
+    """Images waiting in the batcher and the inference pool, without starting either."""
+    batcher, pool = _batcher, _pool
+    pool_stats = pool.stats() if pool else {}
+    return {
+        "batcher_queued": batcher.stats()["queued"] if batcher else 0,
+        "pool_pending": pool_stats.get("pending", 0),
+        "pool_max_pending": pool_stats.get("max_pending", 0),
+        "pool_rejected": pool_stats.get("rejected", 0),
+    }
+
+
+def _submit(image):
+    """Queue one image on the batcher; raises InferenceBusy if the process pool is full."""
+    pool = get_inference_pool()
+    if pool is not None:
+        pool.reserve()
+    fut = get_batcher().submit(image)
+    if pool is not None:
+        fut.add_done_callback(lambda _: pool.release())
+    return fut
+
+
+def _submit_many(images):
+    """Queue several images at once; they share forward passes on the batcher.
+
+    Queue room for all of them is reserved up front, so either every image is
+    queued or InferenceBusy is raised and none is.
+    """
+    pool = get_inference_pool()
+    if pool is not None:
+        pool.reserve(len(images))
+    batcher = get_batcher()
+    futures = [batcher.submit(image) for image in images]
+    if pool is not None:
+        for fut in futures:
+            fut.add_done_callback(lambda _: pool.release())
+    return futures
+
+
+def classify_regions(image, grid=None, timeout=None):
+    """Classify the whole plate and its tiles (ai_model.preprocess.plate_regions).
+
+    Returns one ranked result list per region, whole image first. The image is
+    decoded once and all regions go to the batcher together, so with
+    FOOD_BATCH_MAX >= grid * grid + 1 they run in a single forward pass.
+    Results for raw bytes are cached like classify_food()'s.
+    """
+    _require_ml()
+    grid = PLATE_GRID if grid is None else grid
+    if timeout is None and get_inference_pool() is not None:
+        timeout = INFERENCE_TIMEOUT_S
+
+    def compute():
+        futures = _submit_many(plate_regions(image, grid))
+        return [_normalize(f.result(timeout=timeout)) for f in futures]
+
+    if not isinstance(image, (bytes, bytearray)):
+        return compute()
+    key = _classifier_key(bytes(image), f"classifier-regions-{grid}")
+    regions = get_result_cache().get_or_compute(
+        key, compute, lambda regions: bool(regions) and all(_cacheable(r) for r in regions))
+    return [[tuple(r) for r in results] for results in regions]
+
+
+def classify_food_batched(img_path=None, timeout=None):
+    """Like classify_food(), but shares a forward pass with concurrent callers.
+
+    With a process pool, waits at most INFERENCE_TIMEOUT_S by default
+    (concurrent.futures.TimeoutError) and raises InferenceBusy when the queue is full.
+    """
+    _require_ml()
+    if timeout is None and get_inference_pool() is not None:
+        timeout = INFERENCE_TIMEOUT_S
+    result = _cached(img_path, lambda: _submit(img_path).result(timeout=timeout))
+    if result:
+        return result
+    return [("mock", "apple", 0.95)]
+
+
+def classify_foods_batched(images, timeout=None):
+    """classify_food_batched() for several images (e.g. a bulk upload), one result list each.
+
+    Cached images are answered from the result cache; the rest are queued
+    together (one InferenceBusy check for all) and share forward passes. With
+    a process pool, more images than its queue holds go in queue-sized chunks,
+    each waited for before the next is queued.
+    """
+    _require_ml()
+    if timeout is None and get_inference_pool() is not None:
+        timeout = INFERENCE_TIMEOUT_S
+    cache = get_result_cache()
+    keys = [_classifier_key(bytes(image)) for image in images]
+    results = [cache.get(key) for key in keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    pool = get_inference_pool()
+    chunk = pool.max_pending if pool is not None else max(len(todo), 1)
+    for start in range(0, len(todo), chunk):
+        part = todo[start:start + chunk]
+        futures = _submit_many([images[i] for i in part])
+        for i, fut in zip(part, futures):
+            results[i] = _normalize(fut.result(timeout=timeout))
+            if _cacheable(results[i]):
+                cache.put(keys[i], results[i])
+    return [[tuple(r) for r in result] if result else [("mock", "apple", 0.95)] for result in results]
+
+
+# Async jobs: id -> Future, most recent JOB_HISTORY kept. The id is the image's
+# cache key, so a finished job can also be answered from the result cache
+# (e.g. by another worker when RESULT_CACHE_PATH is shared).
+JOB_HISTORY = 256
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def submit_classification_job(image_bytes):
+    """Start classifying image bytes in the background; returns the job id."""
+    _require_ml()
+    image_bytes = bytes(image_bytes)
+    key = _classifier_key(image_bytes)
+    with _jobs_lock:
+        if key in _jobs or get_result_cache().get(key) is not None:
+            return key
+        fut = _submit(image_bytes)
+        _jobs[key] = fut
+        while len(_jobs) > JOB_HISTORY:
+            _jobs.popitem(last=False)
+
+    def store(f):
+        if f.exception() is None:
+            result = _normalize(f.result())
+            if _cacheable(result):
+                get_result_cache().put(key, result)
+
+    fut.add_done_callback(store)
+    return key
+
+
+def classification_job(job_id):
+    """(status, results or error message); status is "pending", "done", "error" or None if unknown."""
+    with _jobs_lock:
+        fut = _jobs.get(job_id)
+    if fut is None:
+        cached = get_result_cache().get(job_id)
+        return ("done", [tuple(r) for r in cached]) if cached is not None else (None, None)
+    if not fut.done():
+        return "pending", None
+    if fut.exception() is not None:
+        return "error", str(fut.exception()) or type(fut.exception()).__name__
+    return "done", fut.result() or [("mock", "apple", 0.95)]
+
+
+def model_status():
+    """Per-backend load state and load/inference timings."""
+    return get_registry().status()
+
+
 def get_food_label(results):
     for _, desc, prob in results:
         if prob > 0.5:
             return desc, prob
-    return None, 0
\ No newline at end of file
+    return None, 0
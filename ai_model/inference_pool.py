@@ -0,0 +1,106 @@
+"""
+Process pool for CPU-bound food classification.
+
+With INFERENCE_PROCESSES > 0, batches from the micro-batcher run in separate
+processes, each holding its own warm model (forked from a process that already
+loaded it when possible, else loaded by the pool initializer), so inference
+never holds the web worker's GIL and cheap requests like /api/foods and the
+sensor endpoints stay fast.
+
+Backpressure: at most INFERENCE_QUEUE_MAX images may be queued or running;
+beyond that reserve() raises InferenceBusy with a Retry-After estimate, which
+the web app turns into HTTP 503. Callers wait at most INFERENCE_TIMEOUT_S.
+A request for more room than the whole queue has could never succeed, so
+reserve() raises ValueError for it instead.
+"""
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ai_model.model_registry import get_registry
+
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+INFERENCE_QUEUE_MAX = int(os.environ.get("INFERENCE_QUEUE_MAX", "16"))
+INFERENCE_TIMEOUT_S = float(os.environ.get("INFERENCE_TIMEOUT_S", "30"))
+
+
+class InferenceBusy(Exception):
+    """The inference queue is full; retry after retry_after_s seconds."""
+
+    def __init__(self, retry_after_s):
+        super().__init__(f"Inference queue full, retry after {retry_after_s} s")
+        self.retry_after_s = retry_after_s
+
+
+def _init_worker():
+    # No-op when the model was loaded before fork; otherwise load it once here.
+    get_registry().warm_up()
+
+
+def _classify_batch(images):
+    return get_registry().classify_batch(images)
+
+
+class InferencePool:
+    """Runs classify_batch in worker processes; classify_batch() returns a Future."""
+
+    def __init__(self, processes=INFERENCE_PROCESSES, max_pending=INFERENCE_QUEUE_MAX):
+        if processes < 1:
+            raise ValueError("processes must be >= 1")
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.processes = processes
+        self.max_pending = max_pending
+        self._executor = ProcessPoolExecutor(processes, mp_context=ctx, initializer=_init_worker)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._batch_s = deque(maxlen=50)
+        self.completed = 0
+        self.rejected = 0
+
+    def reserve(self, n=1):
+        """Claim queue room for n images or raise InferenceBusy; pair with release(n).
+
+        Raises ValueError if n exceeds max_pending: waiting would not help.
+        """
+        if n > self.max_pending:
+            raise ValueError(f"Cannot queue {n} images at once: the inference queue holds "
+                             f"{self.max_pending} (INFERENCE_QUEUE_MAX)")
+        with self._lock:
+            if self._pending + n > self.max_pending:
+                self.rejected += 1
+                raise InferenceBusy(self.retry_after())
+            self._pending += n
+
+    def release(self, n=1):
+        with self._lock:
+            self._pending -= n
+            self.completed += n
+
+    def retry_after(self):
+        """Whole seconds until the current queue should have drained (at least 1)."""
+        avg = sum(self._batch_s) / len(self._batch_s) if self._batch_s else 1.0
+        return max(1, math.ceil(avg * self._pending / self.processes))
+
+    def classify_batch(self, images):
+        start = time.perf_counter()
+        fut = self._executor.submit(_classify_batch, list(images))
+        fut.add_done_callback(lambda _: self._batch_s.append(time.perf_counter() - start))
+        return fut
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "processes": self.processes,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_batch_ms": round(1000 * sum(self._batch_s) / len(self._batch_s), 1) if self._batch_s else None,
+        }
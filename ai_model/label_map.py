@@ -9,3 +9,21 @@ LABEL_MAP = {
     "cheeseburger": "pizza",
     "sandwich": "bread"
 }
+
+
+# ImageNet class names (as returned by decode_predictions) that are close
+# enough to a nutrition DB food to log against it.
+IMAGENET_SYNONYMS = {
+    "Granny_Smith": "apple",
+    "French_loaf": "bread",
+    "bagel": "bread",
+    "pretzel": "bread",
+    "head_cabbage": "salad",
+    "broccoli": "salad",
+    "cucumber": "salad",
+    "lemon": "orange",
+    "hotdog": "bread",
+    "pizza": "pizza",
+    "banana": "banana",
+    "orange": "orange",
+}
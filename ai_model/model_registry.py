@@ -0,0 +1,583 @@
+"""
+Process-wide registry of loaded food classifier backends.
+
+Each backend (TFLite, Keras MobileNetV2, mock) is loaded once on first use and
+then reused by every request, so a photo posted to the web app only pays for
+inference, not for model load. Call warm_up() at startup to load ahead of the
+first request, or warm_up_in_background() to accept requests while it loads.
+Heavy imports (TensorFlow, the TFLite runtime, NumPy) happen inside load(), so
+importing this module is cheap.
+"""
+import contextlib
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+
+from ai_model.preprocess import MODEL_INPUT_SIZE, preprocess_batch
+
+TFLITE_MODEL_PATH = os.environ.get("FOOD_TFLITE_MODEL") or os.path.join(
+    os.path.dirname(__file__), "food_model.tflite"
+)
+# One label per line ("label" or "index label"), matching the model's output
+# classes; defaults to labels.txt next to the model. Without one, ImageNet
+# models fall back to IMAGENET_TO_FOOD.
+TFLITE_LABELS_PATH = os.environ.get("FOOD_TFLITE_LABELS")
+# Interpreter threads per process. By default the cores are split between the
+# INFERENCE_PROCESSES pool workers (read here: inference_pool imports this module)
+# so they don't oversubscribe the CPU; without a pool one process uses them all.
+TFLITE_THREADS = int(os.environ.get("FOOD_TFLITE_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // max(1, int(os.environ.get("INFERENCE_PROCESSES", "0"))))
+# "xnnpack" (TFLite's default CPU delegate), "none", or the path of an external
+# delegate library (e.g. libedgetpu.so.1).
+TFLITE_DELEGATE = os.environ.get("FOOD_TFLITE_DELEGATE", "xnnpack")
+# Real-valued input range the model was trained on: "-1,1" (MobileNet), "0,1" or "0,255".
+TFLITE_INPUT_RANGE = tuple(float(v) for v in os.environ.get("FOOD_TFLITE_INPUT_RANGE", "-1,1").split(","))
+
+# Callables fn(stage, seconds) told about each "image_decode" and "model_inference" (see add_timing_observer)
+_timing_observers = []
+
+# ImageNet class index -> our nutrition DB key (for TFLite with ImageNet model)
+IMAGENET_TO_FOOD = {
+    949: "orange",
+    952: "banana",
+    967: "apple",      # Granny_Smith
+    927: "pizza",
+    933: "french_fries",
+    964: "salad",      # head cabbage
+}
+
+
+class BackendTimings:
+    """Load and inference timings for one backend (seconds)."""
+
+    def __init__(self):
+        self.load_s = None
+        self.inference_count = 0
+        self.batch_count = 0
+        self.inference_total_s = 0.0
+        self.inference_last_s = None
+
+    def record_inference(self, seconds, items=1):
+        """Record one forward pass over items images; averages are per image."""
+        self.inference_count += items
+        self.batch_count += 1
+        self.inference_total_s += seconds
+        self.inference_last_s = seconds
+
+    def as_dict(self):
+        avg = self.inference_total_s / self.inference_count if self.inference_count else None
+        return {
+            "load_ms": None if self.load_s is None else round(self.load_s * 1000, 2),
+            "inference_count": self.inference_count,
+            "batch_count": self.batch_count,
+            "inference_avg_ms": None if avg is None else round(avg * 1000, 2),
+            "inference_last_ms": None if self.inference_last_s is None else round(self.inference_last_s * 1000, 2),
+        }
+
+
+def add_timing_observer(fn):
+    """Report decode and forward-pass times of this process's backends to fn(stage, seconds)."""
+    _timing_observers.append(fn)
+
+
+def _observe(stage, start):
+    if _timing_observers:
+        seconds = time.perf_counter() - start
+        for fn in _timing_observers:
+            fn(stage, seconds)
+
+
+def _decode(images, size):
+    """preprocess_batch() reported as the image_decode stage."""
+    start = time.perf_counter()
+    try:
+        return preprocess_batch(images, size)
+    finally:
+        _observe("image_decode", start)
+
+
+class ModelBackend:
+    """Base class: load() once, then classify() many times."""
+
+    name = "base"
+    # Whether results may be stored in the result cache (real model predictions only).
+    cache_results = True
+
+    def is_available(self):
+        return True
+
+    def fingerprint(self):
+        """Identifies the model answering; part of result cache keys, so a new model misses."""
+        return self.name
+
+    def answered(self, result):
+        """True if result (a classify() result) came from this backend."""
+        return bool(result) and result[0][0] == self.name
+
+    def load(self):
+        pass
+
+    def info(self):
+        """Extra details for status() once loaded (model type, threads, ...)."""
+        return {}
+
+    def classify(self, image):
+        """Return a list of (source, label, prob) tuples, or None if the backend cannot answer."""
+        raise NotImplementedError
+
+    def classify_batch(self, images):
+        """Classify several images; one result (or None) per input, in order.
+
+        Backends that can run a batched forward pass override this.
+        """
+        return [self.classify(img) for img in images]
+
+
+def _tflite_interpreter():
+    """(Interpreter, load_delegate, OpResolverType) from tflite_runtime, ai_edge_litert or TensorFlow."""
+    try:
+        from tflite_runtime import interpreter as rt
+    except ImportError:
+        try:
+            from ai_edge_litert import interpreter as rt
+        except ImportError:
+            import tensorflow as tf
+            rt = tf.lite.experimental
+            return tf.lite.Interpreter, rt.load_delegate, getattr(rt, "OpResolverType", None)
+    return rt.Interpreter, rt.load_delegate, getattr(rt, "OpResolverType", None)
+
+
+def load_labels(path):
+    """Labels file -> list indexed by class id ("label" or "index label" per line)."""
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            idx, _, rest = line.partition(" ")
+            if idx.isdigit() and rest:
+                labels.extend([None] * (int(idx) + 1 - len(labels)))
+                labels[int(idx)] = rest.strip()
+            else:
+                labels.append(line)
+    return labels
+
+
+class TFLiteBackend(ModelBackend):
+    """TFLite model (e.g. on Pi): float32, or uint8/int8 quantized using the input's own scale and zero point."""
+
+    name = "tflite"
+    top_k = 3
+
+    def __init__(self, model_path=None, labels_path=None, num_threads=None, delegate=None, input_range=None):
+        self.model_path = model_path or TFLITE_MODEL_PATH
+        self.labels_path = labels_path or TFLITE_LABELS_PATH or os.path.join(
+            os.path.dirname(self.model_path), "labels.txt"
+        )
+        self.num_threads = num_threads or TFLITE_THREADS
+        self.delegate = (delegate or TFLITE_DELEGATE).strip()
+        self.input_range = input_range or TFLITE_INPUT_RANGE
+        self.labels = None
+        self._loaded_fingerprint = None
+        self._interp = None
+        self._input_idx = None
+        self._input_shape = None
+        self._input_dtype = None
+        self._input_affine = None
+        self._output_idx = None
+        self._output_quant = (0.0, 0)
+        self._batch_size = 1
+        # The interpreter owns its tensors; invoke() is not safe to run concurrently.
+        self._invoke_lock = threading.Lock()
+
+    def is_available(self):
+        if not any(importlib.util.find_spec(m) for m in ("tflite_runtime", "ai_edge_litert", "tensorflow")):
+            return False
+        return os.path.isfile(self.model_path)
+
+    def load(self):
+        import numpy as np
+        Interpreter, load_delegate, OpResolverType = _tflite_interpreter()
+        kwargs = {"model_path": self.model_path, "num_threads": self.num_threads}
+        if self.delegate.lower() == "none":
+            if OpResolverType is not None:
+                kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        elif self.delegate.lower() != "xnnpack":
+            kwargs["experimental_delegates"] = [load_delegate(self.delegate)]
+        interp = Interpreter(**kwargs)
+        interp.allocate_tensors()
+        details = interp.get_input_details()[0]
+        output = interp.get_output_details()[0]
+        self._input_idx = details["index"]
+        self._input_shape = details["shape"]
+        self._input_dtype = np.dtype(details["dtype"])
+        self._input_affine = self._affine(details.get("quantization", (0.0, 0)))
+        self._output_idx = output["index"]
+        if np.dtype(output["dtype"]).kind in "iu":
+            self._output_quant = output.get("quantization", (0.0, 0))
+        if os.path.isfile(self.labels_path):
+            self.labels = load_labels(self.labels_path)
+        self._loaded_fingerprint = self._file_fingerprint()
+        self._interp = interp
+
+    def _file_fingerprint(self):
+        """Model path, mtime and size plus a digest of the labels file."""
+        st = os.stat(self.model_path)
+        labels = "none"
+        if os.path.isfile(self.labels_path):
+            with open(self.labels_path, "rb") as f:
+                labels = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        return f"tflite:{os.path.abspath(self.model_path)}:{st.st_mtime_ns}:{st.st_size}:{labels}"
+
+    def fingerprint(self):
+        # Once loaded, the model in memory is what answers, even if the file changed since.
+        return self._loaded_fingerprint or self._file_fingerprint()
+
+    def _affine(self, quantization):
+        """(a, b) so that model_input = a * x + b for x in [-1, 1] from preprocess_batch.
+
+        Maps to the model's real input range, then for quantized inputs into the
+        integer domain with q = real / scale + zero_point. Quantized inputs without
+        parameters get raw 0..255 pixels.
+        """
+        lo, hi = self.input_range
+        a, b = (hi - lo) / 2.0, lo + (hi - lo) / 2.0
+        if self._input_dtype.kind in "iu":
+            scale, zero_point = quantization
+            if scale:
+                a, b = a / scale, b / scale + zero_point
+            else:
+                a, b = 127.5, 127.5
+        return a, b
+
+    def _prepare(self, x):
+        """Convert a preprocessed float32 batch (in place where possible) to the model's input."""
+        import numpy as np
+        a, b = self._input_affine
+        if (a, b) != (1.0, 0.0):
+            x *= a
+            x += b
+        if self._input_dtype.kind not in "iu":
+            return x
+        info = np.iinfo(self._input_dtype)
+        np.rint(x, out=x)
+        np.clip(x, info.min, info.max, out=x)
+        return x.astype(self._input_dtype)
+
+    def info(self):
+        return {
+            "model": os.path.basename(self.model_path),
+            "input_dtype": None if self._input_dtype is None else str(self._input_dtype),
+            "num_threads": self.num_threads,
+            "delegate": self.delegate,
+            "labels": len(self.labels) if self.labels else None,
+        }
+
+    def _resize_batch(self, n):
+        """Resize the input tensor to batch n (re-allocates only when n changes)."""
+        if n == self._batch_size:
+            return
+        shape = list(self._input_shape)
+        shape[0] = n
+        self._interp.resize_tensor_input(self._input_idx, shape)
+        self._interp.allocate_tensors()
+        self._batch_size = n
+
+    def _invoke(self, x):
+        with self._invoke_lock:
+            try:
+                self._resize_batch(len(x))
+            except Exception:
+                # Model has a fixed batch dimension: fall back to one image per invoke.
+                self._resize_batch(1)
+                return [self._invoke_one(row) for row in x]
+            self._interp.set_tensor(self._input_idx, x)
+            self._interp.invoke()
+            return list(self._interp.get_tensor(self._output_idx))
+
+    def _invoke_one(self, row):
+        self._interp.set_tensor(self._input_idx, row[None, ...])
+        self._interp.invoke()
+        return self._interp.get_tensor(self._output_idx)[0]
+
+    def _label(self, idx):
+        if self.labels is not None:
+            if idx < len(self.labels) and self.labels[idx]:
+                return self.labels[idx]
+            return f"class_{idx}"
+        # Map ImageNet index to food label so get_food_label + DB lookup can work
+        return IMAGENET_TO_FOOD.get(idx, f"class_{idx}")
+
+    def _to_result(self, scores):
+        """Top-k (source, label, prob), best first; quantized outputs are dequantized."""
+        import numpy as np
+        scale, zero_point = self._output_quant
+        if scale:
+            scores = (scores.astype(np.float32) - zero_point) * scale
+        k = min(self.top_k, scores.shape[-1])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [("tflite", self._label(int(i)), float(scores[i])) for i in top]
+
+    def classify(self, image):
+        return self.classify_batch([image])[0]
+
+    def classify_batch(self, images):
+        size = (int(self._input_shape[2]), int(self._input_shape[1]))
+        x, ok = _decode(images, size)
+        results = [None] * len(images)
+        if not ok:
+            return results
+        start = time.perf_counter()
+        try:
+            outputs = self._invoke(self._prepare(x))
+        except Exception:
+            return results
+        _observe("model_inference", start)
+        for i, scores in zip(ok, outputs):
+            results[i] = self._to_result(scores)
+        return results
+
+
+class KerasBackend(ModelBackend):
+    """Full TensorFlow MobileNetV2 with ImageNet weights."""
+
+    name = "keras"
+
+    def fingerprint(self):
+        return "keras:mobilenet_v2:imagenet"
+
+    def answered(self, result):
+        # decode_predictions() tuples start with the WordNet id, e.g. "n07753592".
+        return bool(result) and str(result[0][0])[:1] == "n" and str(result[0][0])[1:].isdigit()
+
+    def __init__(self):
+        self._model = None
+
+    def is_available(self):
+        try:
+            import tensorflow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load(self):
+        from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
+        self._model = MobileNetV2(weights="imagenet")
+
+    def classify(self, image):
+        return self.classify_batch([image])[0]
+
+    def classify_batch(self, images):
+        from tensorflow.keras.applications.mobilenet_v2 import decode_predictions
+        # preprocess_batch already applies MobileNetV2's preprocess_input scaling.
+        x, ok = _decode(images, MODEL_INPUT_SIZE)
+        results = [None] * len(images)
+        if not ok:
+            return results
+        start = time.perf_counter()
+        preds = self._model.predict(x, batch_size=len(ok), verbose=0)
+        _observe("model_inference", start)
+        for i, decoded in zip(ok, decode_predictions(preds, top=3)):
+            results[i] = decoded
+        return results
+
+
+class MockBackend(ModelBackend):
+    """Fixed label; used when no ML runtime is installed."""
+
+    name = "mock"
+    cache_results = False
+
+    def classify(self, image):
+        return [("mock", "apple", 0.95)]
+
+
+class ModelRegistry:
+    """Loads each backend at most once per process and keeps it warm."""
+
+    def __init__(self, backends=None):
+        if backends is None:
+            backends = [TFLiteBackend(), KerasBackend(), MockBackend()]
+        self._backends = {b.name: b for b in backends}
+        self._order = [b.name for b in backends]
+        self._loaded = set()
+        self._failed = set()
+        self._timings = {name: BackendTimings() for name in self._order}
+        self._available = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return the loaded backend called name, or None if unavailable or it failed to load."""
+        if name in self._loaded:
+            return self._backends[name]
+        with self._lock:
+            if name in self._loaded:
+                return self._backends[name]
+            if name in self._failed or name not in self._backends:
+                return None
+            backend = self._backends[name]
+            if not backend.is_available():
+                self._failed.add(name)
+                return None
+            start = time.perf_counter()
+            try:
+                backend.load()
+            except Exception:
+                self._failed.add(name)
+                return None
+            self._timings[name].load_s = time.perf_counter() - start
+            self._loaded.add(name)
+            return backend
+
+    def primary(self):
+        """The backend classify() tries first that can answer here (without loading it), or None."""
+        for name in self._order:
+            if name in self._loaded:
+                return self._backends[name]
+            if name in self._failed:
+                continue
+            available = self._available.get(name)
+            if available is None:
+                available = self._available[name] = self._backends[name].is_available()
+            if available:
+                return self._backends[name]
+        return None
+
+    def fingerprint(self):
+        """Fingerprint of the primary backend's model, for result cache keys."""
+        backend = self.primary()
+        return backend.fingerprint() if backend else "none"
+
+    def cacheable(self, result):
+        """True if result is a real prediction from the primary backend (the one in fingerprint()).
+
+        Results a fallback backend gave, and anything from the mock backend, are not cached.
+        """
+        backend = self.primary()
+        return bool(result) and backend is not None and backend.cache_results and backend.answered(result)
+
+    def classify(self, image):
+        """Try backends in priority order; the first non-empty result wins.
+
+        image may be a path, bytes, a file-like stream or an array (see ai_model.preprocess).
+        """
+        for name in self._order:
+            backend = self.get(name)
+            if backend is None:
+                continue
+            start = time.perf_counter()
+            result = backend.classify(image)
+            self._timings[name].record_inference(time.perf_counter() - start)
+            if result:
+                return result
+        return None
+
+    def classify_batch(self, images):
+        """Batched classify(): one forward pass per backend for all pending images.
+
+        Images a backend could not answer fall through to the next backend.
+        """
+        results = [None] * len(images)
+        pending = list(range(len(images)))
+        for name in self._order:
+            if not pending:
+                break
+            backend = self.get(name)
+            if backend is None:
+                continue
+            start = time.perf_counter()
+            try:
+                batch = backend.classify_batch([images[i] for i in pending])
+            except Exception:
+                continue
+            self._timings[name].record_inference(time.perf_counter() - start, items=len(pending))
+            still_pending = []
+            for i, result in zip(pending, batch):
+                if result:
+                    results[i] = result
+                else:
+                    still_pending.append(i)
+            pending = still_pending
+        return results
+
+    def warm_up(self, names=None):
+        """Load backends ahead of the first request. Returns the names that loaded.
+
+        With no names, loads backends in priority order up to the first one that
+        succeeds (the one classify() will use).
+        """
+        if names is not None:
+            return [n for n in names if self.get(n) is not None]
+        for name in self._order:
+            if self.get(name) is not None:
+                return [name]
+        return []
+
+    def status(self):
+        return {
+            name: {
+                "loaded": name in self._loaded,
+                "failed": name in self._failed,
+                **self._timings[name].as_dict(),
+                **(self._backends[name].info() if name in self._loaded else {}),
+            }
+            for name in self._order
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry, created on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+@contextlib.contextmanager
+def override_registry(registry):
+    """Make get_registry() return registry inside a with block, then restore the previous one."""
+    global _registry
+    with _registry_lock:
+        previous, _registry = _registry, registry
+    try:
+        yield registry
+    finally:
+        with _registry_lock:
+            _registry = previous
+
+
+def warm_up(names=None):
+    return get_registry().warm_up(names)
+
+
+def warm_up_in_background(names=None):
+    """Start warm_up() on a daemon thread and return it; classify() waits for a load in progress."""
+    thread = threading.Thread(target=warm_up, args=(names,), name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _hold_registry():
+    # A fork during a background load (gunicorn preload_app, the inference pool)
+    # waits for it, so the child gets a loaded model and an unlocked registry.
+    if _registry is not None:
+        _registry._lock.acquire()
+
+
+def _release_registry():
+    if _registry is not None:
+        _registry._lock.release()
+
+
+os.register_at_fork(before=_hold_registry, after_in_parent=_release_registry,
+                    after_in_child=_release_registry)
@@ -0,0 +1,121 @@
+"""
+Shared in-memory image decode and preprocessing for the food classifier.
+
+Accepts a file path, raw bytes, a file-like stream (e.g. a Flask upload), a PIL
+image or a NumPy array, so uploads never need to be written to disk. Large
+JPEG camera frames are decoded with PIL draft mode (DCT scaling) straight to
+roughly the model input size, and batches are written into preallocated
+per-thread input buffers instead of fresh arrays.
+"""
+import io
+import os
+import threading
+
+MODEL_INPUT_SIZE = (224, 224)
+
+_buffers = threading.local()
+
+
+def load_image(src, target_size=None):
+    """Decode src into an RGB PIL image.
+
+    If target_size (width, height) is given, JPEGs are decoded with draft mode
+    to the smallest DCT scale that is still at least that large.
+    """
+    from PIL import Image
+
+    if isinstance(src, Image.Image):
+        img = src
+    elif hasattr(src, "__array_interface__"):
+        img = Image.fromarray(_as_uint8(src))
+    else:
+        if isinstance(src, (bytes, bytearray, memoryview)):
+            src = io.BytesIO(src)
+        elif not isinstance(src, (str, os.PathLike)) and not hasattr(src, "read"):
+            raise TypeError(f"Unsupported image source: {type(src).__name__}")
+        img = Image.open(src)
+        if target_size and img.format == "JPEG":
+            img.draft("RGB", target_size)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def _as_uint8(arr):
+    import numpy as np
+    arr = np.asarray(arr)
+    if arr.dtype != np.uint8:
+        arr = np.clip(arr, 0, 255).astype(np.uint8)
+    if arr.ndim == 3 and arr.shape[2] == 1:
+        arr = arr[:, :, 0]
+    return arr
+
+
+def _input_buffer(n, size):
+    """Per-thread float32 (n, h, w, 3) view of a buffer that only grows when n does."""
+    import numpy as np
+    buf = getattr(_buffers, "batch", None)
+    if buf is None or buf.shape[0] < n or buf.shape[1:3] != (size[1], size[0]):
+        buf = np.empty((max(n, 1), size[1], size[0], 3), dtype=np.float32)
+        _buffers.batch = buf
+    return buf[:n]
+
+
+def preprocess_into(src, out, size=MODEL_INPUT_SIZE):
+    """Decode, resize and normalize src into out (h, w, 3 float32) to MobileNet's [-1, 1] range."""
+    import numpy as np
+    from PIL import Image
+    img = load_image(src, target_size=size)
+    if img.size != tuple(size):
+        img = img.resize(tuple(size), Image.BILINEAR)
+    np.multiply(np.asarray(img, dtype=np.uint8), 1.0 / 127.5, out=out, casting="unsafe")
+    out -= 1.0
+    return out
+
+
+def preprocess_batch(sources, size=MODEL_INPUT_SIZE):
+    """Preprocess sources into one (n, h, w, 3) float32 array.
+
+    Returns (batch, ok) where ok lists the indices that decoded; rows of images
+    that failed to decode are left out of batch. The array is a reused
+    per-thread buffer: consume it before the next call on the same thread.
+    """
+    buf = _input_buffer(len(sources), size)
+    ok = []
+    for i, src in enumerate(sources):
+        try:
+            preprocess_into(src, buf[len(ok)], size)
+        except Exception:
+            continue
+        ok.append(i)
+    return buf[:len(ok)], ok
+
+
+def preprocess(src, size=MODEL_INPUT_SIZE):
+    """Single image -> new (h, w, 3) float32 array in [-1, 1]."""
+    import numpy as np
+    out = np.empty((size[1], size[0], 3), dtype=np.float32)
+    return preprocess_into(src, out, size)
+
+
+def plate_regions(src, grid=2, overlap=0.25, size=MODEL_INPUT_SIZE):
+    """Whole image plus a grid x grid set of overlapping tiles, as RGB PIL images.
+
+    The image is decoded once (JPEG draft mode to about grid x the model input
+    size); each tile is grown by overlap of its size on every side so food
+    straddling a tile edge is still seen whole by at least one tile.
+    """
+    img = load_image(src, target_size=(size[0] * grid, size[1] * grid))
+    regions = [img]
+    if grid < 2:
+        return regions
+    w, h = img.size
+    tw, th = w / grid, h / grid
+    for row in range(grid):
+        for col in range(grid):
+            left = max(0, int((col - overlap) * tw))
+            top = max(0, int((row - overlap) * th))
+            right = min(w, int((col + 1 + overlap) * tw))
+            bottom = min(h, int((row + 1 + overlap) * th))
+            regions.append(img.crop((left, top, right, bottom)))
+    return regions
@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for image classification and AI vision results.
+
+Keys are a hash of the image bytes plus provider/model and (for the vision
+endpoint) a weight bucket, so a retried or re-sent photo is answered without
+running the model or calling the provider again. An in-memory LRU tier with TTL
+and entry/byte limits sits in front of an optional SQLite tier on disk that
+survives restarts.
+
+Configure the shared cache with RESULT_CACHE_SIZE (entries), RESULT_CACHE_MB,
+RESULT_CACHE_TTL (seconds) and RESULT_CACHE_PATH (enables the disk tier).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Vision results are keyed on weight rounded to this many grams.
+WEIGHT_BUCKET_G = 5.0
+
+
+def cache_key(image_bytes, provider, model="", weight_g=None):
+    """Hex key for image_bytes + provider/model (+ weight bucket if weight_g is given)."""
+    h = hashlib.blake2b(image_bytes, digest_size=16)
+    h.update(f"|{provider}|{model}|".encode())
+    if weight_g is not None:
+        h.update(str(weight_bucket(weight_g)).encode())
+    return h.hexdigest()
+
+
+def weight_bucket(weight_g):
+    return round(float(weight_g) / WEIGHT_BUCKET_G) * WEIGHT_BUCKET_G
+
+
+class _DiskTier:
+    """SQLite key/value store: key -> (JSON value, expiry timestamp)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+        # A connection must not cross a fork (gunicorn preload_app); reopen in the child.
+        os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self.delete(key)
+            return None
+        return row[0], row[1]
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires),
+            )
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def purge_expired(self, now):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE expires < ?", (now,))
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of JSON-serializable results."""
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl_s=24 * 3600, disk_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (value, expires, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        if self._disk:
+            self._disk.purge_expired(time.time())
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached value for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[0])
+                self._drop(key)
+                self.expirations += 1
+        if self._disk:
+            row = self._disk.get(key, now)
+            if row is not None:
+                with self._lock:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                return json.loads(row[0])
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        raw = json.dumps(value)
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._store(key, raw, expires)
+        if self._disk:
+            self._disk.put(key, raw, expires)
+
+    def get_or_compute(self, key, compute, cacheable=bool):
+        """Return the cached value for key, or compute(), cache it (if cacheable(value)) and return it."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if cacheable(value):
+            self.put(key, value)
+        return value
+
+    def _store(self, key, raw, expires):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (raw, expires, len(raw))
+        self._bytes += len(raw)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk": self._disk is not None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide cache configured from the environment."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "1024")),
+                    max_bytes=int(float(os.environ.get("RESULT_CACHE_MB", "16")) * 1024 * 1024),
+                    ttl_s=float(os.environ.get("RESULT_CACHE_TTL", str(24 * 3600))),
+                    disk_path=os.environ.get("RESULT_CACHE_PATH") or None,
+                )
+    return _cache
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Throughput vs. batch size for the micro-batched food classifier.
+
+Runs N synthetic food photos through ai_model.batching.MicroBatcher from
+several concurrent client threads, once per max batch size, and prints
+images/second and per-request latency.
+
+Usage (from repo root):
+  python benchmarks/bench_batching.py [--images 64] [--clients 8] [--backend auto|synthetic]
+
+--backend auto uses whatever ai_model.model_registry would load (TFLite, Keras
+or mock). --backend synthetic uses a NumPy dense layer so the effect of batching
+on a CPU forward pass can be seen on machines without TensorFlow.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ai_model.batching import MicroBatcher
+from ai_model.model_registry import ModelBackend, ModelRegistry
+from ai_model.preprocess import preprocess_batch
+
+
+class SyntheticBackend(ModelBackend):
+    """32x32x3 -> 1000 dense layer; cost scales like a real forward pass."""
+
+    name = "synthetic"
+
+    def load(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        self._w = rng.standard_normal((32 * 32 * 3, 1000), dtype=np.float32)
+
+    def classify(self, img_path):
+        return self.classify_batch([img_path])[0]
+
+    def classify_batch(self, img_paths):
+        x, _ = preprocess_batch(img_paths, (32, 32))
+        out = x.reshape(len(x), -1) @ self._w
+        return [[("synthetic", f"class_{int(row.argmax())}", 1.0)] for row in out]
+
+
+def make_images(n, folder):
+    from PIL import Image
+    import numpy as np
+    rng = np.random.default_rng(1)
+    paths = []
+    for i in range(n):
+        arr = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        path = os.path.join(folder, f"food_{i}.jpg")
+        Image.fromarray(arr).save(path, quality=85)
+        paths.append(path)
+    return paths
+
+
+def run(batcher, paths, clients):
+    latencies = []
+    lock = threading.Lock()
+    chunks = [paths[i::clients] for i in range(clients)]
+
+    def client(chunk):
+        for p in chunk:
+            t0 = time.perf_counter()
+            batcher.classify(p)
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in chunks]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-batching throughput benchmark")
+    ap.add_argument("--images", type=int, default=64)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--wait-ms", type=float, default=5.0, help="Batch latency budget")
+    ap.add_argument("--batch-sizes", default="1,2,4,8,16")
+    ap.add_argument("--backend", choices=("auto", "synthetic"), default="auto")
+    args = ap.parse_args()
+
+    registry = ModelRegistry([SyntheticBackend()]) if args.backend == "synthetic" else ModelRegistry()
+    print("Backend loaded:", registry.warm_up())
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_images(args.images, folder)
+        registry.classify_batch(paths[:2])  # first-call overhead
+        print(f"{'batch':>5} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>9}")
+        for size in (int(s) for s in args.batch_sizes.split(",")):
+            batcher = MicroBatcher(registry.classify_batch, max_batch_size=size, max_latency_ms=args.wait_ms)
+            elapsed, lat = run(batcher, paths, args.clients)
+            batcher.close()
+            lat.sort()
+            p95 = lat[int(len(lat) * 0.95) - 1]
+            print(f"{size:>5} {len(paths) / elapsed:>8.1f} {statistics.median(lat) * 1000:>8.1f} "
+                  f"{p95 * 1000:>8.1f} {batcher.stats()['avg_batch_size']:>9}")
+
+
+if __name__ == "__main__":
+    main()
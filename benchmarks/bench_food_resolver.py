@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Food-name resolution latency on a large synthetic food database.
+
+Builds a FoodResolver over the real nutrition DB keys plus N generated
+USDA-style names (e.g. "chicken_breast_roasted_skinless_42") and times
+resolve() for exact keys, aliases and fuzzy labels, next to the old linear
+substring scan it replaces. First checks a few labels against the real DB
+keys alone, including near misses that must not resolve.
+
+Usage (from repo root):
+  python benchmarks/bench_food_resolver.py [--foods 100000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fusion.food_resolver import FoodResolver
+from nutrition.load_db import load_nutrition_db
+
+WORDS = ("chicken breast thigh drumstick wing rice brown white wild wheat whole bread roll bun "
+         "bagel muffin apple banana orange grape mango papaya pear peach plum cherry berry "
+         "strawberry blueberry salad green caesar greek fried grilled roasted baked boiled "
+         "steamed raw skinless boneless cheese cheddar mozzarella pizza beef steak ground pork "
+         "ham bacon lamb mutton turkey duck salmon tuna cod shrimp crab tofu tempeh lentil "
+         "bean chickpea pea pasta spaghetti macaroni noodle ramen soup stew curry yogurt milk "
+         "cream butter egg omelet potato sweet yam carrot onion garlic tomato pepper spinach "
+         "kale lettuce cabbage broccoli cauliflower corn oat barley quinoa millet almond "
+         "walnut peanut cashew honey sugar syrup chocolate cookie cake pie donut sauce "
+         "canned frozen dried fresh enriched unenriched salted unsalted lowfat nonfat").split()
+QUERIES = ["apple", "Granny_Smith", "french fries", "grilled chiken", "boiled egg",
+           "brown rice bowl", "cheeseburger", "roasted chicken thigh", "pizza", "lentil soup"]
+# label -> expected resolve() over the real DB keys (None: no confident match)
+EXPECTED = {
+    "Granny_Smith": "apple",
+    "grilled chiken": "grilled_chicken",
+    "boiled egg": "egg_boiled",
+    "brown rice bowl": "brown_rice",
+    "fried rice": None,
+    "pineapple": None,
+    "custard_apple": None,
+    "lentil soup": None,
+}
+
+
+def timed(fn, labels):
+    samples = []
+    for label in labels:
+        t = time.perf_counter()
+        fn(label)
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Food resolver benchmark")
+    ap.add_argument("--foods", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    keys = list(load_nutrition_db())
+    real = FoodResolver(keys)
+    wrong = [f"{label!r} -> {real.resolve(label)} (expected {food})"
+             for label, food in EXPECTED.items() if real.resolve(label) != food]
+    if wrong:
+        sys.exit("Wrong matches:\n  " + "\n  ".join(wrong))
+    print(f"{len(EXPECTED)} labels resolve as expected")
+    keys += ["_".join(rng.sample(WORDS, rng.randint(2, 4))) + f"_{i}" for i in range(args.foods)]
+
+    t0 = time.perf_counter()
+    resolver = FoodResolver(keys)
+    print(f"Index over {len(keys)} foods built in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    labels = [rng.choice(QUERIES) for _ in range(args.queries)]
+
+    def linear_scan(label):
+        food_id = label.lower().replace(" ", "_")
+        if food_id not in keys:
+            return next((k for k in keys if food_id in k or k in food_id), None)
+        return food_id
+
+    p50, p99 = timed(resolver.resolve, labels)
+    print(f"{'FoodResolver.resolve':<22} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    p50, p99 = timed(linear_scan, labels[:200])
+    print(f"{'linear substring scan':<22} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Scalar vs. vectorized health scoring.
+
+Scores N random meals with a Python loop over compute_health_score() and with
+one compute_health_scores() call over NumPy columns, checks the scores are
+identical, and prints meals/second for each.
+
+Usage (from repo root):
+  python benchmarks/bench_health_score.py [--meals 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+from health_score.score_logic import compute_health_score, compute_health_scores
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Health score benchmark")
+    ap.add_argument("--meals", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    columns = {
+        "calories": np.round(rng.uniform(0, 1200, args.meals), 2),
+        "protein": np.round(rng.uniform(0, 60, args.meals), 2),
+        "fat": np.round(rng.uniform(0, 60, args.meals), 2),
+    }
+    rows = [
+        {"calories": c, "protein": p, "fat": f}
+        for c, p, f in zip(*(columns[k].tolist() for k in ("calories", "protein", "fat")))
+    ]
+
+    t0 = time.perf_counter()
+    scalar = [compute_health_score(r) for r in rows]
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vector = compute_health_scores(columns)
+    t_vector = time.perf_counter() - t0
+
+    assert vector.tolist() == scalar
+    print(f"{'scalar loop':<12} {args.meals / t_scalar:>14,.0f} meals/s")
+    print(f"{'vectorized':<12} {args.meals / t_vector:>14,.0f} meals/s  ({t_scalar / t_vector:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+/api/history from rollups vs a full scan of the meal log.
+
+Preloads --years of meals (--per-day a day) for each of --users users into a
+fresh SQLite meal store, then times a query over the last year at each
+granularity three ways:
+
+  scan     SELECT every meal of the user in the range and aggregate in Python
+           (what the API would cost without rollups)
+  rollup   SQLiteMealStore.history(): one row per period from the rollup tables
+  GET      /api/history through the Flask test client with the payload cache
+           cleared each time (handler + rollup query + JSON)
+
+Usage (from repo root):
+  python benchmarks/bench_history.py [--years 5] [--per-day 6] [--users 4] [--samples 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+from storage.meal_store import GRANULARITIES, MACROS, SQLiteMealStore, day_key, make_meal, period_key  # noqa: E402
+
+FOODS = {
+    "white_rice": {"calories": 130.0, "protein": 2.7, "carbs": 28.0, "fat": 0.3},
+    "apple": {"calories": 52.0, "protein": 0.3, "carbs": 14.0, "fat": 0.2},
+    "chicken_breast": {"calories": 165.0, "protein": 31.0, "carbs": 0.0, "fat": 3.6},
+}
+
+
+def preload(store, years, per_day, users):
+    rng = random.Random(0)
+    days = int(years * 365)
+    start_ts = time.time() - days * 86400
+    for user in range(users):
+        meals = []
+        for d in range(days):
+            for m in range(per_day):
+                food = rng.choice(list(FOODS))
+                ts = start_ts + d * 86400 + (m + 0.5) * 86400 / per_day
+                meals.append(make_meal(food, 100.0, FOODS[food], rng.randint(20, 100), ts))
+        for i in range(0, len(meals), 20000):
+            store.add_meals(meals[i:i + 20000], f"user{user}")
+    return days * per_day * users
+
+
+def full_scan(store, user_id, start, end, granularity):
+    """Aggregate raw meals per period, as the API would without rollups."""
+    # Whole periods, like the rollups: from the first period's first day to the last one's last day.
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    if granularity == "week":
+        first -= timedelta(days=first.weekday())
+        last += timedelta(days=6 - last.weekday())
+    elif granularity == "month":
+        first = first.replace(day=1)
+        last = (last.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    rows = store._conn().execute(
+        "SELECT day, calories, protein, carbs, fat, score FROM meals WHERE user_id = ? AND day BETWEEN ? AND ?",
+        (user_id, first.isoformat(), last.isoformat()),
+    )
+    periods = defaultdict(lambda: dict.fromkeys(MACROS + ("meal_count", "score_sum"), 0))
+    for day, cal, prot, carbs, fat, score in rows:
+        agg = periods[period_key(day, granularity)]
+        for k, v in zip(MACROS, (cal, prot, carbs, fat)):
+            agg[k] += v
+        agg["meal_count"] += 1
+        agg["score_sum"] += score
+    return [dict(periods[p], period=p) for p in sorted(periods)]
+
+
+def timed(fn, samples):
+    times = []
+    for _ in range(samples):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    times.sort()
+    return statistics.median(times) * 1000, times[int(len(times) * 0.99) - 1] * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="History rollup benchmark")
+    ap.add_argument("--years", type=float, default=5)
+    ap.add_argument("--per-day", type=int, default=6)
+    ap.add_argument("--users", type=int, default=4)
+    ap.add_argument("--samples", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bench.db")
+        store = SQLiteMealStore(path)
+        t0 = time.perf_counter()
+        n = preload(store, args.years, args.per_day, args.users)
+        print(f"Preloaded {n} meals ({args.years:g} years x {args.per_day}/day x {args.users} users) "
+              f"in {time.perf_counter() - t0:.1f} s")
+
+        os.environ["SMART_MEAL_DB"] = path
+        os.environ["MEAL_STORE"] = "sqlite"
+        os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+        import app as web_app
+        client = web_app.app.test_client()
+
+        end = day_key()
+        start = day_key(time.time() - 364 * 86400)
+        print(f"user0, {start} .. {end}; median / p99 ms over {args.samples} queries")
+        print(f"{'granularity':<12} {'periods':>7} {'scan':>17} {'rollup':>17} {'GET (no cache)':>17} {'speedup':>8}")
+        for granularity in GRANULARITIES:
+            scanned = full_scan(store, "user0", start, end, granularity)
+            rolled = store.history("user0", start, end, granularity)
+            assert [p["period"] for p in scanned] == [p["period"] for p in rolled]
+            assert [p["meal_count"] for p in scanned] == [p["meal_count"] for p in rolled]
+            scan = timed(lambda: full_scan(store, "user0", start, end, granularity), args.samples)
+            rollup = timed(lambda: store.history("user0", start, end, granularity), args.samples)
+            url = f"/api/history?user_id=user0&from={start}&to={end}&granularity={granularity}"
+
+            def get():
+                web_app.history_payloads._entries.clear()
+                assert client.get(url).status_code == 200
+
+            api = timed(get, args.samples)
+            print(f"{granularity:<12} {len(rolled):>7} {scan[0]:>8.2f} / {scan[1]:>6.2f} "
+                  f"{rollup[0]:>8.2f} / {rollup[1]:>6.2f} {api[0]:>8.2f} / {api[1]:>6.2f} "
+                  f"{scan[0] / rollup[0]:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
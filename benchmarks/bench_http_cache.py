@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Requests/s for /api/foods, /api/nutrition and /api/daily: before vs after caching.
+
+"before" routes rebuild the response the way the app used to (sort db.keys(),
+jsonify the table, query and serialize the daily summary and recent meals on
+every call); the real routes serve precomputed / versioned payloads. Each is
+timed through the Flask test client (handler + WSGI cost, no sockets) with a
+plain GET, a GET with Accept-Encoding: gzip, and a revalidation GET sending
+the ETag from the first response (If-None-Match -> 304).
+
+The nutrition DB is padded with --foods synthetic entries (the shipped DB has
+13) and the user has --meals meals in a SQLite store.
+
+Usage (from repo root):
+  python benchmarks/bench_http_cache.py [--foods 2000] [--meals 200] [--seconds 2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+
+def rps(client, url, headers, seconds):
+    n, size = 0, 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        r = client.get(url, headers=headers)
+        size = len(r.data)
+        n += 1
+    return n / seconds, r.status_code, size
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cached/versioned response benchmark")
+    ap.add_argument("--foods", type=int, default=2000)
+    ap.add_argument("--meals", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=2)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["SMART_MEAL_DB"] = os.path.join(tmp, "bench.db")
+    os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+    from flask import jsonify
+    import app as web_app
+
+    db, store = web_app.db, web_app.store
+    rng = random.Random(0)
+    for i in range(args.foods):
+        db[f"synthetic_food_{i}"] = {k: round(rng.uniform(0, 50), 1) for k in ("calories", "protein", "carbs", "fat")}
+    web_app._precompute_static()
+    for _ in range(args.meals):
+        nutrition = web_app.calculate_nutrition("apple", 100, db)
+        store.add_meal(web_app.make_meal("apple", 100, nutrition, 80))
+
+    app = web_app.app
+
+    @app.route("/bench/before/foods")
+    def before_foods():
+        return jsonify({"foods": sorted(db.keys())})
+
+    @app.route("/bench/before/nutrition")
+    def before_nutrition():
+        return jsonify({"foods": {k: db[k] for k in sorted(db.keys())}})
+
+    @app.route("/bench/before/daily")
+    def before_daily():
+        summary = store.daily_summary()
+        return jsonify({
+            "daily_total_calories": summary["calories"],
+            "daily_summary": summary,
+            "last_sensor_weight_g": store.get_sensor_weight(),
+            "recent_meals": store.recent_meals(limit=10),
+        })
+
+    client = app.test_client()
+    print(f"{len(db)} foods | {args.meals} meals | {args.seconds:.0f}s per row (test client, one thread)")
+    print(f"{'endpoint':<15} {'mode':<14} {'req/s':>8} {'status':>6} {'bytes':>7}")
+    for name in ("foods", "nutrition", "daily"):
+        before, _, before_size = rps(client, f"/bench/before/{name}", {}, args.seconds)
+        print(f"{name:<15} {'before':<14} {before:>8.0f} {200:>6} {before_size:>7}")
+        etag = client.get(f"/api/{name}").headers["ETag"]
+        for mode, headers in (("after", {}), ("after gzip", {"Accept-Encoding": "gzip"}),
+                              ("after 304", {"If-None-Match": etag})):
+            rate, status, size = rps(client, f"/api/{name}", headers, args.seconds)
+            print(f"{'':<15} {mode:<14} {rate:>8.0f} {status:>6} {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
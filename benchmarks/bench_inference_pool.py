@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Sensor-path latency while photos are being classified: in-thread vs process pool.
+
+Runs the Flask app on a local port with a stand-in classifier that burns
+--infer-ms of pure-Python CPU per image (holding the GIL, like a model
+without native threading). --clients threads keep posting distinct images
+to /api/meal/raw while a probe hits GET /api/sensor/weight every 20 ms.
+
+  thread   inference in the web process (INFERENCE_PROCESSES=0)
+  pool     inference in --processes worker processes, queue of --queue images
+
+Reports probe latency, classified meals/s and 503 (queue full) responses.
+
+Usage (from repo root):
+  python benchmarks/bench_inference_pool.py [--infer-ms 150] [--clients 6] [--processes 2] [--queue 4] [--seconds 8]
+"""
+import argparse
+import http.client
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+from ai_model.model_registry import ModelBackend  # noqa: E402
+
+
+def _burn(n):
+    x = 0
+    for i in range(n):
+        x += i
+    return x
+
+
+class BusyBackend(ModelBackend):
+    """Fixed amount of pure-Python CPU work per image (about ms on an idle core), then a fixed label."""
+
+    name = "busy"
+
+    def __init__(self, ms):
+        t = time.perf_counter()
+        _burn(1_000_000)
+        self.iterations = int(1_000_000 * ms / 1000 / (time.perf_counter() - t))
+
+    def classify(self, image):
+        _burn(self.iterations)
+        return [("busy", "apple", 0.95)]
+
+
+def run(port, clients, seconds):
+    stop = time.time() + seconds
+    counts = {"ok": 0, "503": 0, "other": 0}
+    probes = []
+
+    def poster(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        n = 0
+        while time.time() < stop:
+            n += 1
+            conn.request("POST", "/api/meal/raw", f"image-{i}-{n}-{time.time()}".encode(),
+                         {"Content-Type": "image/jpeg", "X-Weight-Grams": "150"})
+            r = conn.getresponse()
+            r.read()
+            key = "ok" if r.status == 200 else "503" if r.status == 503 else "other"
+            counts[key] += 1
+            if r.status == 503:
+                time.sleep(0.05)  # a real client would honour Retry-After
+
+    def probe():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.time() < stop:
+            t = time.perf_counter()
+            conn.request("GET", "/api/sensor/weight")
+            conn.getresponse().read()
+            probes.append(time.perf_counter() - t)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=poster, args=(i,)) for i in range(clients)]
+    threads.append(threading.Thread(target=probe))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    probes.sort()
+    return (statistics.median(probes) * 1000, probes[int(len(probes) * 0.99) - 1] * 1000,
+            counts["ok"] / seconds, counts["503"], counts["other"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inference process pool benchmark")
+    ap.add_argument("--infer-ms", type=float, default=150)
+    ap.add_argument("--clients", type=int, default=6)
+    ap.add_argument("--processes", type=int, default=2)
+    ap.add_argument("--queue", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=8)
+    args = ap.parse_args()
+
+    os.environ.setdefault("MEAL_STORE", "memory")
+    os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+    os.environ.setdefault("FOOD_BATCH_MAX", "1")
+    from werkzeug.serving import make_server
+    from ai_model import food_classifier, model_registry
+    from ai_model.inference_pool import InferencePool
+    import app as web_app
+
+    # Installed before the pool forks, so every worker process inherits it warm.
+    model_registry._registry = model_registry.ModelRegistry([BusyBackend(args.infer_ms)])
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, web_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{args.infer_ms:.0f} ms CPU per image, {args.clients} uploading clients, {args.seconds:.0f}s per mode")
+    print(f"{'mode':<8} {'probe p50 ms':>12} {'probe p99 ms':>12} {'meals/s':>8} {'503s':>6} {'errors':>6}")
+    for mode in ("thread", "pool"):
+        food_classifier._batcher = None
+        food_classifier._pool = InferencePool(args.processes, args.queue) if mode == "pool" else None
+        p50, p99, rate, busy, other = run(server.server_port, args.clients, args.seconds)
+        print(f"{mode:<8} {p50:>12.1f} {p99:>12.1f} {rate:>8.1f} {busy:>6} {other:>6}")
+        if food_classifier._pool is not None:
+            print("pool:", food_classifier._pool.stats())
+            food_classifier._pool.shutdown()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Load test for the /api/live SSE channel: how many subscribers one process serves.
+
+Runs the Flask app on a local port (threaded werkzeug server, one thread per
+subscriber), connects N SSE clients from a single selector loop, then
+publishes weight updates at --rate Hz plus one meal per second for
+--seconds. Reports delivered events per second and publish -> client latency
+of weight updates. --slow adds clients that never read their socket, to show
+they don't hold up the others.
+
+Usage (from repo root):
+  python benchmarks/bench_live_updates.py [--subscribers 10 100 500 1000] [--rate 80] [--seconds 5] [--slow 0]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import selectors
+import socket
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+
+def open_client(port, read=True):
+    sock = socket.create_connection(("127.0.0.1", port))
+    if not read:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.sendall(b"GET /api/live HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+    return sock
+
+
+class Clients:
+    """Reads all SSE sockets in one thread and records weight latencies."""
+
+    def __init__(self, socks):
+        self.sel = selectors.DefaultSelector()
+        self.buffers = {}
+        for s in socks:
+            s.setblocking(False)
+            self.sel.register(s, selectors.EVENT_READ)
+            self.buffers[s] = b""
+        self.latencies = []
+        self.events = 0
+        self.ready = set()
+        self.stop = False
+
+    def run(self):
+        while not self.stop:
+            for key, _ in self.sel.select(timeout=0.1):
+                sock = key.fileobj
+                try:
+                    chunk = sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.sel.unregister(sock)
+                    continue
+                now = time.time()
+                buf = self.buffers[sock] + chunk
+                *messages, self.buffers[sock] = buf.split(b"\n\n")
+                for msg in messages:
+                    if b"event: " not in msg:
+                        continue
+                    self.ready.add(sock)
+                    self.events += 1
+                    if b"event: weight" in msg:
+                        data = json.loads(msg.rsplit(b"data: ", 1)[1])
+                        if "t" in data:
+                            self.latencies.append(now - data["t"])
+
+
+def run_level(web_app, port, n, slow, rate, seconds):
+    socks = [open_client(port) for _ in range(n)]
+    idle = [open_client(port, read=False) for _ in range(slow)]
+    clients = Clients(socks)
+    reader = threading.Thread(target=clients.run, daemon=True)
+    reader.start()
+    deadline = time.time() + 30
+    while len(clients.ready) < n and time.time() < deadline:
+        time.sleep(0.05)
+    connected = len(clients.ready)
+    clients.events, clients.latencies = 0, []
+
+    start = time.time()
+    i = 0
+    while time.time() - start < seconds:
+        i += 1
+        web_app.live.publish("weight", {"scale_id": "default", "weight_g": 300.0 + i % 7, "t": time.time()})
+        if i % int(rate) == 0:
+            web_app.live.publish("meal", {"food_id": "apple", "weight_g": 150.0, "ts": time.time()},
+                                 user_id=web_app.DEFAULT_USER)
+        time.sleep(max(0.0, start + i / rate - time.time()))
+    time.sleep(0.5)
+    elapsed = time.time() - start
+    clients.stop = True
+    reader.join()
+    for s in socks + idle:
+        s.close()
+    lat = sorted(clients.latencies) or [float("nan")]
+    return (connected, clients.events / elapsed, statistics.median(lat) * 1000,
+            lat[int(len(lat) * 0.99) - 1 if len(lat) > 1 else 0] * 1000)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SSE fan-out load test")
+    ap.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 500, 1000])
+    ap.add_argument("--rate", type=float, default=80, help="Weight publishes per second")
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--slow", type=int, default=0, help="Extra clients that never read")
+    args = ap.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 4 * max(args.subscribers) + 256)), hard))
+    os.environ.setdefault("MEAL_STORE", "memory")
+    os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+    from werkzeug.serving import make_server
+    import app as web_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, web_app.app, threaded=True)
+    server.socket.listen(2048)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"weight at {args.rate:.0f}/s + 1 meal/s for {args.seconds:.0f}s, {args.slow} non-reading clients")
+    print(f"{'subscribers':>11} {'connected':>9} {'events/s':>10} {'per client':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in args.subscribers:
+        connected, eps, p50, p99 = run_level(web_app, server.server_port, n, args.slow, args.rate, args.seconds)
+        print(f"{n:>11} {connected:>9} {eps:>10.0f} {eps / max(connected, 1):>10.1f} {p50:>8.1f} {p99:>8.1f}")
+        time.sleep(0.5)
+    print("publisher:", web_app.live.stats())
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS (server + clients): {rss_mb:.0f} MB")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Insert and /api/daily latency with a large meal log.
+
+Preloads N meals (default one million) spread over users and days into a fresh
+SQLite meal store, then measures single add_meal() latency and GET /api/daily
+through the Flask test client against that store.
+
+Usage (from repo root):
+  python benchmarks/bench_meal_store.py [--meals 1000000] [--users 10] [--samples 1000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+from storage.meal_store import SQLiteMealStore, make_meal
+
+NUTRITION = {"calories": 130.0, "protein": 2.7, "carbs": 28.0, "fat": 0.3}
+
+
+def preload(store, meals, users, chunk=20000):
+    start_ts = time.time() - 365 * 86400
+    step = 365 * 86400 / max(meals // users, 1)
+    done = 0
+    while done < meals:
+        n = min(chunk, meals - done)
+        by_user = {}
+        for i in range(done, done + n):
+            meal = make_meal("white_rice", 100.0, NUTRITION, 85, start_ts + (i // users) * step)
+            by_user.setdefault(f"user{i % users}", []).append(meal)
+        for user_id, batch in by_user.items():
+            store.add_meals(batch, user_id)
+        done += n
+
+
+def report(name, samples):
+    samples.sort()
+    print(f"{name:<18} p50 {statistics.median(samples) * 1000:7.3f} ms   "
+          f"p99 {samples[int(len(samples) * 0.99) - 1] * 1000:7.3f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Meal store benchmark")
+    ap.add_argument("--meals", type=int, default=1_000_000)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--samples", type=int, default=1000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bench.db")
+        store = SQLiteMealStore(path)
+        t0 = time.perf_counter()
+        preload(store, args.meals, args.users)
+        print(f"Preloaded {args.meals} meals in {time.perf_counter() - t0:.1f} s")
+
+        inserts = []
+        for _ in range(args.samples):
+            t = time.perf_counter()
+            store.add_meal(make_meal("banana", 120.0, NUTRITION, 85), "user0")
+            inserts.append(time.perf_counter() - t)
+        report("add_meal", inserts)
+
+        os.environ["SMART_MEAL_DB"] = path
+        os.environ["MEAL_STORE"] = "sqlite"
+        os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+        import app as web_app
+        client = web_app.app.test_client()
+        daily = []
+        for _ in range(args.samples):
+            t = time.perf_counter()
+            r = client.get("/api/daily?user_id=user0")
+            daily.append(time.perf_counter() - t)
+        assert r.status_code == 200
+        report("GET /api/daily", daily)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Scalar vs. vectorized nutrition calculation.
+
+Computes calories/protein/carbs/fat for N random (food, weight) pairs with a
+Python loop over calculate_nutrition() and with one calculate_nutrition_batch()
+call, checks the results are identical, and prints pairs/second for each.
+
+Usage (from repo root):
+  python benchmarks/bench_nutrition_batch.py [--pairs 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+from fusion.calorie_calc import calculate_nutrition, calculate_nutrition_batch
+from nutrition.load_db import load_nutrition_db
+from nutrition.nutrition_table import get_nutrition_table
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Nutrition batch benchmark")
+    ap.add_argument("--pairs", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    db = load_nutrition_db()
+    table = get_nutrition_table()
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(table), args.pairs)
+    foods = [table.names[r] for r in rows]
+    weights = np.round(rng.uniform(5, 800, args.pairs), 1)
+    weight_list = weights.tolist()
+
+    t0 = time.perf_counter()
+    scalar = [calculate_nutrition(f, w, db) for f, w in zip(foods, weight_list)]
+    t_scalar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = calculate_nutrition_batch(foods, weights)
+    t_names = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    calculate_nutrition_batch(rows, weights)
+    t_rows = time.perf_counter() - t0
+
+    for col, values in batch.items():
+        assert values.tolist() == [r[col] for r in scalar], col
+
+    print(f"{'scalar loop':<22} {args.pairs / t_scalar:>14,.0f} pairs/s")
+    print(f"{'batch (food names)':<22} {args.pairs / t_names:>14,.0f} pairs/s")
+    print(f"{'batch (row indices)':<22} {args.pairs / t_rows:>14,.0f} pairs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Packed, memory-mapped nutrition DB vs the same data as a JSON dict.
+
+Writes a synthetic FoodData Central CSV download (--foods foods, 13 nutrients
+each) to a temp folder, imports it with nutrition.build_db, and also saves the
+result in the repo's JSON format. Then compares:
+
+  load     time to get a usable DB (json.load vs NutritionDB.open) and the
+           Python heap it adds (tracemalloc)
+  get      db[key] for random keys (the binary DB decodes the row each time)
+  in       key in db
+  iterate  list(db)
+
+First checks that a food imported without fat is refused by /api/meal with a
+400, not a server error.
+
+Usage (from repo root):
+  python benchmarks/bench_nutrition_db.py [--foods 300000] [--lookups 100000]
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+from nutrition.binary_db import NutritionDB, write_db  # noqa: E402
+from nutrition.build_db import FDC_NUTRIENTS, DatabaseBuilder  # noqa: E402
+
+WORDS = ["rice", "chicken", "apple", "bread", "cheese", "soup", "beans", "yogurt", "pasta", "salad",
+         "raw", "cooked", "fried", "canned", "frozen", "whole", "low fat", "with salt", "brand"]
+
+
+def write_fdc_csv(folder, n_foods, seed=0):
+    """food.csv and food_nutrient.csv of a FoodData Central download, every default nutrient per food."""
+    rng = random.Random(seed)
+    ids = [ids[0] for ids in FDC_NUTRIENTS.values()]
+    with open(os.path.join(folder, "food.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["fdc_id", "data_type", "description", "food_category_id", "publication_date"])
+        for i in range(n_foods):
+            name = ", ".join(rng.sample(WORDS, 4))
+            w.writerow([100000 + i, "branded_food", f"{name.upper()} {i}", "", "2024-10-31"])
+    with open(os.path.join(folder, "food_nutrient.csv"), "w", newline="") as f:
+        f.write('"id","fdc_id","nutrient_id","amount"\n')
+        line_id = 0
+        for i in range(n_foods):
+            f.write("".join(f'"{line_id + j}","{100000 + i}","{nid}","{rng.uniform(0, 500):.2f}"\n'
+                            for j, nid in enumerate(ids)))
+            line_id += len(ids)
+
+
+def check_sparse_row(folder):
+    """POST /api/meal for a complete and a fat-less food of a packed DB; exits if either answer is wrong."""
+    path = os.path.join(folder, "sparse.bin")
+    write_db(path, ["rice_cooked", "mystery_bar"], [130, 2.7, 28.2, 0.3, 400, 5, 60, float("nan")],
+             ["calories", "protein", "carbs", "fat"])
+    os.environ.update({"NUTRITION_DB": path, "MEAL_STORE": "memory", "SMART_MEAL_WARMUP": "0"})
+    import app as web_app
+
+    client = web_app.app.test_client()
+    ok = client.post("/api/meal", json={"food_id": "rice_cooked", "weight_g": 100})
+    sparse = client.post("/api/meal", json={"food_id": "mystery_bar", "weight_g": 100})
+    if ok.status_code != 200 or sparse.status_code != 400:
+        sys.exit(f"Sparse row check failed: complete food -> {ok.status_code}, "
+                 f"food without fat -> {sparse.status_code} {sparse.get_data(as_text=True)[:200]}")
+    print(f"Food without fat: /api/meal -> 400 {sparse.get_json()['error']!r}")
+
+
+def timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t, out
+
+
+def heap_of(fn):
+    """Python heap growth in bytes of one call (traced separately: tracing slows the call down)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    out = fn()
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return grown
+
+
+def per_call_us(fn, keys):
+    t = time.perf_counter()
+    for k in keys:
+        fn(k)
+    return (time.perf_counter() - t) / len(keys) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Packed nutrition DB benchmark")
+    ap.add_argument("--foods", type=int, default=300000)
+    ap.add_argument("--lookups", type=int, default=100000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        check_sparse_row(folder)
+        t, _ = timed(lambda: write_fdc_csv(folder, args.foods))
+        print(f"Synthetic FoodData Central CSV: {args.foods} foods x {len(FDC_NUTRIENTS)} nutrients ({t:.1f} s)")
+        builder = DatabaseBuilder()
+        t, _ = timed(lambda: builder.add_fdc_csv(folder))
+        bin_path = os.path.join(folder, "foods.bin")
+        json_path = os.path.join(folder, "foods.json")
+        write_db(bin_path, builder.keys, builder.values, builder.columns)
+        n_cols = len(builder.columns)
+        with open(json_path, "w") as f:
+            json.dump({k: dict(zip(builder.columns, builder.values[i * n_cols:(i + 1) * n_cols]))
+                       for i, k in enumerate(builder.keys)}, f)
+        print(f"Imported {len(builder.keys)} foods in {t:.1f} s; "
+              f"binary {os.path.getsize(bin_path) / 1e6:.1f} MB, JSON {os.path.getsize(json_path) / 1e6:.1f} MB\n")
+
+        def load_json():
+            with open(json_path) as f:
+                return json.load(f)
+
+        json_heap = heap_of(load_json)
+        bin_heap = heap_of(lambda: NutritionDB.open(bin_path))
+        json_s, as_dict = timed(load_json)
+        bin_s, packed = timed(lambda: NutritionDB.open(bin_path))
+        keys = random.Random(1).choices(builder.keys, k=args.lookups)
+        assert all(packed[k] == as_dict[k] for k in keys[:1000])
+        misses = [k + "_missing" for k in keys]
+
+        print(f"{'':<14} {'JSON dict':>14} {'packed mmap':>14}")
+        print(f"{'load ms':<14} {json_s * 1000:>14.1f} {bin_s * 1000:>14.3f}")
+        print(f"{'load heap MB':<14} {json_heap / 1e6:>14.1f} {bin_heap / 1e6:>14.3f}")
+        print(f"{'get us':<14} {per_call_us(as_dict.__getitem__, keys):>14.2f} "
+              f"{per_call_us(packed.__getitem__, keys):>14.2f}")
+        print(f"{'in (hit) us':<14} {per_call_us(as_dict.__contains__, keys):>14.2f} "
+              f"{per_call_us(packed.__contains__, keys):>14.2f}")
+        print(f"{'in (miss) us':<14} {per_call_us(as_dict.__contains__, misses):>14.2f} "
+              f"{per_call_us(packed.__contains__, misses):>14.2f}")
+        print(f"{'iterate ms':<14} {timed(lambda: list(as_dict))[0] * 1000:>14.1f} "
+              f"{timed(lambda: list(packed))[0] * 1000:>14.1f}")
+        del packed
+
+
+if __name__ == "__main__":
+    main()
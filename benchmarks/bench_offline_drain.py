@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Drain rate of the Pi's offline queue after a simulated outage.
+
+Fills an OfflineQueue (scripts/offline_queue.py) with --hours of 80 Hz scale
+readings in 5 s chunks plus --meals meals logged by food_id and --photos
+photo meals, exactly as pi_load_cell.py / pi_camera_meal.py would while the
+server is down. Then it starts the web app on a local port (SQLite store,
+mock classifier) and drains the queue to POST /api/bulk for each
+--batch-items setting, reporting items/s, samples/s and bytes on the wire.
+Finally it re-sends one batch, as a client would after losing a response,
+and checks that every item comes back as a duplicate.
+
+Usage (from repo root):
+  python benchmarks/bench_offline_drain.py [--hours 1] [--rate 80] [--meals 20] [--photos 4] [--batch-items 50 200 500]
+"""
+import argparse
+import gzip
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import requests  # noqa: E402
+
+from offline_queue import OfflineQueue  # noqa: E402
+
+CHUNK_S = 5.0
+
+
+class CountingSession(requests.Session):
+    """Session that adds up request body bytes."""
+
+    sent_bytes = 0
+
+    def post(self, url, data=None, **kwargs):
+        self.sent_bytes += len(data or b"")
+        return super().post(url, data=data, **kwargs)
+
+
+def fill(outbox, scale_id, hours, rate, meals, photos, jpeg):
+    """Queue an outage's worth of readings and meals; returns the number of samples."""
+    rng = random.Random(0)
+    start = time.time() - hours * 3600
+    n = int(hours * 3600 * rate)
+    chunk, samples = [], 0
+    meal_at = {int(n * (i + 0.5) / max(meals + photos, 1)) for i in range(meals + photos)}
+    photo_left = photos
+    for i in range(n):
+        ts = start + i / rate
+        weight = 0.0 if (ts // 600) % 2 else 350.0 - 30.0 * ((ts % 600) // 120)
+        chunk.append((ts, weight + rng.gauss(0, 0.4), weight > 0))
+        if len(chunk) >= CHUNK_S * rate:
+            outbox.put_readings(scale_id, chunk)
+            samples += len(chunk)
+            chunk = []
+        if i in meal_at:
+            if photo_left:
+                outbox.put_meal(image=jpeg, ts=ts, user_id=scale_id, scale_id=scale_id)
+                photo_left -= 1
+            else:
+                outbox.put_meal(food_id="white_rice", ts=ts, user_id=scale_id, scale_id=scale_id)
+    if chunk:
+        outbox.put_readings(scale_id, chunk)
+        samples += len(chunk)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline queue drain benchmark")
+    ap.add_argument("--hours", type=float, default=1.0)
+    ap.add_argument("--rate", type=float, default=80.0)
+    ap.add_argument("--meals", type=int, default=20)
+    ap.add_argument("--photos", type=int, default=4)
+    ap.add_argument("--batch-items", type=int, nargs="+", default=[50, 200, 500])
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["SMART_MEAL_DB"] = os.path.join(tmp, "server.db")
+    os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+    from PIL import Image
+    from werkzeug.serving import make_server
+    import app as web_app
+
+    buf = io.BytesIO()
+    Image.new("RGB", (224, 224), (200, 160, 90)).save(buf, "JPEG", quality=85)
+    jpeg = buf.getvalue()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, web_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"outage {args.hours:g} h at {args.rate:g} Hz, {args.meals} meals + {args.photos} photos")
+    print(f"{'batch':>6} {'items':>6} {'samples':>8} {'fill s':>7} {'queue MB':>9} {'drain s':>8} "
+          f"{'items/s':>8} {'samples/s':>10} {'wire MB':>8} {'meals':>6}")
+    for batch_items in args.batch_items:
+        scale_id = f"bench-{batch_items}"
+        outbox = OfflineQueue(os.path.join(tmp, f"outbox-{batch_items}.db"), batch_items)
+        t = time.perf_counter()
+        samples = fill(outbox, scale_id, args.hours, args.rate, args.meals, args.photos, jpeg)
+        fill_s = time.perf_counter() - t
+        items = len(outbox)
+        queue_mb = sum(os.path.getsize(outbox.path + ext) for ext in ("", "-wal")
+                       if os.path.exists(outbox.path + ext)) / 1e6
+        first_batch = [body for _, body in outbox._batch(min(batch_items, 20))]
+
+        session = CountingSession()
+        t = time.perf_counter()
+        while len(outbox):
+            outbox.send_batch(url, session)
+        drain_s = time.perf_counter() - t
+        logged = len(web_app.store.recent_meals(scale_id, args.meals + args.photos + 1))
+        print(f"{batch_items:>6} {items:>6} {samples:>8} {fill_s:>7.1f} {queue_mb:>9.1f} {drain_s:>8.2f} "
+              f"{items / drain_s:>8.0f} {samples / drain_s:>10.0f} {session.sent_bytes / 1e6:>8.2f} {logged:>6}")
+
+        replay = gzip.compress(b'{"items":[' + b",".join(first_batch) + b"]}")
+        r = requests.post(f"{url}/api/bulk", data=replay,
+                          headers={"Content-Type": "application/json", "Content-Encoding": "gzip"}).json()
+        ok = len(r["duplicates"]) == len(first_batch) and not r["accepted"]
+        print(f"{'':>6} replay of {len(first_batch)} items: {len(r['duplicates'])} duplicates, "
+              f"{len(r['accepted'])} accepted -> {'idempotent' if ok else 'NOT idempotent'}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and end-to-end latency per Pi camera upload mode.
+
+Runs the Flask app on a local port behind a throttling TCP proxy (default
+2 Mbit/s each way, like a weak Wi-Fi link to the Pi) and sends the same
+640x480 camera-style frame with scripts/pi_camera_meal.py:
+
+  multipart full      old behaviour: whole JPEG as multipart to /api/meal
+  multipart 224       resized/cropped in memory, multipart
+  raw full            whole JPEG to /api/meal/raw
+  raw 224             resized/cropped, raw bytes
+  base64 JSON         size of the /api/analyze-image body (wire size only)
+
+Usage (from repo root):
+  python benchmarks/bench_pi_upload.py [--kbps 2000] [--requests 10] [--quality 85]
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+
+class ThrottledProxy:
+    """TCP proxy that caps throughput per direction and counts bytes."""
+
+    def __init__(self, upstream_port, kbps):
+        self.upstream_port = upstream_port
+        self.bytes_per_s = kbps * 1000 / 8
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self._sock.accept()
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port))
+            threading.Thread(target=self._pump, args=(client, upstream, True), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client, False), daemon=True).start()
+
+    def _pump(self, src, dst, up):
+        try:
+            while True:
+                chunk = src.recv(4096)
+                if not chunk:
+                    break
+                time.sleep(len(chunk) / self.bytes_per_s)
+                if up:
+                    self.bytes_up += len(chunk)
+                else:
+                    self.bytes_down += len(chunk)
+                dst.sendall(chunk)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def camera_frame():
+    """640x480 JPEG with smooth regions and sensor noise, closer to a real photo than pure noise."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+    rng = np.random.default_rng(0)
+    img = Image.new("RGB", (640, 480), (200, 190, 170))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((120, 80, 520, 440), fill=(245, 245, 240))
+    draw.ellipse((200, 160, 360, 320), fill=(230, 190, 60))
+    draw.ellipse((330, 200, 470, 360), fill=(180, 90, 40))
+    arr = np.asarray(img, dtype=np.int16) + rng.integers(-12, 12, (480, 640, 3))
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pi upload mode benchmark")
+    ap.add_argument("--kbps", type=float, default=2000, help="Link speed per direction (kbit/s)")
+    ap.add_argument("--requests", type=int, default=10)
+    ap.add_argument("--quality", type=int, default=85)
+    args = ap.parse_args()
+
+    os.environ.setdefault("MEAL_STORE", "memory")
+    os.environ.setdefault("SMART_MEAL_WARMUP", "0")
+    from werkzeug.serving import make_server
+    import app as web_app
+    import pi_camera_meal
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, web_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = ThrottledProxy(server.server_port, args.kbps)
+    base = f"http://127.0.0.1:{proxy.port}"
+
+    full = camera_frame()
+    small = pi_camera_meal.prepare_image(io.BytesIO(full), pi_camera_meal.MODEL_INPUT_SIZE, args.quality)
+
+    print(f"Link: {args.kbps:.0f} kbit/s per direction | frame {len(full)} B, resized {len(small)} B")
+    print(f"{'mode':<16} {'up bytes':>9} {'down bytes':>10} {'p50 ms':>8} {'max ms':>8}")
+    for name, data, raw in (("multipart full", full, False), ("multipart 224", small, False),
+                            ("raw full", full, True), ("raw 224", small, True)):
+        up0, down0 = proxy.bytes_up, proxy.bytes_down
+        samples = []
+        for _ in range(args.requests):
+            t = time.perf_counter()
+            r = pi_camera_meal.send_meal_bytes(base, data, 150.0, raw=raw)
+            samples.append(time.perf_counter() - t)
+            assert r is not None and r.ok, r.text if r is not None else "request failed"
+        time.sleep(0.2)  # let the proxy finish counting the last response
+        up = (proxy.bytes_up - up0) / args.requests
+        down = (proxy.bytes_down - down0) / args.requests
+        print(f"{name:<16} {up:>9.0f} {down:>10.0f} {statistics.median(samples) * 1000:>8.1f} "
+              f"{max(samples) * 1000:>8.1f}")
+    for name, data in (("base64 JSON full", full), ("base64 JSON 224", small)):
+        body = json.dumps({"imageBase64": base64.b64encode(data).decode(), "weightGrams": 150.0})
+        print(f"{name:<16} {len(body):>9} {'-':>10} {'-':>8} {'-':>8}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
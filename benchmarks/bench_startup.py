@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Web app startup cost per classifier configuration: import time and RSS.
+
+Each configuration imports web_app/app.py in a fresh interpreter and reports
+how long until the app could serve its first request (the import returns),
+RSS at that point, and when the model is ready plus RSS after it loaded:
+
+  eager-tf    TensorFlow imported up front, as food_classifier used to (skipped if not installed)
+  warm-up     SMART_MEAL_WARMUP=1: model loaded before serving (default)
+  background  SMART_MEAL_WARMUP=background: serving starts, model loads on a thread
+  lazy        SMART_MEAL_WARMUP=0: model loads on the first photo (timed as one classify)
+  no-ml       SMART_MEAL_ML=0: sensor-only node, no model at all
+
+Usage (from repo root):
+  python benchmarks/bench_startup.py [--model ai_model/food_model.tflite] [--runs 3]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+CONFIGS = {
+    "eager-tf": {"SMART_MEAL_WARMUP": "1", "BENCH_IMPORT_TF": "1"},
+    "warm-up": {"SMART_MEAL_WARMUP": "1"},
+    "background": {"SMART_MEAL_WARMUP": "background"},
+    "lazy": {"SMART_MEAL_WARMUP": "0"},
+    "no-ml": {"SMART_MEAL_ML": "0"},
+}
+
+CHILD = r"""
+import json, os, sys, threading, time
+def rss_mb():
+    for line in open("/proc/self/status"):
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+start = time.perf_counter()
+if os.environ.get("BENCH_IMPORT_TF"):
+    import tensorflow
+import app
+ready = time.perf_counter() - start
+ready_rss = rss_mb()
+from ai_model import food_classifier
+model = None
+if food_classifier.ML_ENABLED:
+    for t in threading.enumerate():
+        if t.name == "model-warm-up":
+            t.join()
+    food_classifier.get_registry().warm_up()
+    model = time.perf_counter() - start
+print(json.dumps({"ready": ready, "ready_rss": ready_rss, "model": model, "rss": rss_mb()}))
+"""
+
+
+def run(env_extra, runs):
+    env = dict(os.environ, MEAL_STORE="memory", PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "web_app")]),
+               **env_extra)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True,
+                             check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {k: statistics.median(s[k] for s in samples) if samples[0][k] is not None else None
+            for k in samples[0]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Web app startup benchmark")
+    ap.add_argument("--model", help="TFLite model to load (sets FOOD_TFLITE_MODEL)")
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+    if args.model:
+        os.environ["FOOD_TFLITE_MODEL"] = os.path.abspath(args.model)
+
+    print(f"median of {args.runs} runs | MEAL_STORE=memory")
+    print(f"{'config':<11} {'ready ms':>9} {'RSS MB':>7} {'model ms':>9} {'RSS MB':>7}")
+    for name, env in CONFIGS.items():
+        if "BENCH_IMPORT_TF" in env and importlib.util.find_spec("tensorflow") is None:
+            print(f"{name:<11} {'(tensorflow not installed)':>35}")
+            continue
+        r = run(env, args.runs)
+        model = f"{r['model'] * 1000:>9.0f}" if r["model"] is not None else f"{'-':>9}"
+        print(f"{name:<11} {r['ready'] * 1000:>9.0f} {r['ready_rss']:>7.0f} {model} {r['rss']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Per-stage microbenchmarks for the meal pipeline, with JSON baselines and a
+regression gate.
+
+Each stage runs on fixed inputs (a seeded synthetic photo, fixed foods,
+labels and nutrition values):
+
+  nutrition.load_db          load_nutrition_db()
+  fusion.calculate_nutrition calculate_nutrition() for every food in the DB
+  health.compute_score       compute_health_score() for 8 fixed meals
+  fusion.resolve             FoodResolver.resolve() for 8 classifier-style labels
+  ai_model.preprocess        decode + resize a 640x480 JPEG to the model input
+  ai_model.classify[mock]    classify_food() dispatch with the mock backend
+  ai_model.classify[tflite]  classify_food() with --tflite-model (skipped without one)
+  flask.post_meal            POST /api/meal {food_id, weight_g} via the test client
+  flask.post_meal_photo      POST /api/meal multipart photo (mock results are not cached)
+  flask.get_daily            GET /api/daily
+  flask.get_foods            GET /api/foods
+
+A stage is called in a loop long enough for one sample to take --sample-ms
+(with the GC off, as timeit does); --samples such samples give the per-call
+min, median and IQR. All stages are measured --repeats times, interleaved, and
+a stage's result is the median of its repeats' medians; their range relative
+to it is the stage's spread. Stages are compared by that median.
+
+  python benchmarks/bench_suite.py                          # run and print
+  python benchmarks/bench_suite.py --save                   # write the baseline
+  python benchmarks/bench_suite.py --check [--threshold 0.25]
+
+--check exits with status 1 if any stage's median is slower than in the
+baseline by more than --threshold (fraction) plus twice the stage's noise (the
+larger spread or IQR/median of the two runs), so a noisy stage needs a larger
+slowdown to fail. Baselines are only comparable on the same machine and
+Python; the file records both and --check warns on a mismatch.
+
+The classifier stages run against their own registries through
+model_registry.override_registry(); the process-wide one is restored after.
+
+Usage (from repo root):
+  python benchmarks/bench_suite.py [--baseline benchmarks/baseline.json] [--save | --check]
+      [--stages flask ai_model.preprocess] [--repeats 5] [--samples 15] [--sample-ms 20]
+      [--tflite-model model.tflite]
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+LABELS = ["Granny Smith", "banana", "pizza", "French loaf", "orange", "chicken breast", "steamed rice",
+          "unknown object"]
+MEALS = [
+    {"calories": 620, "protein": 12, "fat": 18},
+    {"calories": 95, "protein": 0.5, "fat": 0.3},
+    {"calories": 285, "protein": 12.2, "fat": 10.4},
+    {"calories": 1200, "protein": 45, "fat": 60},
+    {"calories": 130, "protein": 2.7, "fat": 0.3},
+    {"calories": 450, "protein": 30, "fat": 12},
+    {"calories": 52, "protein": 0.3, "fat": 0.2},
+    {"calories": 800, "protein": 8, "fat": 40},
+]
+
+
+def sample_jpeg(width=640, height=480):
+    """Seeded photo-like JPEG: smooth gradients plus noise, so it compresses like a real frame."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def build_stages(tflite_model=None):
+    """[(name, fn or None)] in pipeline order; None marks a stage that can't run here.
+
+    Call and run them with the mock registry installed (see main()).
+    """
+    import numpy as np
+    from PIL import Image
+
+    from ai_model import food_classifier
+    from ai_model.model_registry import ModelRegistry, TFLiteBackend, override_registry
+    from ai_model.preprocess import preprocess
+    from fusion.calorie_calc import calculate_nutrition
+    from fusion.food_resolver import FoodResolver
+    from health_score.score_logic import compute_health_score
+    from nutrition.load_db import load_nutrition_db
+
+    db = load_nutrition_db()
+    foods = sorted(db)
+    resolver = FoodResolver(foods)
+    jpeg = sample_jpeg()
+    frame = np.asarray(Image.open(io.BytesIO(jpeg)).convert("RGB"))
+    tflite = None
+    if tflite_model and os.path.exists(tflite_model):
+        tflite = ModelRegistry([TFLiteBackend(tflite_model)])
+        if tflite.get("tflite") is None:
+            tflite = None
+
+    def classify():
+        # An array, not bytes: bytes would be answered by the result cache.
+        return food_classifier.classify_food(frame)
+
+    def classify_tflite():
+        with override_registry(tflite):
+            return classify()
+
+    # The web app against a throwaway in-memory store and the mock classifier.
+    os.environ["MEAL_STORE"] = "memory"
+    os.environ["SMART_MEAL_WARMUP"] = "0"
+    import app as web_app
+    client = web_app.app.test_client()
+
+    def post_meal():
+        r = client.post("/api/meal", json={"food_id": "white_rice", "weight_g": 180})
+        assert r.status_code == 200, r.data
+
+    def post_meal_photo():
+        r = client.post("/api/meal", data={"food_image": (io.BytesIO(jpeg), "meal.jpg"), "weight_g": "180"},
+                        content_type="multipart/form-data")
+        assert r.status_code == 200, r.data
+
+    def get(url):
+        def run():
+            r = client.get(url)
+            assert r.status_code == 200, r.data
+        return run
+
+    return [
+        ("nutrition.load_db", load_nutrition_db),
+        ("fusion.calculate_nutrition", lambda: [calculate_nutrition(f, 150, db) for f in foods]),
+        ("health.compute_score", lambda: [compute_health_score(m) for m in MEALS]),
+        ("fusion.resolve", lambda: [resolver.resolve(label) for label in LABELS]),
+        ("ai_model.preprocess", lambda: preprocess(jpeg)),
+        ("ai_model.classify[mock]", classify),
+        ("ai_model.classify[tflite]", classify_tflite if tflite else None),
+        ("flask.post_meal", post_meal),
+        ("flask.post_meal_photo", post_meal_photo),
+        ("flask.get_daily", get("/api/daily")),
+        ("flask.get_foods", get("/api/foods")),
+    ]
+
+
+def measure(fn, samples, sample_s):
+    """Per-call seconds: min, median and IQR over samples of an auto-ranged loop."""
+    fn()  # warm-up: lazy imports, caches, first-call allocations
+    loops = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t >= sample_s or loops >= 1 << 20:
+            break
+        loops *= 2
+    times = []
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            t = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            times.append((time.perf_counter() - t) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    q1, _, q3 = statistics.quantiles(times, n=4)
+    return {
+        "min_us": min(times) * 1e6,
+        "median_us": statistics.median(times) * 1e6,
+        "iqr_us": (q3 - q1) * 1e6,
+        "loops": loops,
+        "samples": samples,
+    }
+
+
+def run_stages(stages, repeats, samples, sample_s):
+    """{name: stats or None}: every stage measured repeats times, one round of all stages after another."""
+    runs = {name: [] for name, fn in stages if fn is not None}
+    for _ in range(repeats):
+        for name, fn in stages:
+            if fn is not None:
+                runs[name].append(measure(fn, samples, sample_s))
+    return {name: summarize(runs[name]) if fn is not None else None for name, fn in stages}
+
+
+def summarize(runs):
+    """Median of the repeats' medians, with their range relative to it as the spread."""
+    medians = sorted(r["median_us"] for r in runs)
+    median = statistics.median(medians)
+    return {
+        "median_us": median,
+        "min_us": min(r["min_us"] for r in runs),
+        "iqr_us": statistics.median(r["iqr_us"] for r in runs),
+        "spread": (medians[-1] - medians[0]) / median,
+        "repeat_medians_us": medians,
+        "loops": runs[0]["loops"],
+        "samples": runs[0]["samples"],
+        "repeats": len(runs),
+    }
+
+
+def noise(stats):
+    """Relative noise of a stage: the spread of its repeats or its IQR/median, whichever is larger."""
+    return max(stats.get("spread", 0.0), stats["iqr_us"] / stats["median_us"])
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print current vs baseline per stage; returns the names that regressed.
+
+    A stage may be threshold plus twice its noise (in either run) slower.
+    """
+    old = baseline.get("stages", {})
+    regressed = []
+    print(f"{'stage':<28} {'baseline us':>12} {'now us':>12} {'change':>8} {'allowed':>8}  status")
+    for name, stats in results.items():
+        if stats is None:
+            print(f"{name:<28} {'':>12} {'':>12} {'':>8} {'':>8}  skipped")
+            continue
+        before = old.get(name)
+        if before is None:
+            print(f"{name:<28} {'':>12} {stats['median_us']:>12.1f} {'':>8} {'':>8}  new")
+            continue
+        change = stats["median_us"] / before["median_us"] - 1
+        allowed = threshold + 2 * max(noise(before), noise(stats))
+        if change > allowed:
+            status = "REGRESSED"
+            regressed.append(name)
+        else:
+            status = "faster" if change < -allowed else "ok"
+        print(f"{name:<28} {before['median_us']:>12.1f} {stats['median_us']:>12.1f} {change:>+8.1%} "
+              f"{allowed:>+8.0%}  {status}")
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Meal pipeline microbenchmarks with regression gating")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    mode.add_argument("--check", action="store_true", help="Compare with the baseline; exit 1 on regression")
+    ap.add_argument("--threshold", type=float, default=0.25,
+                    help="Allowed slowdown of the median (fraction), on top of the measured noise")
+    ap.add_argument("--stages", nargs="+", help="Only stages whose name starts with one of these")
+    ap.add_argument("--repeats", type=int, default=5, help="Rounds over all stages; results are their median")
+    ap.add_argument("--samples", type=int, default=15)
+    ap.add_argument("--sample-ms", type=float, default=20)
+    ap.add_argument("--tflite-model", default=os.environ.get("FOOD_TFLITE_MODEL"))
+    args = ap.parse_args()
+
+    from ai_model.model_registry import MockBackend, ModelRegistry, override_registry
+
+    with override_registry(ModelRegistry([MockBackend()])):
+        stages = build_stages(args.tflite_model)
+        if args.stages:
+            stages = [(name, fn) for name, fn in stages if name.startswith(tuple(args.stages))]
+        results = run_stages(stages, max(1, args.repeats), args.samples, args.sample_ms / 1000)
+
+    print(f"{'stage':<28} {'median us':>12} {'min us':>12} {'IQR/med':>7} {'spread':>7} {'loops':>7}")
+    for name, stats in results.items():
+        if stats is None:
+            print(f"{name:<28} {'skipped':>12}")
+            continue
+        print(f"{name:<28} {stats['median_us']:>12.1f} {stats['min_us']:>12.1f} "
+              f"{stats['iqr_us'] / stats['median_us']:>7.1%} {stats['spread']:>7.1%} {stats['loops']:>7}")
+
+    if args.save:
+        data = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": machine(),
+                "stages": {name: stats for name, stats in results.items() if stats is not None}}
+        if args.stages and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            data["stages"] = {**previous.get("stages", {}), **data["stages"]}
+        with open(args.baseline, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+    elif args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save first")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != machine():
+            print(f"\nwarning: baseline was recorded on {baseline.get('machine')}, this is {machine()}")
+        print(f"\nagainst {args.baseline} ({baseline.get('created')}), threshold {args.threshold:+.0%}")
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            sys.exit(f"\n{len(regressed)} stage(s) regressed: {', '.join(regressed)}")
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
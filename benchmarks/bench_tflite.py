@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Float vs int8 TFLite food model: accuracy and per-image latency.
+
+Classifies every image under --images with each model given. Images are
+sorted into one folder per food (the folder name is the true label, e.g.
+images/apple/1.jpg). A prediction counts when its label resolves to the same
+nutrition DB food as the folder name, so "Granny_Smith" still counts for apple.
+Folders whose name does not resolve to a DB food are skipped and reported.
+Latency is measured one image per invoke (like a single camera upload), after
+one warm-up, on --threads threads with the chosen delegate. The target is
+p50 under 100 ms on a Raspberry Pi 4.
+
+Usage (from repo root; needs tflite-runtime or ai-edge-litert):
+  python benchmarks/bench_tflite.py --float food_float.tflite --int8 food_int8.tflite \
+      --images food_photos/ [--labels labels.txt] [--threads 4] [--delegate xnnpack] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ai_model.model_registry import TFLiteBackend
+from fusion.food_resolver import FoodResolver
+from nutrition.load_db import load_nutrition_db
+
+TARGET_MS = 100
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(root):
+    """[(true label, image bytes)] from root/<label>/*.jpg."""
+    images = []
+    for label in sorted(os.listdir(root)):
+        folder = os.path.join(root, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTS):
+                with open(os.path.join(folder, name), "rb") as f:
+                    images.append((label, f.read()))
+    return images
+
+
+def resolve_truth(images, resolver):
+    """[(DB food, image bytes)] for images whose folder resolves, and the sorted unresolved folder names."""
+    truths = {label: resolver.resolve(label) for label in {label for label, _ in images}}
+    kept = [(truths[label], data) for label, data in images if truths[label] is not None]
+    return kept, sorted(label for label, truth in truths.items() if truth is None)
+
+
+def evaluate(backend, images, resolver, runs):
+    """images are (DB food, bytes) pairs with a resolved truth."""
+    top1 = top3 = 0
+    latencies = []
+    backend.classify(images[0][1])  # warm-up: first invoke allocates XNNPACK buffers
+    for truth, data in images:
+        for _ in range(runs):
+            t = time.perf_counter()
+            results = backend.classify(data) or []
+            latencies.append(time.perf_counter() - t)
+        predicted = [resolver.resolve(r[1]) for r in results]
+        top1 += bool(predicted) and predicted[0] == truth
+        top3 += truth in predicted
+    latencies.sort()
+    n = len(images)
+    return (100 * top1 / n, 100 * top3 / n, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.9) - 1] * 1000)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="TFLite float vs int8 benchmark")
+    ap.add_argument("--float", dest="float_model", help="float32 .tflite model")
+    ap.add_argument("--int8", dest="int8_model", help="int8/uint8 quantized .tflite model")
+    ap.add_argument("--images", required=True, help="folder with one subfolder of photos per food")
+    ap.add_argument("--labels", help="labels file (default: labels.txt next to each model)")
+    ap.add_argument("--threads", type=int, default=os.cpu_count())
+    ap.add_argument("--delegate", default="xnnpack", help="xnnpack, none, or a delegate library path")
+    ap.add_argument("--runs", type=int, default=3, help="timed invokes per image")
+    args = ap.parse_args()
+
+    models = [(name, path) for name, path in (("float", args.float_model), ("int8", args.int8_model)) if path]
+    if not models:
+        ap.error("give --float and/or --int8")
+    images = load_images(args.images)
+    if not images:
+        ap.error(f"no images found under {args.images}/<label>/")
+    resolver = FoodResolver(load_nutrition_db().keys())
+    total = len(images)
+    images, unresolved = resolve_truth(images, resolver)
+    if unresolved:
+        print(f"Skipping {total - len(images)} images in folders that match no nutrition DB food: "
+              f"{', '.join(unresolved)}")
+    if not images:
+        ap.error("no image folder resolves to a nutrition DB food")
+
+    print(f"{len(images)} images | {args.threads} threads | delegate {args.delegate} | target p50 < {TARGET_MS} ms")
+    print(f"{'model':<6} {'input':>7} {'size MB':>8} {'top-1 %':>8} {'top-3 %':>8} {'p50 ms':>8} {'p90 ms':>8}")
+    for name, path in models:
+        backend = TFLiteBackend(path, args.labels, args.threads, args.delegate)
+        backend.load()
+        top1, top3, p50, p90 = evaluate(backend, images, resolver, args.runs)
+        flag = "" if p50 < TARGET_MS else "  (over target)"
+        print(f"{name:<6} {backend.info()['input_dtype']:>7} {os.path.getsize(path) / 1e6:>8.1f} "
+              f"{top1:>8.1f} {top3:>8.1f} {p50:>8.1f} {p90:>8.1f}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Vision provider latency against a local stand-in HTTP server.
+
+Starts a threaded HTTP server that speaks just enough of the Gemini
+(generateContent) and OpenAI (chat/completions) REST APIs, with configurable
+latency and a slow tail for Gemini, points the real SDK clients at it and
+compares:
+
+  fresh     a new SDK client per request (the old behaviour)
+  pooled    long-lived clients from analyze_image
+  async     pooled clients run on the provider_pool event loop
+  hedged    Gemini first, OpenAI started after Gemini's p95
+
+Prints p50/p95/p99 latency and how many TCP connections each mode opened.
+
+Usage (from repo root; needs google-generativeai and openai installed):
+  python benchmarks/bench_vision_providers.py [--requests 200] [--slow-fraction 0.03]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "web_app"))
+
+ANSWER = json.dumps({"name": "Banana", "nutrition": {"calories": 89, "protein": 1.1, "carbs": 23, "fat": 0.3, "fiber": 2.6}})
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1  # headers + body in one write, so keep-alive isn't hit by Nagle/delayed ACK
+    connections = 0
+    gemini_ms = 40
+    openai_ms = 80
+    slow_ms = 1500
+    slow_fraction = 0.03
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if ":generateContent" in self.path:
+            slow = random.random() < self.slow_fraction
+            time.sleep((self.slow_ms if slow else self.gemini_ms) / 1000)
+            body = {"candidates": [{"content": {"role": "model", "parts": [{"text": ANSWER}]}}]}
+        else:
+            time.sleep(self.openai_ms / 1000)
+            body = {
+                "id": "chatcmpl-local", "object": "chat.completion", "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ANSWER}}],
+            }
+        out = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def sample_image():
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (230, 200, 40)).save(buf, "JPEG")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def measure(fn, n):
+    samples = []
+    before = StandIn.connections
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    return (statistics.median(samples) * 1000, samples[int(n * 0.95) - 1] * 1000,
+            samples[int(n * 0.99) - 1] * 1000, StandIn.connections - before)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vision provider stand-in benchmark")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--slow-fraction", type=float, default=0.03)
+    args = ap.parse_args()
+    random.seed(0)
+    StandIn.slow_fraction = args.slow_fraction
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update({
+        "GEMINI_API_KEY": "local", "OPENAI_API_KEY": "local",
+        "GEMINI_API_ENDPOINT": base, "OPENAI_BASE_URL": f"{base}/v1",
+    })
+
+    import analyze_image
+    from provider_pool import get_provider_pool
+
+    image = sample_image()
+
+    def fresh():
+        analyze_image._clients.clear()
+        analyze_image.analyze("gemini", image, 120.0, hedge=False)
+
+    def pooled():
+        analyze_image.analyze("gemini", image, 120.0, hedge=False)
+
+    def run_async():
+        analyze_image.VISION_ASYNC = True
+        try:
+            analyze_image.analyze("gemini", image, 120.0, hedge=False)
+        finally:
+            analyze_image.VISION_ASYNC = False
+
+    def hedged():
+        analyze_image.analyze("gemini", image, 120.0, hedge=True)
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'new conns':>10}")
+    for name, fn in (("fresh", fresh), ("pooled", pooled), ("async", run_async), ("hedged", hedged)):
+        p50, p95, p99, conns = measure(fn, args.requests)
+        print(f"{name:<8} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {conns:>10}")
+    print("hedging:", get_provider_pool().stats())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+/api/meal throughput under gunicorn with 1, 2 and 4 workers.
+
+Starts `gunicorn -c gunicorn.conf.py` per worker count on a fresh SQLite DB,
+pinned to --cpus CPUs (default 4, like a Raspberry Pi 4/5; fewer if this
+machine has fewer), and drives it with --concurrency keep-alive clients
+posting JSON meals for --seconds. Reports requests/s, latency, and memory:
+RSS summed over workers versus PSS (shared pages split between processes),
+which shows what preload_app saves.
+
+Usage (from repo root; needs gunicorn):
+  python benchmarks/bench_workers.py [--workers 1 2 4] [--cpus 4] [--concurrency 16] [--seconds 10]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/foods")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def memory_mb(pid):
+    """(RSS, PSS) in MB summed over pid's children (the workers)."""
+    rss = pss = 0
+    children = open(f"/proc/{pid}/task/{pid}/children").read().split()
+    for child in children:
+        for line in open(f"/proc/{child}/smaps_rollup"):
+            if line.startswith("Rss:"):
+                rss += int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss += int(line.split()[1])
+    return rss / 1024, pss / 1024
+
+
+def load(port, concurrency, seconds):
+    body = json.dumps({"food_id": "apple", "weight_g": 150})
+    headers = {"Content-Type": "application/json"}
+    latencies, errors = [], [0]
+    stop = time.time() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.time() < stop:
+            t = time.perf_counter()
+            try:
+                conn.request("POST", "/api/meal", body, headers)
+                r = conn.getresponse()
+                r.read()
+                ok = r.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t)
+            else:
+                errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], time.time() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description="gunicorn worker scaling benchmark")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--cpus", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+
+    available = sorted(os.sched_getaffinity(0))
+    cpus = set(available[:args.cpus])
+    print(f"gunicorn pinned to CPUs {sorted(cpus)} | {args.concurrency} clients | {args.seconds:.0f}s per run")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'RSS MB':>8} {'PSS MB':>8}")
+    for n in args.workers:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, WEB_WORKERS=str(n), WEB_THREADS=str(args.threads),
+                       SMART_MEAL_BIND=f"127.0.0.1:{port}", SMART_MEAL_DB=os.path.join(tmp, "bench.db"))
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+                cwd=ROOT, env=env, preexec_fn=lambda: os.sched_setaffinity(0, cpus),
+            )
+            try:
+                wait_ready(port)
+                load(port, args.concurrency, 1.0)  # warm connections and SQLite pages
+                latencies, errors, elapsed = load(port, args.concurrency, args.seconds)
+                rss, pss = memory_mb(proc.pid)
+            finally:
+                proc.terminate()
+                proc.wait()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+        print(f"{n:>7} {len(latencies) / elapsed:>8.0f} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{p99 * 1000:>8.1f} {errors:>7} {rss:>8.0f} {pss:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
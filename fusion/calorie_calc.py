@@ -1,9 +1,16 @@
+MACROS = ("calories", "protein", "carbs", "fat")
+
+
 def calculate_nutrition(food, weight, db):
     if food not in db:
         raise ValueError("Food not found in database")
 
     factor = weight / 100.0
     data = db[food]
+    # A packed DB leaves out unknown (NaN) nutrients, so a food imported without one has no key for it.
+    missing = [key for key in MACROS if key not in data]
+    if missing:
+        raise ValueError(f"No {', '.join(missing)} value for {food} in the nutrition database")
 
     return {
         "calories": round(data["calories"] * factor, 2),
@@ -11,3 +18,78 @@ def calculate_nutrition(food, weight, db):
         "carbs": round(data["carbs"] * factor, 2),
         "fat": round(data["fat"] * factor, 2)
     }
+
+
+def calculate_meal_nutrition(items, db):
+    """Combined nutrition for a plate of several foods.
+
+    items is a sequence of (food, weight) pairs. Returns {"items": [{"food_id",
+    "weight_g", "nutrition"}, ...], "total": {...}}, where each item's nutrition
+    is calculate_nutrition() for it and total is their sum.
+    """
+    breakdown = []
+    total = dict.fromkeys(MACROS, 0.0)
+    for food, weight in items:
+        nutrition = calculate_nutrition(food, weight, db)
+        breakdown.append({"food_id": food, "weight_g": weight, "nutrition": nutrition})
+        for key in total:
+            total[key] += nutrition[key]
+    return {"items": breakdown, "total": {key: round(value, 2) for key, value in total.items()}}
+
+
+def _round2(x):
+    """np.round(x, 2) that matches Python's round(v, 2) exactly.
+
+    NumPy rounds x * 100 after it has already been rounded to a double, which
+    flips some values that sit next to a .xx5 tie. Near ties are decided on the
+    exact product instead (Dekker's two-product), half to even like round().
+    """
+    import numpy as np
+
+    scaled = x * 100.0
+    out = np.rint(scaled)
+    floor = np.floor(scaled)
+    near_tie = np.abs(scaled - floor - 0.5) < 1e-6
+    if near_tie.any():
+        xs, ps, fs = x[near_tie], scaled[near_tie], floor[near_tie]
+        # Veltkamp split of x; 100 splits exactly, so err = x * 100 - ps exactly.
+        c = xs * 134217729.0
+        hi = c - (c - xs)
+        lo = xs - hi
+        err = (hi * 100.0 - ps) + lo * 100.0
+        above = (ps - fs - 0.5) + err
+        odd = np.fmod(fs, 2.0) != 0
+        out[near_tie] = fs + ((above > 0) | ((above == 0) & odd))
+    return out / 100.0
+
+
+def calculate_nutrition_batch(foods, weights, table=None):
+    """Nutrition for many (food, weight) pairs in one vectorized call.
+
+    foods is a sequence of food names (or an int array of table rows); weights
+    is a matching sequence of grams. Returns a dict of float64 arrays keyed
+    calories/protein/carbs/fat, each element equal to what calculate_nutrition
+    returns for that pair. Raises ValueError if any food is unknown or lacks
+    one of those values.
+    """
+    import numpy as np
+    from nutrition.nutrition_table import COLUMNS, get_nutrition_table
+
+    table = table or get_nutrition_table()
+    if isinstance(foods, np.ndarray) and foods.dtype.kind in "iu":
+        rows = foods
+    else:
+        rows = table.rows(list(foods))
+    missing = rows < 0
+    if missing.any():
+        unknown = sorted({foods[i] for i in np.flatnonzero(missing)[:10]})
+        raise ValueError(f"Food not found in database: {', '.join(map(str, unknown))}")
+
+    gathered = table.values[rows]
+    sparse = np.isnan(gathered).any(axis=1)
+    if sparse.any():
+        names = sorted({table.names[rows[i]] for i in np.flatnonzero(sparse)[:10]})
+        raise ValueError(f"Missing calories, protein, carbs or fat in the nutrition database: {', '.join(names)}")
+    factor = np.asarray(weights, dtype=np.float64) / 100.0
+    values = gathered * factor[:, None]
+    return {col: _round2(values[:, i]) for i, col in enumerate(COLUMNS)}
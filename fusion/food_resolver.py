@@ -0,0 +1,103 @@
+"""
+Resolve classifier labels (ImageNet names, model labels, user text) to
+nutrition DB keys.
+
+Built once per DB: exact keys and aliases (LABEL_MAP, IMAGENET_SYNONYMS) are
+dict hits; anything else is ranked by trigram similarity (Dice coefficient)
+using an inverted trigram index, so lookups stay sub-millisecond even with
+100k foods. A fuzzy match must also share a whole word with the label, so
+"pineapple" does not resolve to apple nor "fried rice" to fried_chicken.
+"""
+import numpy as np
+
+from ai_model.label_map import IMAGENET_SYNONYMS, LABEL_MAP
+
+# Below this similarity resolve() returns None rather than a poor guess.
+MIN_SCORE = 0.55
+
+
+def normalize(label):
+    return "_".join(str(label).strip().lower().replace("-", " ").replace("_", " ").split())
+
+
+def trigrams(text):
+    padded = f"  {text.replace('_', ' ')} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodResolver:
+    """Ranked label -> DB key matching over a fixed set of food keys."""
+
+    def __init__(self, food_keys, aliases=None):
+        self.keys = list(food_keys)
+        self._key_ids = {normalize(k): i for i, k in enumerate(self.keys)}
+        if aliases is None:
+            aliases = {**LABEL_MAP, **IMAGENET_SYNONYMS}
+        self._aliases = {}
+        for label, target in aliases.items():
+            target_id = self._key_ids.get(normalize(target))
+            if target_id is not None:
+                self._aliases[normalize(label)] = target_id
+
+        postings = {}
+        sizes = np.empty(len(self.keys), dtype=np.float64)
+        for i, key in enumerate(self.keys):
+            grams = trigrams(normalize(key))
+            sizes[i] = len(grams)
+            for g in grams:
+                postings.setdefault(g, []).append(i)
+        self._postings = {g: np.array(ids, dtype=np.intp) for g, ids in postings.items()}
+        self._sizes = sizes
+        self._lengths = [len(k) for k in self.keys]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def matches(self, label, limit=5):
+        """Up to limit (key, score) pairs, best first; score 1.0 for exact or alias hits."""
+        norm = normalize(label)
+        if not norm:
+            return []
+        exact = self._key_ids.get(norm)
+        if exact is None:
+            exact = self._aliases.get(norm)
+        if exact is not None:
+            return [(self.keys[exact], 1.0)]
+
+        grams = trigrams(norm)
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        if not lists:
+            return []
+        q = len(grams)
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.keys))
+        # Prune before scoring: a key sharing s grams scores at most 2s / (q + s), so
+        # only keys that could beat the key sharing the most grams are scored (for
+        # longer lists, keys that could reach half its score).
+        best = int(shared.argmax())
+        floor = 2.0 * shared[best] / (q + self._sizes[best])
+        if limit > 1:
+            floor *= 0.5
+        candidates = np.flatnonzero(shared >= floor * q / (2.0 - floor) - 1e-9)
+        scores = 2.0 * shared[candidates] / (q + self._sizes[candidates])
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            # Keep every candidate tied with the last kept score so tie-breaks are stable.
+            top = np.flatnonzero(scores >= scores[top].min())
+            candidates, scores = candidates[top], scores[top]
+        # Best score first; shorter (more generic) key, then DB order, wins ties.
+        ranked = sorted(range(len(candidates)), key=lambda j: (-scores[j], self._lengths[candidates[j]], candidates[j]))
+        return [(self.keys[candidates[j]], round(float(scores[j]), 4)) for j in ranked[:limit]]
+
+    def resolve(self, label, min_score=MIN_SCORE):
+        """Best DB key for label, or None if nothing is similar enough.
+
+        Exact and alias hits always resolve; a fuzzy match needs min_score and
+        at least one word in common with the label.
+        """
+        words = set(normalize(label).split("_"))
+        for key, score in self.matches(label, limit=3):
+            if score < min_score:
+                break
+            if score == 1.0 or words & set(normalize(key).split("_")):
+                return key
+        return None
@@ -0,0 +1,77 @@
+"""
+Multi-item plates: turn per-region classifier output into foods and grams.
+
+classify_regions() (ai_model.food_classifier) returns ranked labels for the
+whole plate and for each tile. detect_items() resolves them to nutrition DB
+keys and keeps every food that some region is confident about; split_weight()
+then shares the scale weight between those foods by how much of the plate
+each one covers, scaled by a typical portion size per food.
+"""
+import os
+
+PLATE_MIN_SCORE = float(os.environ.get("PLATE_MIN_SCORE", "0.3"))
+PLATE_MAX_ITEMS = int(os.environ.get("PLATE_MAX_ITEMS", "4"))
+
+# Typical grams on a plate; foods not listed count as DEFAULT_PORTION_G.
+# Only ratios matter: rice next to chicken gets 150:120 of equal coverage.
+DEFAULT_PORTION_G = 100.0
+PORTION_PRIORS_G = {
+    "white_rice": 150.0,
+    "brown_rice": 150.0,
+    "chapati": 80.0,
+    "bread": 60.0,
+    "grilled_chicken": 120.0,
+    "fried_chicken": 120.0,
+    "egg_boiled": 50.0,
+    "apple": 180.0,
+    "banana": 120.0,
+    "orange": 150.0,
+    "salad": 80.0,
+    "french_fries": 110.0,
+    "pizza": 150.0,
+}
+
+
+def detect_items(region_results, resolver, min_score=PLATE_MIN_SCORE, max_items=PLATE_MAX_ITEMS):
+    """Foods on the plate, best first: [{"food_id", "score", "coverage"}].
+
+    region_results is classify_regions() output (whole image first, then tiles).
+    score is a food's best probability in any region; coverage is its mean
+    probability over the tiles (the whole image when there are none), a rough
+    share of the plate area. Foods scoring below min_score are dropped, but the
+    best food is always kept so a plate never comes back empty.
+    """
+    tiles = region_results[1:] or region_results[:1]
+    found = {}
+    for n, results in enumerate(region_results):
+        seen = set()
+        for _, label, prob in results or ():
+            food_id = resolver.resolve(label)
+            if not food_id or food_id in seen:
+                continue
+            seen.add(food_id)  # a region votes once per food, with its best label
+            item = found.setdefault(food_id, {"food_id": food_id, "score": 0.0, "coverage": 0.0})
+            item["score"] = max(item["score"], prob)
+            if n > 0 or len(region_results) == 1:
+                item["coverage"] += prob / len(tiles)
+    ranked = sorted(found.values(), key=lambda item: -item["score"])
+    items = [item for item in ranked if item["score"] >= min_score][:max_items]
+    return items or ranked[:1]
+
+
+def split_weight(items, weight_g, priors=None):
+    """Share weight_g between detected items: [(food_id, grams)], in items order.
+
+    Each item's share is proportional to coverage x its portion prior. Grams are
+    rounded to 0.1 g and the rounding remainder goes to the largest share, so
+    the parts add up to weight_g exactly.
+    """
+    if not items:
+        return []
+    priors = PORTION_PRIORS_G if priors is None else priors
+    shares = [max(item["coverage"], 1e-3) * priors.get(item["food_id"], DEFAULT_PORTION_G) for item in items]
+    total = sum(shares)
+    grams = [round(weight_g * share / total, 1) for share in shares]
+    largest = shares.index(max(shares))
+    grams[largest] = round(weight_g - sum(grams) + grams[largest], 1)
+    return [(item["food_id"], g) for item, g in zip(items, grams)]
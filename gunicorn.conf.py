@@ -0,0 +1,24 @@
+# gunicorn.conf.py – production server for the Smart Meal web app
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Env: WEB_WORKERS (default 2), WEB_THREADS (default 8), SMART_MEAL_BIND
+# (default 0.0.0.0:5000). Each open /api/live stream or long poll holds one
+# thread, so raise WEB_THREADS for many live clients.
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+pythonpath = f"{ROOT},{os.path.join(ROOT, 'web_app')}"
+wsgi_app = "wsgi:app"
+bind = os.environ.get("SMART_MEAL_BIND", "0.0.0.0:5000")
+
+workers = int(os.environ.get("WEB_WORKERS", "2"))
+os.environ["WEB_WORKERS"] = str(workers)  # read by wsgi.create_app()
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "8"))
+keepalive = 75       # the Pi's scale stream reuses one connection
+timeout = 120        # photo classification can be slow on first use
+
+# Load the DB and models once in the master; workers share them copy-on-write.
+preload_app = True
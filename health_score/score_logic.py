@@ -1,22 +1,73 @@
-def compute_health_score(nutrition):
-    score = 100
+import json
+import os
 
-    calories = nutrition["calories"]
-    protein = nutrition["protein"]
-    fat = nutrition["fat"]
+# Threshold table: each rule applies the penalty of its first matching band
+# (an if/elif chain). Edit score_rules.json, or point HEALTH_SCORE_RULES at
+# another file, to change scoring without touching code.
+RULES_PATH = os.environ.get("HEALTH_SCORE_RULES") or os.path.join(
+    os.path.dirname(__file__), "score_rules.json"
+)
 
-    # Portion awareness
-    if calories > 700:
-        score -= 25
-    elif calories > 500:
-        score -= 10
+_rules = None
 
-    # Protein adequacy
-    if protein < 10:
-        score -= 15
 
-    # Fat moderation
-    if fat > 25:
-        score -= 10
+def load_score_rules(path=None):
+    """Load a rule table from JSON (the default table is cached after first load)."""
+    global _rules
+    if path is not None:
+        with open(path, "r") as f:
+            return json.load(f)
+    if _rules is None:
+        with open(RULES_PATH, "r") as f:
+            _rules = json.load(f)
+    return _rules
 
-    return max(score, 0)
+
+def _band_matches(band, value):
+    if "above" in band and not value > band["above"]:
+        return False
+    if "below" in band and not value < band["below"]:
+        return False
+    return True
+
+
+def compute_health_score(nutrition, rules=None):
+    rules = rules or load_score_rules()
+    score = rules["base"]
+
+    for rule in rules["rules"]:
+        value = nutrition[rule["field"]]
+        for band in rule["bands"]:
+            if _band_matches(band, value):
+                score -= band["penalty"]
+                break
+
+    return max(score, rules["floor"])
+
+
+def compute_health_scores(columns, rules=None):
+    """Vectorized compute_health_score over NumPy columns.
+
+    columns maps field name (calories, protein, fat, ...) to equal-length
+    arrays, e.g. the output of fusion.calorie_calc.calculate_nutrition_batch.
+    Returns an int64 array with the same scores as the scalar function.
+    """
+    import numpy as np
+
+    rules = rules or load_score_rules()
+    n = len(next(iter(columns.values())))
+    score = np.full(n, rules["base"], dtype=np.int64)
+
+    for rule in rules["rules"]:
+        value = np.asarray(columns[rule["field"]])
+        conditions = []
+        for band in rule["bands"]:
+            cond = np.ones(n, dtype=bool)
+            if "above" in band:
+                cond &= value > band["above"]
+            if "below" in band:
+                cond &= value < band["below"]
+            conditions.append(cond)
+        score -= np.select(conditions, [band["penalty"] for band in rule["bands"]], 0).astype(np.int64)
+
+    return np.maximum(score, rules["floor"])
@@ -0,0 +1,309 @@
+"""
+Compact, memory-mappable nutrition database.
+
+One file holds every food as a fixed-width row of float64 values per 100 g
+(NaN where a nutrient is unknown), a UTF-8 string table of food keys and an
+open-addressing hash index over them:
+
+  header    "<8sIIIIQQQQQQQ": magic, rows, columns, index slots, reserved,
+            then offset/length of the metadata, offset/length of the string
+            table, and the offsets of the key ends, the index and the values
+  metadata  JSON: {"columns": [...], "units": {...}, "source": ...}
+  strings   keys back to back; key i ends at key_ends[i] (u32)
+  index     u32 slots (a power of two, at most half full): row + 1, 0 = empty;
+            a key starts probing at crc32(key) and moves to the next slot
+  values    rows x columns little-endian float64, 8-byte aligned
+
+Opening a file maps it read-only and reads the header and metadata, nothing
+else, so it takes well under a millisecond whatever the size and allocates
+almost nothing on the heap. A lookup hashes the key, compares it with the
+string table and unpacks one row. The pages are the OS page cache: every
+worker process that maps the same file shares one copy in RAM.
+
+NutritionDB is a MutableMapping of food key -> {nutrient: value} over that
+buffer, so code written for the old dict-of-dicts keeps working. Writes and
+deletes go to an in-memory overlay and never touch the file.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+MAGIC = b"SMNUTDB1"
+_HEADER = struct.Struct("<8sIIIIQQQQQQQ")
+_U32 = struct.Struct("<I")
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Units per 100 g of the nutrients this repo and the USDA importer know about.
+UNITS = {
+    "calories": "kcal",
+    "protein": "g",
+    "carbs": "g",
+    "fat": "g",
+    "fiber": "g",
+    "sugar": "g",
+    "saturated_fat": "g",
+    "cholesterol": "mg",
+    "sodium": "mg",
+    "potassium": "mg",
+    "calcium": "mg",
+    "iron": "mg",
+    "vitamin_c": "mg",
+}
+
+
+def _slot_count(n_rows):
+    slots = 8
+    while slots < 2 * n_rows:
+        slots *= 2
+    return slots
+
+
+def pack(keys, values, columns, meta=None):
+    """Serialize a database to bytes.
+
+    keys is a sequence of unique food keys; values is a flat, row-major
+    sequence of len(keys) * len(columns) floats (NaN = unknown), e.g. an
+    array("d"). meta is merged into the metadata JSON.
+    """
+    columns = list(columns)
+    n_rows, n_cols = len(keys), len(columns)
+    if len(values) != n_rows * n_cols:
+        raise ValueError(f"Expected {n_rows * n_cols} values for {n_rows} foods x {n_cols} columns, "
+                         f"got {len(values)}")
+    metadata = {"columns": columns, "units": {c: UNITS[c] for c in columns if c in UNITS}}
+    metadata.update(meta or {})
+    meta_bytes = json.dumps(metadata, separators=(",", ":")).encode()
+
+    encoded = [k.encode() for k in keys]
+    strings = b"".join(encoded)
+    key_ends = array("I")
+    end = 0
+    for kb in encoded:
+        end += len(kb)
+        key_ends.append(end)
+
+    n_slots = _slot_count(n_rows)
+    mask = n_slots - 1
+    slots = array("I", bytes(4 * n_slots))
+    for row, kb in enumerate(encoded):
+        i = zlib.crc32(kb) & mask
+        while slots[i]:
+            other = slots[i] - 1
+            if encoded[other] == kb:
+                raise ValueError(f"Duplicate food key: {keys[row]!r}")
+            i = (i + 1) & mask
+        slots[i] = row + 1
+
+    rows = values if isinstance(values, array) and values.typecode == "d" else array("d", values)
+    if not _LITTLE_ENDIAN:  # the file is little-endian
+        rows = array("d", rows)
+        for a in (key_ends, slots, rows):
+            a.byteswap()
+
+    meta_off = _HEADER.size
+    strings_off = meta_off + len(meta_bytes)
+    ends_off = (strings_off + len(strings) + 3) & ~3
+    slots_off = ends_off + 4 * n_rows
+    values_off = (slots_off + 4 * n_slots + 7) & ~7
+    header = _HEADER.pack(MAGIC, n_rows, n_cols, n_slots, 0, meta_off, len(meta_bytes),
+                          strings_off, len(strings), ends_off, slots_off, values_off)
+    out = bytearray(header)
+    out += meta_bytes
+    out += strings
+    out += bytes(ends_off - len(out))
+    out += key_ends.tobytes()
+    out += slots.tobytes()
+    out += bytes(values_off - len(out))
+    out += rows.tobytes()
+    return bytes(out)
+
+
+def from_mapping(db, columns=None):
+    """(keys, values, columns) for pack() from a dict of {food: {nutrient: value}}.
+
+    columns defaults to every nutrient that appears, in first-seen order.
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(c for row in db.values() for c in row))
+    keys = list(db)
+    nan = float("nan")
+    values = array("d", (float(db[k].get(c, nan)) for k in keys for c in columns))
+    return keys, values, list(columns)
+
+
+def write_db(path, keys, values, columns, meta=None):
+    """Write a database file atomically.
+
+    The new file replaces the old one by rename, so processes that already
+    have the old file mapped keep reading it until they reopen.
+    """
+    data = pack(keys, values, columns, meta)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+class _SwappedU32:
+    """Little-endian u32 array in a buffer, for big-endian hosts."""
+
+    def __init__(self, view, n):
+        self._view = view
+        self._n = n
+
+    def __getitem__(self, i):
+        return _U32.unpack_from(self._view, 4 * i)[0]
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n))
+
+
+def _u32s(view, offset, n):
+    view = view[offset:offset + 4 * n]
+    return view.cast("I") if _LITTLE_ENDIAN else _SwappedU32(view, n)
+
+
+def is_binary_db(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class NutritionDB(MutableMapping):
+    """Dict-like view of a packed database: food key -> {nutrient: value}.
+
+    Rows are decoded on access; each lookup returns a new dict, so changing
+    it does not change the database (assign it back to do that). Assigned
+    and deleted keys live in an overlay on this object only.
+    """
+
+    def __init__(self, buffer, source=None):
+        view = memoryview(buffer)
+        if len(view) < _HEADER.size:
+            raise ValueError(f"{source or 'buffer'}: not a nutrition DB (too short)")
+        (magic, self._n_rows, n_cols, n_slots, _, meta_off, meta_len, strings_off, strings_len,
+         ends_off, slots_off, self._values_off) = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{source or 'buffer'}: not a nutrition DB (bad magic {magic!r})")
+        if self._values_off + 8 * self._n_rows * n_cols > len(view):
+            raise ValueError(f"{source or 'buffer'}: truncated nutrition DB")
+        self._buffer = buffer
+        self._view = view
+        self.meta = json.loads(bytes(view[meta_off:meta_off + meta_len]))
+        self._columns = tuple(self.meta["columns"])
+        self._strings = view[strings_off:strings_off + strings_len]
+        self._ends = _u32s(view, ends_off, self._n_rows)
+        self._slots = _u32s(view, slots_off, n_slots)
+        self._mask = n_slots - 1
+        self._row_struct = struct.Struct(f"<{n_cols}d")
+        self.source = source
+        self._overlay = {}
+        self._added = {}
+        self._deleted = set()
+
+    @classmethod
+    def open(cls, path):
+        """Map a database file read-only."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, source=path)
+
+    def view(self):
+        """A new facade over the same buffer with an empty overlay."""
+        other = object.__new__(type(self))
+        other.__dict__.update(self.__dict__)
+        other._overlay, other._added, other._deleted = {}, {}, set()
+        return other
+
+    @property
+    def columns(self):
+        """Nutrient names of every row, in storage order."""
+        return self._columns
+
+    @property
+    def modified(self):
+        """True once keys have been assigned or deleted on this facade."""
+        return bool(self._overlay or self._deleted)
+
+    def row_of(self, key):
+        """Row number of key in the file, or -1 (ignores the overlay)."""
+        if not isinstance(key, str):
+            return -1
+        kb = key.encode()
+        slots, ends, mask = self._slots, self._ends, self._mask
+        i = zlib.crc32(kb) & mask
+        while True:
+            row = slots[i] - 1
+            if row < 0:
+                return -1
+            end = ends[row]
+            start = ends[row - 1] if row else 0
+            if end - start == len(kb) and self._strings[start:end] == kb:
+                return row
+            i = (i + 1) & mask
+
+    def row(self, row):
+        """Decoded values of one row, skipping unknown (NaN) nutrients."""
+        values = self._row_struct.unpack_from(self._view, self._values_off + 8 * len(self._columns) * row)
+        return {c: v for c, v in zip(self._columns, values) if v == v}
+
+    def values_array(self):
+        """All rows as a read-only (rows, columns) float64 NumPy array, without copying."""
+        import numpy as np
+
+        return np.frombuffer(self._buffer, dtype="<f8", count=self._n_rows * len(self._columns),
+                             offset=self._values_off).reshape(self._n_rows, len(self._columns))
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        row = self.row_of(key)
+        if row < 0 or key in self._deleted:
+            raise KeyError(key)
+        return self.row(row)
+
+    def __contains__(self, key):
+        if key in self._overlay:
+            return True
+        return key not in self._deleted and self.row_of(key) >= 0
+
+    def __setitem__(self, key, value):
+        if key not in self._overlay and self.row_of(key) < 0:
+            self._added[key] = None
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        in_file = key not in self._deleted and self.row_of(key) >= 0
+        if key not in self._overlay and not in_file:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        self._added.pop(key, None)
+        if in_file:
+            self._deleted.add(key)
+
+    def __iter__(self):
+        deleted = self._deleted
+        text = str(self._strings, "utf-8")
+        # Byte offsets are character offsets when every key is ASCII (the importer's keys are).
+        strings = text if len(text) == len(self._strings) else self._strings
+        start = 0
+        for end in self._ends:
+            key = strings[start:end] if strings is text else str(strings[start:end], "utf-8")
+            start = end
+            if not deleted or key not in deleted:
+                yield key
+        yield from list(self._added)
+
+    def __len__(self):
+        return self._n_rows - len(self._deleted) + len(self._added)
+
+    def __repr__(self):
+        return f"<NutritionDB {len(self)} foods x {len(self._columns)} nutrients from {self.source or 'memory'}>"
@@ -0,0 +1,240 @@
+"""
+Build a packed nutrition database (nutrition.binary_db) from external data.
+
+Sources, detected per path and merged in the order given (a key that is
+already taken by an earlier source is not overwritten):
+
+  directory   USDA FoodData Central CSV download (food.csv, nutrient.csv,
+              food_nutrient.csv). food_nutrient.csv, tens of millions of
+              lines for Branded Foods, is streamed.
+  *.json      FoodData Central JSON (FoundationFoods, SRLegacyFoods,
+              SurveyFoods or BrandedFoods), or this repo's format:
+              {"food_key": {"calories": ..., "protein": ..., ...}}.
+              JSON is read whole; use the CSV download for Branded Foods.
+  *.csv       one food per line: a key (or name/description) column plus
+              columns named after nutrients (calories, protein, ...)
+
+Values are per 100 g. FoodData Central descriptions become snake_case keys
+("Rice, white, long-grain, regular, cooked" -> rice_white_long_grain_regular_cooked);
+a description seen twice gets its fdc_id appended. Foods missing any --require
+nutrient are skipped; calories, protein, carbs and fat are always required,
+since meals can't be logged without them.
+
+Usage (from repo root):
+  python -m nutrition.build_db nutrition/nutrition_db.json ~/FoodData_Central_csv_2024-10-31 \\
+      [-o nutrition/nutrition_db.bin] [--nutrients calories protein carbs fat fiber sodium]
+      [--require calories protein carbs fat] [--data-types foundation_food sr_legacy_food]
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from array import array
+
+from nutrition.binary_db import UNITS, write_db
+from nutrition.load_db import BIN_PATH
+
+# FoodData Central nutrient ids per column, preferred first. Energy is 1008
+# for SR Legacy / Survey / Branded; Foundation Foods often only have the
+# Atwater energies 2048 (specific factors) and 2047 (general factors).
+FDC_NUTRIENTS = {
+    "calories": (1008, 2048, 2047),
+    "protein": (1003,),
+    "carbs": (1005, 1050),
+    "fat": (1004, 1085),
+    "fiber": (1079,),
+    "sugar": (2000, 1063),
+    "saturated_fat": (1258,),
+    "cholesterol": (1253,),
+    "sodium": (1093,),
+    "potassium": (1092,),
+    "calcium": (1087,),
+    "iron": (1089,),
+    "vitamin_c": (1162,),
+}
+DEFAULT_NUTRIENTS = tuple(FDC_NUTRIENTS)
+DEFAULT_REQUIRE = ("calories", "protein", "carbs", "fat")
+# Every food needs these (fusion.calorie_calc); --require may only add to them.
+CORE_NUTRIENTS = DEFAULT_REQUIRE
+# Data types with complete per-100 g profiles; the full download also has
+# sub-samples and acquisitions that only carry a few analytes.
+DEFAULT_DATA_TYPES = ("foundation_food", "sr_legacy_food", "survey_fndds_food", "branded_food")
+FDC_JSON_LISTS = {
+    "FoundationFoods": "foundation_food",
+    "SRLegacyFoods": "sr_legacy_food",
+    "SurveyFoods": "survey_fndds_food",
+    "BrandedFoods": "branded_food",
+}
+KEY_MAX_LEN = 80
+NAN = float("nan")
+
+
+def food_key(description):
+    """snake_case ASCII key for a food description."""
+    text = unicodedata.normalize("NFKD", description).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:KEY_MAX_LEN].rstrip("_")
+
+
+class DatabaseBuilder:
+    """Accumulates foods from several sources into pack()-ready rows."""
+
+    def __init__(self, columns=DEFAULT_NUTRIENTS, require=DEFAULT_REQUIRE):
+        unknown = sorted(set(require) - set(columns))
+        if unknown:
+            raise ValueError(f"--require nutrients not in --nutrients: {', '.join(unknown)}")
+        self.columns = tuple(columns)
+        self._required = [self.columns.index(c) for c in require]
+        self.keys = []
+        self._taken = set()
+        self.values = array("d")
+        self.skipped_incomplete = 0
+        self.skipped_duplicate = 0
+
+    def add(self, key, row, fdc_id=None):
+        """Add one food; row is a sequence of values in column order (NaN = unknown).
+
+        A key that is taken gets "_<fdc_id>" appended when fdc_id is given and
+        is skipped otherwise. Returns whether the food was added.
+        """
+        if not key or any(math.isnan(row[i]) for i in self._required):
+            self.skipped_incomplete += 1
+            return False
+        if key in self._taken and fdc_id is not None:
+            key = f"{key}_{fdc_id}"
+        if key in self._taken:
+            self.skipped_duplicate += 1
+            return False
+        self._taken.add(key)
+        self.keys.append(key)
+        self.values.extend(row)
+        return True
+
+    def add_mapping(self, db):
+        """Foods in this repo's {key: {nutrient: value}} format."""
+        for key, nutrients in db.items():
+            self.add(key, [float(nutrients.get(c, NAN)) for c in self.columns])
+
+    def add_flat_csv(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            key_field = next((k for k in ("key", "food_id", "name", "description") if k in reader.fieldnames), None)
+            if key_field is None:
+                raise ValueError(f"{path}: no key, food_id, name or description column")
+            for line in reader:
+                key = line[key_field] if key_field in ("key", "food_id") else food_key(line[key_field])
+                self.add(key, [_number(line.get(c)) for c in self.columns])
+
+    def _nutrient_ids(self):
+        """FoodData Central nutrient id -> (column, preference; lower wins)."""
+        return {nid: (col, pref) for col, c in enumerate(self.columns)
+                for pref, nid in enumerate(FDC_NUTRIENTS.get(c, ()))}
+
+    def add_fdc_json(self, data, data_types=DEFAULT_DATA_TYPES):
+        ids = self._nutrient_ids()
+        n_cols = len(self.columns)
+        for list_name, data_type in FDC_JSON_LISTS.items():
+            if data_type not in data_types:
+                continue
+            for food in data.get(list_name, ()):
+                row, prefs = [NAN] * n_cols, [len(FDC_NUTRIENTS)] * n_cols
+                for item in food.get("foodNutrients", ()):
+                    hit = ids.get((item.get("nutrient") or {}).get("id"))
+                    amount = item.get("amount")
+                    if hit is None or amount is None or hit[1] >= prefs[hit[0]]:
+                        continue
+                    row[hit[0]], prefs[hit[0]] = float(amount), hit[1]
+                self.add(food_key(food.get("description", "")), row, food.get("fdcId"))
+
+    def add_fdc_csv(self, folder, data_types=DEFAULT_DATA_TYPES):
+        """FoodData Central CSV download; food_nutrient.csv is streamed into a flat array."""
+        ids = {str(nid): hit for nid, hit in self._nutrient_ids().items()}
+        fdc_ids, descriptions, row_of = [], [], {}
+        with open(os.path.join(folder, "food.csv"), newline="", encoding="utf-8") as f:
+            for line in csv.DictReader(f):
+                if line["data_type"] in data_types:
+                    row_of[line["fdc_id"]] = len(fdc_ids)
+                    fdc_ids.append(line["fdc_id"])
+                    descriptions.append(line["description"])
+
+        n_cols = len(self.columns)
+        values = array("d", [NAN]) * (len(fdc_ids) * n_cols)
+        prefs = bytearray([255]) * (len(fdc_ids) * n_cols)
+        with open(os.path.join(folder, "food_nutrient.csv"), newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            fdc_col, nutrient_col, amount_col = (header.index(c) for c in ("fdc_id", "nutrient_id", "amount"))
+            for line in reader:
+                hit = ids.get(line[nutrient_col])
+                if hit is None:
+                    continue
+                row = row_of.get(line[fdc_col])
+                if row is None or not line[amount_col]:
+                    continue
+                i = row * n_cols + hit[0]
+                if hit[1] < prefs[i]:
+                    values[i], prefs[i] = float(line[amount_col]), hit[1]
+
+        for row, (fdc_id, description) in enumerate(zip(fdc_ids, descriptions)):
+            self.add(food_key(description), values[row * n_cols:(row + 1) * n_cols], int(fdc_id))
+
+    def add_source(self, path, data_types=DEFAULT_DATA_TYPES):
+        if os.path.isdir(path):
+            if not os.path.exists(os.path.join(path, "food_nutrient.csv")):
+                raise ValueError(f"{path}: not a FoodData Central CSV folder (no food_nutrient.csv)")
+            self.add_fdc_csv(path, data_types)
+        elif path.endswith(".csv"):
+            self.add_flat_csv(path)
+        elif path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and any(k in data for k in FDC_JSON_LISTS):
+                self.add_fdc_json(data, data_types)
+            else:
+                self.add_mapping(data)
+        else:
+            raise ValueError(f"{path}: expected a FoodData Central CSV folder, a .json or a .csv file")
+
+
+def _number(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pack food data into a memory-mappable nutrition DB")
+    ap.add_argument("sources", nargs="+", help="FoodData Central CSV folder, .json or .csv; earlier sources win")
+    ap.add_argument("-o", "--output", default=BIN_PATH)
+    ap.add_argument("--nutrients", nargs="+", default=DEFAULT_NUTRIENTS, choices=sorted(UNITS),
+                    help="Columns to store, in this order")
+    ap.add_argument("--require", nargs="*", default=DEFAULT_REQUIRE,
+                    help="Skip foods missing any of these (calories, protein, carbs and fat always)")
+    ap.add_argument("--data-types", nargs="+", default=DEFAULT_DATA_TYPES,
+                    help="FoodData Central data types to import")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        builder = DatabaseBuilder(args.nutrients, dict.fromkeys([*CORE_NUTRIENTS, *args.require]))
+        for path in args.sources:
+            before = len(builder.keys)
+            builder.add_source(path, args.data_types)
+            print(f"{path}: {len(builder.keys) - before} foods")
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+    size = write_db(args.output, builder.keys, builder.values, builder.columns,
+                    {"source": [os.path.basename(os.path.normpath(p)) for p in args.sources],
+                     "created": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    print(f"Wrote {len(builder.keys)} foods x {len(builder.columns)} nutrients to {args.output} "
+          f"({size / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f} s; skipped "
+          f"{builder.skipped_incomplete} incomplete, {builder.skipped_duplicate} duplicate")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,67 @@
+"""
+Nutrition database loader.
+
+load_nutrition_db() returns a dict-like NutritionDB (see nutrition.binary_db)
+of food key -> {nutrient: value per 100 g}. The data comes from, in order:
+
+  NUTRITION_DB            environment variable: a packed .bin file or a JSON file
+  nutrition_db.bin        next to this module, if it is newer than the JSON
+                          (build it with `python -m nutrition.build_db`)
+  nutrition_db.json       the small hand-curated table, packed in memory
+
+The packed data is opened once per process and path (again if the file
+changes); each call returns a fresh facade over it, so keys one caller adds or
+deletes are not seen by another.
+"""
 import json
 import os
+import threading
+
+from nutrition.binary_db import NutritionDB, from_mapping, is_binary_db, pack
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_PATH = os.path.join(_DIR, "nutrition_db.json")
+BIN_PATH = os.path.join(_DIR, "nutrition_db.bin")
+
+_opened = {}  # path -> ((mtime_ns, size), NutritionDB)
+_opened_lock = threading.Lock()
+
+
+def default_db_path():
+    path = os.environ.get("NUTRITION_DB")
+    if path:
+        return path
+    try:
+        if os.stat(BIN_PATH).st_mtime_ns >= os.stat(JSON_PATH).st_mtime_ns:
+            return BIN_PATH
+    except FileNotFoundError:
+        pass
+    return JSON_PATH
+
+
+def _open(path):
+    if is_binary_db(path):
+        return NutritionDB.open(path)
+    with open(path, "r") as f:
+        keys, values, columns = from_mapping(json.load(f))
+    return NutritionDB(pack(keys, values, columns, {"source": os.path.basename(path)}), source=path)
 
 
-def load_nutrition_db():
-    current_dir = os.path.dirname(__file__)
-    file_path = os.path.join(current_dir, "nutrition_db.json")
-    with open(file_path, "r") as f:
-        return json.load(f)
+def load_nutrition_db(path=None):
+    path = os.path.abspath(path or default_db_path())
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    entry = _opened.get(path)
+    if entry is None or entry[0] != stamp:
+        with _opened_lock:
+            entry = _opened.get(path)
+            if entry is None or entry[0] != stamp:
+                entry = _opened[path] = (stamp, _open(path))
+    return entry[1].view()
 
 
 if __name__ == "__main__":
     db = load_nutrition_db()
-    print("Foods available:")
+    print(f"Foods available ({db.source}):")
     for food in db:
         print("-", food)
@@ -0,0 +1,58 @@
+"""
+Columnar, array-backed view of the nutrition database.
+
+Values live in one float64 (n_foods, 4) array with a name -> row index, built
+once per process, so batch calculations can gather rows for thousands of
+(food, weight) pairs with NumPy instead of a dict lookup per meal. Over a
+packed database the array is a view of the mapped file, not a copy.
+"""
+import threading
+
+import numpy as np
+
+from nutrition.load_db import load_nutrition_db
+
+COLUMNS = ("calories", "protein", "carbs", "fat")
+
+
+class NutritionTable:
+    """Per-100 g macros for every food; row order matches names."""
+
+    def __init__(self, db):
+        self.names = list(db)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if hasattr(db, "values_array") and not db.modified and db.columns[:len(COLUMNS)] == COLUMNS:
+            self.values = db.values_array()[:, :len(COLUMNS)]
+            return
+        self.values = np.array(
+            [[float(db[name].get(col, np.nan)) for col in COLUMNS] for name in self.names],
+            dtype=np.float64,
+        ).reshape(len(self.names), len(COLUMNS))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def column(self, name):
+        return self.values[:, COLUMNS.index(name)]
+
+    def rows(self, foods):
+        """Row index for each food name (-1 where the name is unknown)."""
+        get = self.index.get
+        return np.fromiter((get(f, -1) for f in foods), dtype=np.intp, count=len(foods))
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_nutrition_table():
+    """Process-wide table built from load_nutrition_db() on first use."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = NutritionTable(load_nutrition_db())
+    return _table
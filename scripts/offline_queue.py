@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Durable store-and-forward queue for the Pi: scale readings and meal photos
+survive a server or Wi-Fi outage and are uploaded when it comes back.
+
+Items are JSON documents in a local SQLite file (WAL, so the load-cell and
+camera scripts can share it). Each gets a client-side id when queued; the
+server's POST /api/bulk ingests a batch in one transaction and ignores ids it
+has already seen, so an upload retried after a lost response is harmless.
+Batches go out oldest first as one gzipped JSON body.
+
+  python offline_queue.py [--url http://192.168.1.10:5000]   # drain now, print what's left
+
+Environment: SMART_MEAL_OUTBOX (queue file, default ~/.smart_meal/outbox.db).
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+OUTBOX_PATH = os.environ.get("SMART_MEAL_OUTBOX") or os.path.join(
+    os.path.expanduser("~"), ".smart_meal", "outbox.db"
+)
+BATCH_MAX_ITEMS = 200                 # items per /api/bulk request
+BATCH_MAX_BYTES = 4 * 1024 * 1024     # uncompressed JSON per request
+BATCH_MAX_PHOTOS = 8                  # photos per request (the server classifies them)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    body BLOB NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+
+def new_client_id():
+    """Id the server deduplicates uploads by (X-Client-Id, /api/bulk "id")."""
+    return uuid.uuid4().hex
+
+
+class OfflineQueue:
+    """SQLite-backed FIFO of items for POST /api/bulk."""
+
+    def __init__(self, path=OUTBOX_PATH, batch_items=BATCH_MAX_ITEMS):
+        self.path = path
+        self.batch_items = batch_items
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.last_error = None
+
+    def put(self, item):
+        """Queue one item (a dict with "type", and "id" if it already has a client id); returns its id."""
+        item = dict(item)
+        item["id"] = item.get("id") or new_client_id()
+        body = json.dumps(item, separators=(",", ":")).encode()
+        with self._lock:
+            self._db.execute("INSERT INTO outbox (kind, body, created) VALUES (?, ?, ?)",
+                             (item["type"], body, time.time()))
+        self._wake.set()
+        return item["id"]
+
+    def put_readings(self, scale_id, samples):
+        """Queue (ts, grams, stable) samples of one scale as a single item."""
+        return self.put({"type": "readings", "scale_id": scale_id,
+                         "samples": [[round(t, 3), round(g, 2), int(s)] for t, g, s in samples]})
+
+    def put_meal(self, image=None, food_id=None, weight_g=None, ts=None, user_id=None, scale_id=None,
+                 client_id=None):
+        """Queue a meal: JPEG bytes to classify on the server, or a known food_id.
+
+        Pass the client_id a failed live upload was sent with (X-Client-Id), so
+        the server skips the queued copy if it did log that upload.
+        """
+        item = {"type": "meal", "ts": time.time() if ts is None else ts, "id": client_id}
+        if image is not None:
+            item["image"] = base64.b64encode(image).decode("ascii")
+        for key, value in (("food_id", food_id), ("weight_g", weight_g), ("user_id", user_id),
+                           ("scale_id", scale_id)):
+            if value is not None:
+                item[key] = value
+        return self.put(item)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _batch(self, max_items=None, max_bytes=BATCH_MAX_BYTES, max_photos=BATCH_MAX_PHOTOS):
+        """Oldest items as [(row id, body)], within the item, byte and photo limits (at least one)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, kind, body FROM outbox ORDER BY id LIMIT ?", (max_items or self.batch_items,)
+            ).fetchall()
+        batch, size, photos = [], 0, 0
+        for row_id, kind, body in rows:
+            photo = kind == "meal" and b'"image":' in body
+            if batch and (size + len(body) > max_bytes or photos + photo > max_photos):
+                break
+            batch.append((row_id, body))
+            size += len(body)
+            photos += photo
+        return batch
+
+    def _ack(self, row_ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in row_ids])
+
+    def send_batch(self, server_url, session, timeout=60):
+        """Upload the oldest batch; returns the number of items the server settled, 0 if empty.
+
+        Raises on network errors or a non-2xx response (the items stay queued).
+        """
+        batch = self._batch()
+        if not batch:
+            return 0
+        body = gzip.compress(b'{"items":[' + b",".join(body for _, body in batch) + b"]}", 6)
+        r = session.post(f"{server_url.rstrip('/')}/api/bulk", data=body, timeout=timeout,
+                         headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+        r.raise_for_status()
+        result = r.json()
+        for rejected in result.get("rejected", []):
+            print(f"Server rejected queued item {rejected.get('id')}: {rejected.get('error')}", file=sys.stderr)
+        # Accepted, duplicate and rejected ids are all settled; anything else is retried.
+        ids = {batch_id for batch_id in result.get("accepted", []) + result.get("duplicates", [])}
+        ids.update(rejected.get("id") for rejected in result.get("rejected", []))
+        done = [row_id for row_id, body in batch if json.loads(body)["id"] in ids]
+        self._ack(done)
+        return len(done)
+
+    def drain(self, server_url, session=None, max_s=None):
+        """Upload until the queue is empty, an upload fails, or max_s passes; returns items sent."""
+        import requests
+        session = session or requests.Session()
+        deadline = None if max_s is None else time.monotonic() + max_s
+        sent = 0
+        with self._drain_lock:
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    n = self.send_batch(server_url, session)
+                except Exception as e:
+                    self.last_error = str(e)
+                    break
+                self.last_error = None
+                if n == 0:
+                    break
+                sent += n
+        return sent
+
+    def start_drainer(self, server_url, interval_s=5.0, max_backoff_s=60.0):
+        """Background thread that drains whenever items are queued, backing off while offline."""
+        import requests
+
+        def run():
+            session = requests.Session()
+            wait = interval_s
+            while True:
+                if self.last_error:
+                    time.sleep(wait)  # offline: new items don't cut the backoff short
+                else:
+                    self._wake.wait(interval_s)
+                self._wake.clear()
+                if not len(self):
+                    continue
+                self.drain(server_url, session)
+                wait = min(wait * 2, max_backoff_s) if self.last_error else interval_s
+
+        thread = threading.Thread(target=run, name="outbox-drainer", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Upload the Pi's offline queue to the Smart Meal server")
+    ap.add_argument("--url", default="http://192.168.1.10:5000", help="Base URL of Flask server")
+    ap.add_argument("--queue", default=OUTBOX_PATH, help="Queue file")
+    args = ap.parse_args()
+    outbox = OfflineQueue(args.queue)
+    print(f"{len(outbox)} queued item(s) in {args.queue}")
+    sent = outbox.drain(args.url)
+    print(f"Uploaded {sent}; {len(outbox)} left" + (f" ({outbox.last_error})" if outbox.last_error else ""))
+
+
+if __name__ == "__main__":
+    main()
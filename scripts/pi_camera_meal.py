@@ -6,16 +6,35 @@ treated as default image source (same pipeline).
 
 Usage:
   python pi_camera_meal.py [--weight 250]
+  python pi_camera_meal.py --resize --quality 80 --raw
   (Set SERVER_URL below or pass --url http://192.168.1.10:5000)
 
-Requires on Pi: pip install requests
+--resize center-crops and downscales the frame in memory to the model input
+size (--size, default 224) before upload; --quality sets the JPEG quality.
+--raw sends the bytes to POST /api/meal/raw (weight in the X-Weight-Grams
+header) instead of a multipart form.
+
+If the server can't be reached (or answers 5xx), the photo is kept in the
+local offline queue (scripts/offline_queue.py) with its capture time, and
+uploaded to /api/bulk by the next run or by pi_load_cell.py's background
+drainer; --no-outbox drops it instead. Each upload carries an X-Client-Id that
+the queued copy reuses, so a photo the server logged before its response was
+lost is not logged twice.
+
+Requires on Pi: pip install requests Pillow
 Camera: picamera2 (Pi 5 / Bookworm) or picamera (older), or use --file for testing.
 """
 import argparse
+import io
 import sys
+import time
 from pathlib import Path
 
+from offline_queue import OUTBOX_PATH, OfflineQueue, new_client_id
+
 SERVER_URL = "http://192.168.1.10:5000"  # Your Flask server
+MODEL_INPUT_SIZE = 224                   # classifier input (pixels, square)
+CAPTURE_SIZE = (640, 480)
 
 
 def capture_image(save_path: str) -> bool:
@@ -24,7 +43,7 @@ def capture_image(save_path: str) -> bool:
         try:
             from picamera2 import Picamera2
             cam = Picamera2()
-            cam.configure(cam.create_preview_configuration(main={"size": (640, 480)}))
+            cam.configure(cam.create_preview_configuration(main={"size": CAPTURE_SIZE}))
             cam.start()
             cam.capture_file(save_path)
             cam.stop()
@@ -43,22 +62,113 @@ def capture_image(save_path: str) -> bool:
     return False
 
 
-def send_meal_with_image(server_base: str, image_path: str, weight_g: float | None) -> None:
-    """POST image to /api/meal. Uses last sensor weight if weight_g is None."""
+def capture_frame():
+    """Capture one frame into memory as a PIL image (no file on the SD card), or None."""
+    try:
+        try:
+            from picamera2 import Picamera2
+            cam = Picamera2()
+            cam.configure(cam.create_preview_configuration(main={"size": CAPTURE_SIZE}))
+            cam.start()
+            img = cam.capture_image("main")
+            cam.stop()
+            return img
+        except ImportError:
+            pass
+        try:
+            import picamera
+            from PIL import Image
+            buf = io.BytesIO()
+            with picamera.PiCamera(resolution=CAPTURE_SIZE) as cam:
+                cam.capture(buf, format="jpeg")
+            buf.seek(0)
+            return Image.open(buf)
+        except ImportError:
+            pass
+    except Exception as e:
+        print(f"Camera error: {e}", file=sys.stderr)
+    return None
+
+
+def prepare_image(src, size: int = MODEL_INPUT_SIZE, quality: int = 85) -> bytes:
+    """Center-crop src (path or PIL image) to a square, resize to size x size, return JPEG bytes."""
+    from PIL import Image
+    img = src if isinstance(src, Image.Image) else Image.open(src)
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))  # let the JPEG decoder downscale for us
+    img = img.convert("RGB")
+    w, h = img.size
+    side = min(w, h)
+    left, top = (w - side) // 2, (h - side) // 2
+    img = img.resize((size, size), Image.BILINEAR, box=(left, top, left + side, top + side))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def send_meal_bytes(server_base: str, data: bytes, weight_g: float | None, raw: bool = False,
+                    client_id: str | None = None):
+    """POST in-memory JPEG bytes, either as multipart to /api/meal or raw to /api/meal/raw.
+
+    Returns the response (or None if the request failed).
+    """
+    import requests
+    base = server_base.rstrip("/")
+    headers = {"X-Client-Id": client_id} if client_id else {}
+    try:
+        if raw:
+            headers["Content-Type"] = "image/jpeg"
+            if weight_g is not None:
+                headers["X-Weight-Grams"] = str(weight_g)
+            return requests.post(f"{base}/api/meal/raw", data=data, headers=headers, timeout=30)
+        files = {"food_image": ("capture.jpg", data, "image/jpeg")}
+        form = {} if weight_g is None else {"weight_g": weight_g}
+        return requests.post(f"{base}/api/meal", files=files, data=form, headers=headers, timeout=30)
+    except Exception as e:
+        print(f"Request failed: {e}", file=sys.stderr)
+        return None
+
+
+def print_result(r) -> None:
+    if r is None:
+        return
+    if r.ok:
+        d = r.json()
+        print(f"Detected: {d.get('food', '?')} | {d.get('nutrition', {}).get('calories', 0)} kcal | daily total: {d.get('daily_total_calories', 0)}")
+    else:
+        print(f"Error {r.status_code}: {r.text}", file=sys.stderr)
+
+
+def send_meal_with_image(server_base: str, image_path: str, weight_g: float | None, client_id: str | None = None):
+    """POST image to /api/meal. Uses last sensor weight if weight_g is None.
+
+    Returns the response (or None if the request failed).
+    """
     url = f"{server_base.rstrip('/')}/api/meal"
     with open(image_path, "rb") as f:
         files = {"food_image": (Path(image_path).name, f, "image/jpeg")}
         data = {} if weight_g is None else {"weight_g": weight_g}
+        headers = {"X-Client-Id": client_id} if client_id else {}
         try:
             import requests
-            r = requests.post(url, files=files, data=data, timeout=30)
-            if r.ok:
-                d = r.json()
-                print(f"Detected: {d.get('food', '?')} | {d.get('nutrition', {}).get('calories', 0)} kcal | daily total: {d.get('daily_total_calories', 0)}")
-            else:
-                print(f"Error {r.status_code}: {r.text}", file=sys.stderr)
+            r = requests.post(url, files=files, data=data, headers=headers, timeout=30)
         except Exception as e:
             print(f"Request failed: {e}", file=sys.stderr)
+            return None
+    print_result(r)
+    return r
+
+
+def queue_if_failed(outbox, r, data: bytes, weight_g: float | None, captured: float, client_id: str) -> None:
+    """Keep the photo in the offline queue when the server was unreachable or failed.
+
+    The queued copy keeps the live upload's client_id: if the server did log
+    the meal before the response was lost, /api/bulk skips it as a duplicate.
+    """
+    if outbox is None or (r is not None and r.status_code < 500):
+        return
+    outbox.put_meal(image=data, weight_g=weight_g, ts=captured, client_id=client_id)
+    print(f"Queued offline ({len(outbox)} item(s) waiting); it will be uploaded when the server is back.")
 
 
 def main():
@@ -66,8 +176,39 @@ def main():
     ap.add_argument("--url", default=SERVER_URL, help="Base URL of Flask server")
     ap.add_argument("--weight", type=float, default=None, help="Weight in grams (optional; uses scale weight if set)")
     ap.add_argument("--file", default=None, help="Use this image file instead of camera (for testing)")
+    ap.add_argument("--resize", action="store_true", help="Crop/resize to the model input size in memory before upload")
+    ap.add_argument("--size", type=int, default=MODEL_INPUT_SIZE, help="Output size in pixels for --resize")
+    ap.add_argument("--quality", type=int, default=85, help="JPEG quality for --resize (1-95)")
+    ap.add_argument("--raw", action="store_true", help="Upload raw bytes to /api/meal/raw instead of multipart")
+    ap.add_argument("--outbox", default=OUTBOX_PATH, help="Offline queue file")
+    ap.add_argument("--no-outbox", action="store_true", help="Drop the photo if the server is unreachable")
     args = ap.parse_args()
 
+    outbox = None if args.no_outbox else OfflineQueue(args.outbox)
+    if outbox is not None and len(outbox):
+        sent = outbox.drain(args.url)
+        print(f"Uploaded {sent} queued item(s) from an earlier outage; {len(outbox)} left")
+    captured = time.time()
+    client_id = new_client_id()
+
+    if args.resize or args.raw:
+        src = args.file or capture_frame()
+        if src is None:
+            print("No camera or capture failed. Use --file /path/to/image.jpg for testing.", file=sys.stderr)
+            sys.exit(1)
+        if args.resize:
+            data = prepare_image(src, args.size, args.quality)
+        elif args.file:
+            data = Path(args.file).read_bytes()
+        else:
+            buf = io.BytesIO()
+            src.convert("RGB").save(buf, format="JPEG", quality=args.quality)
+            data = buf.getvalue()
+        r = send_meal_bytes(args.url, data, args.weight, raw=args.raw, client_id=client_id)
+        print_result(r)
+        queue_if_failed(outbox, r, data, args.weight, captured, client_id)
+        return
+
     image_path = args.file
     if not image_path:
         image_path = "/tmp/smart_meal_capture.jpg"
@@ -75,7 +216,8 @@ def main():
             print("No camera or capture failed. Use --file /path/to/image.jpg for testing.", file=sys.stderr)
             sys.exit(1)
 
-    send_meal_with_image(args.url, image_path, args.weight)
+    r = send_meal_with_image(args.url, image_path, args.weight, client_id)
+    queue_if_failed(outbox, r, Path(image_path).read_bytes(), args.weight, captured, client_id)
 
 
 if __name__ == "__main__":
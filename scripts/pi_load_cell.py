@@ -1,8 +1,23 @@
 #!/usr/bin/env python3
 """
-Send weight from a load cell (HX711) on the Raspberry Pi to the Smart Meal backend.
+Stream weight from a load cell (HX711) on the Raspberry Pi to the Smart Meal backend.
 Run this on the Pi while the Flask app runs on the same Pi (backend on Pi).
 
+The HX711 is opened once and sampled continuously (80 SPS with the RATE pin
+high, 10 SPS otherwise). Each sample goes through a median filter (drops
+spikes) and a 1-D Kalman filter (smooths noise, snaps to real weight steps),
+is flagged stable when the last STABLE_WINDOW samples agree within
+STABLE_TOLERANCE_G, and is streamed as NDJSON lines to /api/sensor/stream.
+One chunked POST carries up to --request-seconds of samples, flushed every
+--batch seconds, and a requests.Session keeps the connection open between POSTs.
+
+If the server can't be reached, samples go to the local offline queue
+(scripts/offline_queue.py) in OUTBOX_CHUNK_S chunks instead of being dropped;
+a background thread uploads them to /api/bulk when the server is back, and
+live streaming resumes once the backlog has drained, so readings arrive in order.
+Samples of a streaming POST are kept until the server answers it; if the POST
+fails they are queued too (the server skips any it had already buffered).
+
 Wiring (typical):
   HX711 VCC -> 3.3V (or 5V), GND -> GND
   HX711 DT (data)  -> GPIO 5 (BCM)
@@ -19,13 +34,27 @@ Install on Pi:
   pip install requests
   pip install RPi.GPIO
   pip install hx711   # or: pip install hx711-rpi-py (see alternate branch in script)
+
+Usage:
+  python3 pi_load_cell.py                    # stream from the HX711
+  python3 pi_load_cell.py --mock --rate 80   # simulated 80 Hz scale, no hardware
+  python3 pi_load_cell.py --legacy           # old mode: one POST to /api/sensor/weight per interval
+  python3 pi_load_cell.py --no-outbox        # drop samples while offline instead of queueing them
 """
+import argparse
+import itertools
+import json
 import os
+import random
 import time
 import sys
+from collections import deque
+
+from offline_queue import OUTBOX_PATH, OfflineQueue
 
 # Where to send weight (backend on same Pi)
 SERVER_URL = os.environ.get("SMART_MEAL_SERVER", "http://127.0.0.1:5000")
+SCALE_ID = os.environ.get("SMART_MEAL_SCALE_ID", "default")
 
 # GPIO (BCM numbering)
 DATA_PIN = int(os.environ.get("HX711_DT", "5"))
@@ -35,6 +64,18 @@ CLOCK_PIN = int(os.environ.get("HX711_SCK", "6"))
 CALIBRATION_TARE = float(os.environ.get("LOAD_CELL_TARE", "0"))
 CALIBRATION_SCALE = float(os.environ.get("LOAD_CELL_SCALE", "-1"))  # e.g. -2100 raw per gram
 SEND_INTERVAL = float(os.environ.get("LOAD_CELL_INTERVAL", "2.0"))
+# Seconds of samples per offline-queue item while the server is unreachable
+OUTBOX_CHUNK_S = float(os.environ.get("OUTBOX_CHUNK_S", "5.0"))
+# Samples per offline-queue item when a failed streaming POST is queued
+SPOOL_MAX_SAMPLES = 800
+
+# Filtering and stable-weight detection
+MEDIAN_WINDOW = int(os.environ.get("LOAD_CELL_MEDIAN", "5"))
+KALMAN_Q = float(os.environ.get("LOAD_CELL_KALMAN_Q", "0.05"))   # process noise (g^2 per sample)
+KALMAN_R = float(os.environ.get("LOAD_CELL_KALMAN_R", "4.0"))    # measurement noise (g^2)
+KALMAN_JUMP_G = float(os.environ.get("LOAD_CELL_JUMP_G", "15"))  # larger changes are taken as-is
+STABLE_WINDOW = int(os.environ.get("LOAD_CELL_STABLE_WINDOW", "40"))  # 0.5 s at 80 Hz
+STABLE_TOLERANCE_G = float(os.environ.get("LOAD_CELL_STABLE_TOLERANCE", "2.0"))
 
 try:
     import requests
@@ -43,44 +84,228 @@ except ImportError:
     sys.exit(1)
 
 
-def read_weight_grams():
-    """Read weight from HX711 load cell. Returns grams, or None if no hardware."""
-    try:
-        # Try hx711 (mpibpc-mroose) – common on Pi
-        from hx711 import HX711
-        import RPi.GPIO as GPIO
-        hx = HX711(dout_pin=DATA_PIN, pd_sck_pin=CLOCK_PIN)
-        hx.reset()
-        raw = hx.get_raw_data(3)
-        GPIO.cleanup()
-        if not raw:
+class HX711Sensor:
+    """HX711 opened once and kept open; read_grams() returns one sample (None on a bad read)."""
+
+    def __init__(self):
+        self._gpio = None
+        try:
+            # Try hx711 (mpibpc-mroose) – common on Pi
+            from hx711 import HX711
+            import RPi.GPIO as GPIO
+            self._hx = HX711(dout_pin=DATA_PIN, pd_sck_pin=CLOCK_PIN)
+            self._hx.reset()
+            self._gpio = GPIO
+            self._read = lambda: _mean(self._hx.get_raw_data(1))
+        except ImportError:
+            # Try hx711_rpi_py (endail) – different API
+            from hx711_rpi_py import HX711 as HX711_RPI
+            self._hx = HX711_RPI(dout=DATA_PIN, pd_sck=CLOCK_PIN)
+            self._read = self._hx.read
+
+    def read_grams(self):
+        try:
+            raw = self._read()
+        except Exception as e:
+            print(f"HX711 read error: {e}", file=sys.stderr)
+            return None
+        if raw is None:
             return None
-        raw_avg = sum(raw) / len(raw)
         if CALIBRATION_SCALE == 0 or CALIBRATION_SCALE == -1:
             return 0.0
-        grams = (raw_avg - CALIBRATION_TARE) / CALIBRATION_SCALE
-        return round(max(0.0, grams), 1)
-    except ImportError:
+        return max(0.0, (raw - CALIBRATION_TARE) / CALIBRATION_SCALE)
+
+    def close(self):
+        if self._gpio is not None:
+            self._gpio.cleanup()
+            self._gpio = None
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+class MockSensor:
+    """Simulated scale at rate_hz: empty, plate placed, eaten in bites, removed; with noise and spikes."""
+
+    def __init__(self, rate_hz=80.0, seed=None):
+        self.period = 1.0 / rate_hz
+        self._rng = random.Random(seed)
+        self._start = time.monotonic()
+        self._next = self._start
+
+    def true_weight(self, t):
+        cycle = t % 40.0
+        if cycle < 3.0 or cycle >= 34.0:
+            return 0.0
+        if cycle < 6.0:
+            return 420.0  # plate + food
+        return 420.0 - 35.0 * min(int((cycle - 6.0) / 4.0) + 1, 6)  # one bite every 4 s
+
+    def read_grams(self):
+        self._next += self.period
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        grams = self.true_weight(time.monotonic() - self._start) + self._rng.gauss(0.0, 1.5)
+        if self._rng.random() < 0.01:
+            grams += self._rng.choice((-1, 1)) * self._rng.uniform(50, 200)  # vibration spike
+        return max(0.0, grams)
+
+    def close(self):
+        pass
+
+
+class MedianFilter:
+    def __init__(self, size=MEDIAN_WINDOW):
+        self._window = deque(maxlen=size)
+
+    def update(self, value):
+        self._window.append(value)
+        ordered = sorted(self._window)
+        return ordered[len(ordered) // 2]
+
+
+class KalmanFilter:
+    """1-D constant-weight Kalman filter; resets to the measurement on a jump larger than jump_g."""
+
+    def __init__(self, q=KALMAN_Q, r=KALMAN_R, jump_g=KALMAN_JUMP_G):
+        self.q, self.r, self.jump_g = q, r, jump_g
+        self.x = None
+        self.p = r
+
+    def update(self, z):
+        if self.x is None or abs(z - self.x) > self.jump_g:
+            self.x, self.p = z, self.r
+            return self.x
+        self.p += self.q
+        k = self.p / (self.p + self.r)
+        self.x += k * (z - self.x)
+        self.p *= 1.0 - k
+        return self.x
+
+
+class StabilityDetector:
+    """Stable once the last `window` filtered samples span at most tolerance_g."""
+
+    def __init__(self, window=STABLE_WINDOW, tolerance_g=STABLE_TOLERANCE_G):
+        self._window = deque(maxlen=window)
+        self.tolerance_g = tolerance_g
+
+    def update(self, grams):
+        self._window.append(grams)
+        return (len(self._window) == self._window.maxlen
+                and max(self._window) - min(self._window) <= self.tolerance_g)
+
+
+def filtered_samples(sensor, duration_s=None):
+    """Yield (unix_ts, grams, stable) for every good sensor read."""
+    median, kalman, stability = MedianFilter(), KalmanFilter(), StabilityDetector()
+    end = time.monotonic() + duration_s if duration_s else None
+    while end is None or time.monotonic() < end:
+        raw = sensor.read_grams()
+        if raw is None:
+            continue
+        grams = kalman.update(median.update(raw))
+        yield time.time(), grams, stability.update(grams)
+
+
+def ndjson_batches(samples, batch_s, request_s, on_sample=None, sent=None):
+    """Chunk body for one streaming POST: NDJSON lines flushed every batch_s, ending after request_s.
+
+    Every sample put in the body is also appended to sent (if given), so the
+    caller can queue them if the POST fails.
+    """
+    end = time.monotonic() + request_s
+    flush_at = time.monotonic() + batch_s
+    lines = []
+    for ts, grams, stable in samples:
+        if on_sample:
+            on_sample(ts, grams, stable)
+        if sent is not None:
+            sent.append((ts, grams, stable))
+        lines.append(json.dumps({"t": round(ts, 4), "g": round(grams, 1), "s": int(stable)}))
+        now = time.monotonic()
+        if now >= flush_at:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+            flush_at = now + batch_s
+            if now >= end:
+                return
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def spool(samples, outbox, scale_id, chunk_s=OUTBOX_CHUNK_S, on_sample=None):
+    """Queue about chunk_s seconds of samples as one offline-queue item; False when samples ran out."""
+    chunk = []
+    end = time.monotonic() + chunk_s
+    for ts, grams, stable in samples:
+        if on_sample:
+            on_sample(ts, grams, stable)
+        chunk.append((ts, grams, stable))
+        if time.monotonic() >= end:
+            break
+    if chunk:
+        outbox.put_readings(scale_id, chunk)
+    return bool(chunk)
+
+
+def stream(samples, server_url, scale_id, batch_s, request_s, session=None, on_sample=None, outbox=None):
+    """POST samples to /api/sensor/stream as chunked NDJSON, reusing one connection; returns when samples run out.
+
+    With an outbox, samples are queued instead while the server is unreachable
+    or a backlog is still uploading (outbox.start_drainer() must be running).
+    """
+    session = session or requests.Session()
+    url = f"{server_url.rstrip('/')}/api/sensor/stream"
+    samples = iter(samples)
+    while True:
+        if outbox is not None and (outbox.last_error or len(outbox)):
+            # Offline, or a backlog is uploading: queue these too so readings arrive in order.
+            # Once only the last chunk or two are left, send them from here and go live again.
+            if not outbox.last_error and len(outbox) <= 2:
+                outbox.drain(server_url, session)
+                continue
+            if not spool(samples, outbox, scale_id, on_sample=on_sample):
+                return
+            continue
+        first = next(samples, None)
+        if first is None:
+            return
+        # Samples of this POST, kept until the server has answered it.
+        sent = []
+
+        def body():
+            # chain(), not a generator, so ending this body doesn't close the sample source
+            yield from ndjson_batches(itertools.chain([first], samples), batch_s, request_s, on_sample, sent)
+
+        error = None
         try:
-            # Try hx711_rpi_py (endail) – different API
-            from hx711_rpi_py import HX711 as HX711_RPI
-            hx = HX711_RPI(dout=DATA_PIN, pd_sck=CLOCK_PIN)
-            raw = hx.read()
-            if raw is None:
-                return None
-            grams = (raw - CALIBRATION_TARE) / CALIBRATION_SCALE if CALIBRATION_SCALE else 0
-            return round(max(0.0, grams), 1)
-        except ImportError:
-            pass
-    except Exception as e:
-        print(f"HX711 read error: {e}", file=sys.stderr)
-    return None
+            r = session.post(url, data=body(), params={"scale_id": scale_id},
+                             headers={"Content-Type": "application/x-ndjson"}, timeout=request_s + 10)
+            if not r.ok:
+                print(f"Stream rejected: {r.status_code} {r.text[:200]}", file=sys.stderr)
+                if r.status_code >= 500:
+                    error = f"HTTP {r.status_code}"
+        except Exception as e:
+            print(f"Stream POST failed: {e}", file=sys.stderr)
+            error = str(e)
+        if error is None:
+            continue
+        if outbox is None:
+            time.sleep(1.0)
+            continue
+        # The server may have buffered part of it; /api/bulk skips samples older than the buffer's latest.
+        for i in range(0, len(sent), SPOOL_MAX_SAMPLES):
+            outbox.put_readings(scale_id, sent[i:i + SPOOL_MAX_SAMPLES])
+        outbox.last_error = error  # queue from now on until the drainer gets through
 
 
-def send_weight(grams):
+def send_weight(grams, session=None):
     url = f"{SERVER_URL.rstrip('/')}/api/sensor/weight"
     try:
-        r = requests.post(url, json={"weight_g": grams}, timeout=3)
+        r = (session or requests).post(url, json={"weight_g": grams}, timeout=3)
         return r.ok
     except Exception as e:
         print(f"POST failed: {e}", file=sys.stderr)
@@ -88,19 +313,66 @@ def send_weight(grams):
 
 
 def main():
+    ap = argparse.ArgumentParser(description="Stream load cell weight to Smart Meal backend")
+    ap.add_argument("--server", default=SERVER_URL)
+    ap.add_argument("--scale-id", default=SCALE_ID)
+    ap.add_argument("--mock", action="store_true", help="Simulated scale instead of the HX711")
+    ap.add_argument("--rate", type=float, default=80.0, help="Mock sample rate (Hz)")
+    ap.add_argument("--batch", type=float, default=0.25, help="Seconds of samples per chunk")
+    ap.add_argument("--request-seconds", type=float, default=30.0, help="Seconds per streaming POST")
+    ap.add_argument("--duration", type=float, default=None, help="Stop after N seconds")
+    ap.add_argument("--legacy", action="store_true", help="One POST to /api/sensor/weight every LOAD_CELL_INTERVAL")
+    ap.add_argument("--outbox", default=OUTBOX_PATH, help="Offline queue file")
+    ap.add_argument("--no-outbox", action="store_true", help="Drop samples while the server is unreachable")
+    args = ap.parse_args()
+
     print("Load cell → Smart Meal backend (same Pi)")
-    print(f"Server: {SERVER_URL}  |  GPIO DT={DATA_PIN} SCK={CLOCK_PIN}")
-    if CALIBRATION_SCALE == -1 or CALIBRATION_SCALE == 0:
-        print("Using mock weight (set LOAD_CELL_SCALE and LOAD_CELL_TARE to calibrate)")
+    print(f"Server: {args.server}  |  scale {args.scale_id}  |  GPIO DT={DATA_PIN} SCK={CLOCK_PIN}")
+    sensor = None
+    if not args.mock:
+        try:
+            sensor = HX711Sensor()
+        except ImportError:
+            print("No HX711 library found; using mock sensor", file=sys.stderr)
+    if sensor is None:
+        sensor = MockSensor(args.rate)
+        print(f"Mock sensor at {args.rate:.0f} Hz")
+    elif CALIBRATION_SCALE == -1 or CALIBRATION_SCALE == 0:
+        print("Uncalibrated: sending 0 g (set LOAD_CELL_SCALE and LOAD_CELL_TARE to calibrate)")
     print("Ctrl+C to stop.\n")
 
-    while True:
-        grams = read_weight_grams()
-        if grams is None:
-            grams = 250.0  # mock when no HX711
-        if send_weight(grams):
-            print(f"Sent {grams} g")
-        time.sleep(SEND_INTERVAL)
+    session = requests.Session()
+    outbox = None
+    if not args.no_outbox:
+        outbox = OfflineQueue(args.outbox)
+        if len(outbox):
+            print(f"{len(outbox)} item(s) queued from an earlier outage; uploading in the background")
+        outbox.start_drainer(args.server)
+    last_print = [0.0]
+
+    def report(ts, grams, stable):
+        if ts - last_print[0] >= 1.0:
+            last_print[0] = ts
+            print(f"{grams:7.1f} g {'stable' if stable else ''}")
+
+    try:
+        samples = filtered_samples(sensor, args.duration)
+        if args.legacy:
+            next_send = 0.0
+            for ts, grams, stable in samples:
+                if ts < next_send:
+                    continue
+                if send_weight(round(grams, 1), session):
+                    print(f"Sent {grams:.1f} g")
+                    next_send = ts + SEND_INTERVAL
+                elif outbox is not None:
+                    outbox.put_readings(args.scale_id, [(ts, grams, stable)])
+                    next_send = ts + SEND_INTERVAL
+        else:
+            stream(samples, args.server, args.scale_id, args.batch, args.request_seconds, session, report,
+                   outbox)
+    finally:
+        sensor.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,261 @@
+"""
+Meal events from the scale's sample stream.
+
+Each scale has a MealEventDetector fed with every ingested sample. A sliding
+window keeps a running sum and sum of squares, so the mean and variance cost
+O(1) per sample. When the window's standard deviation drops below
+STABLE_STD_G the scale is on a plateau; a plateau that differs from the
+previous one by at least MIN_CHANGE_G emits events:
+
+  plate_placed   empty -> loaded
+  food_added     loaded, weight went up
+  food_removed   loaded, weight went down; consumed_g is the drop between plateaus
+  plate_removed  loaded -> empty; consumed_g is the total since plate_placed
+  stable_weight  every new plateau (weight_g, delta_g)
+
+Camera meals are paired with the plateau nearest to the photo (see
+MealEventHub.pair_meal), so a half-placed plate is never logged. Pairing only
+waits for a settling scale that is streaming fast enough to fill its window
+within the wait; a silent or slow (legacy 2 s) scale is answered at once.
+
+Event ids are microsecond timestamps, so they stay unique and ordered when
+several worker processes share events (MealEventHub.observe).
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+STABLE_WINDOW = int(os.environ.get("SENSOR_STABLE_WINDOW", "40"))  # samples; 0.5 s at 80 Hz
+STABLE_STD_G = float(os.environ.get("SENSOR_STABLE_STD_G", "1.0"))
+MIN_CHANGE_G = float(os.environ.get("SENSOR_MIN_CHANGE_G", "5.0"))
+EMPTY_G = float(os.environ.get("SENSOR_EMPTY_G", "10.0"))
+# A photo pairs with a plateau at most this far away in time ...
+PAIR_WINDOW_S = float(os.environ.get("SENSOR_PAIR_WINDOW_S", "30"))
+# ... and waits this long for one if the scale is still settling.
+PAIR_WAIT_S = float(os.environ.get("SENSOR_PAIR_WAIT_S", "3"))
+EVENT_LOG_SIZE = 500
+# A scale silent this long restarts detection from the last known weight
+# (e.g. its next stream went to another worker in the meantime).
+DETECTOR_IDLE_S = 5.0
+
+
+class WindowStats:
+    """Mean and variance of the last `size` values, O(1) per update.
+
+    Sums are kept relative to a reference value (the first sample after a
+    reset) to avoid cancellation with large weights, and rebuilt from the
+    window every `size` * 1000 updates so float error can't accumulate.
+    """
+
+    def __init__(self, size):
+        self._values = deque(maxlen=size)
+        self._ref = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._updates = 0
+
+    def add(self, x):
+        if self._ref is None:
+            self._ref = x
+        if len(self._values) == self._values.maxlen:
+            old = self._values[0] - self._ref
+            self._sum -= old
+            self._sumsq -= old * old
+        self._values.append(x)
+        d = x - self._ref
+        self._sum += d
+        self._sumsq += d * d
+        self._updates += 1
+        if self._updates % (self._values.maxlen * 1000) == 0:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._ref = self._values[-1]
+        self._sum = sum(v - self._ref for v in self._values)
+        self._sumsq = sum((v - self._ref) ** 2 for v in self._values)
+
+    @property
+    def full(self):
+        return len(self._values) == self._values.maxlen
+
+    @property
+    def mean(self):
+        return self._ref + self._sum / len(self._values)
+
+    @property
+    def std(self):
+        n = len(self._values)
+        return math.sqrt(max(0.0, self._sumsq / n - (self._sum / n) ** 2))
+
+
+class MealEventDetector:
+    """Plateau detection for one scale; update() returns the events a sample completes."""
+
+    def __init__(self, window=STABLE_WINDOW, stable_std_g=STABLE_STD_G,
+                 min_change_g=MIN_CHANGE_G, empty_g=EMPTY_G, plateau_g=0.0):
+        self._stats = WindowStats(window)
+        self.stable_std_g = stable_std_g
+        self.min_change_g = min_change_g
+        self.empty_g = empty_g
+        self.plateau_g = plateau_g  # last stable weight (0: the scale starts empty)
+        self.placed_g = plateau_g if plateau_g > empty_g else None  # plateau when the plate went on
+        self.settled = False        # current window is on the last plateau
+        self.last_ts = None
+        self.fed_at = None          # time.monotonic() of the last feed, on this server's clock
+        self._times = deque(maxlen=window)
+
+    def update(self, ts, grams):
+        self.last_ts = ts
+        self._times.append(ts)
+        self._stats.add(grams)
+        if not self._stats.full or self._stats.std > self.stable_std_g:
+            if self._stats.full:
+                self.settled = False
+            return []
+        level = self._stats.mean
+        if abs(level - self.plateau_g) < self.min_change_g:
+            self.settled = True
+            return []
+        return self._new_plateau(ts, level)
+
+    def window_span_s(self):
+        """Seconds a full window of samples spans at the current sample rate (inf if unknown)."""
+        times = self._times
+        if len(times) < 2:
+            return math.inf
+        return (times[-1] - times[0]) * (times.maxlen - 1) / (len(times) - 1)
+
+    def can_settle_within(self, seconds):
+        """False if the scale sent nothing for seconds or samples too slowly to fill a window in them."""
+        return (self.fed_at is not None and time.monotonic() - self.fed_at <= seconds
+                and self.window_span_s() <= seconds)
+
+    def _new_plateau(self, ts, level):
+        prev, self.plateau_g, self.settled = self.plateau_g, level, True
+        loaded, was_loaded = level > self.empty_g, prev > self.empty_g
+        base = {"ts": ts, "weight_g": round(level, 1), "previous_g": round(prev, 1)}
+        events = [dict(base, type="stable_weight", delta_g=round(level - prev, 1))]
+        if loaded and not was_loaded:
+            self.placed_g = level
+            events.append(dict(base, type="plate_placed"))
+        elif was_loaded and not loaded:
+            consumed = (self.placed_g or prev) - prev
+            events.append(dict(base, type="plate_removed", consumed_g=round(max(0.0, consumed), 1)))
+            self.placed_g = None
+        elif level < prev:
+            events.append(dict(base, type="food_removed", consumed_g=round(prev - level, 1)))
+        else:
+            events.append(dict(base, type="food_added", added_g=round(level - prev, 1)))
+        return events
+
+
+class MealEventHub:
+    """Detectors and a bounded event log for every scale; pairs camera meals with plateaus."""
+
+    def __init__(self, log_size=EVENT_LOG_SIZE, last_weight=None):
+        """last_weight(scale_id) -> grams or None seeds a new or idle scale's detector."""
+        self._detectors = {}
+        self._sessions = {}          # scale_id -> meal paired with the plate currently on it
+        self._events = deque(maxlen=log_size)
+        self._ids = set()
+        self._last_id = 0
+        self._last_weight = last_weight
+        self._cond = threading.Condition()
+
+    def feed(self, scale_id, samples):
+        """Run (ts, grams, ...) samples through the scale's detector; returns the new events."""
+        with self._cond:
+            detector = self._detectors.get(scale_id)
+            if (detector is None or detector.last_ts is None
+                    or (samples and samples[0][0] - detector.last_ts > DETECTOR_IDLE_S)):
+                seed = self._last_weight(scale_id) if self._last_weight else None
+                detector = self._detectors[scale_id] = MealEventDetector(plateau_g=seed or 0.0)
+            was_settled = detector.settled
+            detector.fed_at = time.monotonic()
+            new = []
+            for sample in samples:
+                for event in detector.update(sample[0], sample[1]):
+                    new.append(self._log(scale_id, event))
+            if new or detector.settled != was_settled:
+                self._cond.notify_all()
+            return new
+
+    def _log(self, scale_id, event):
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        event["id"] = self._last_id
+        event["scale_id"] = scale_id
+        if event["type"] == "plate_placed":
+            self._sessions.pop(scale_id, None)
+        meal = self._sessions.get(scale_id)
+        if meal is not None and event["type"] != "stable_weight":
+            event["meal"] = meal
+        if event["type"] == "plate_removed":
+            self._sessions.pop(scale_id, None)
+        self._append(event)
+        return event
+
+    def _append(self, event):
+        if len(self._events) == self._events.maxlen:
+            self._ids.discard(self._events[0]["id"])
+        self._events.append(event)
+        self._ids.add(event["id"])
+
+    def observe(self, event):
+        """Add an event raised by another process (no-op for events already logged here)."""
+        with self._cond:
+            if event["id"] in self._ids:
+                return
+            self._append(event)
+            self._cond.notify_all()
+
+    def events(self, scale_id=None, since_id=0, wait_s=0.0):
+        """Events after since_id (optionally one scale), blocking up to wait_s for the first one."""
+        deadline = time.monotonic() + wait_s
+        with self._cond:
+            while True:
+                found = [e for e in self._events
+                         if e["id"] > since_id and (scale_id is None or e["scale_id"] == scale_id)]
+                remaining = deadline - time.monotonic()
+                if found or remaining <= 0:
+                    return found
+                self._cond.wait(remaining)
+
+    def _nearest_plateau(self, scale_id, ts):
+        """Loaded stable_weight event whose plateau (until the next one) is closest to ts."""
+        plateaus = [e for e in self._events if e["scale_id"] == scale_id and e["type"] == "stable_weight"]
+        best, best_dist = None, PAIR_WINDOW_S
+        for i, e in enumerate(plateaus):
+            end = plateaus[i + 1]["ts"] if i + 1 < len(plateaus) else math.inf
+            dist = 0.0 if e["ts"] <= ts < end else min(abs(ts - e["ts"]), abs(ts - end))
+            if e["weight_g"] > EMPTY_G and dist <= best_dist:
+                best, best_dist = e, dist
+        return best
+
+    def pair_meal(self, scale_id, ts=None, wait_s=PAIR_WAIT_S):
+        """Loaded plateau closest to a photo taken at ts, or None.
+
+        If the scale is still settling (e.g. the plate is being put down), waits
+        up to wait_s for the next plateau rather than using a transient weight;
+        not when no sample came within wait_s or the sample rate is too low for
+        a plateau to form in time.
+        """
+        ts = time.time() if ts is None else ts
+        deadline = time.monotonic() + wait_s
+        with self._cond:
+            while True:
+                detector = self._detectors.get(scale_id)
+                if detector is None:
+                    return self._nearest_plateau(scale_id, ts)  # ingested by another worker
+                remaining = deadline - time.monotonic()
+                if detector.settled or remaining <= 0 or not detector.can_settle_within(wait_s):
+                    return self._nearest_plateau(scale_id, ts)
+                self._cond.wait(remaining)
+
+    def attach_meal(self, scale_id, event, meal):
+        """Remember the meal logged for the plate on the scale; later events for it carry meal."""
+        with self._cond:
+            summary = {"food_id": meal["food_id"], "ts": meal["ts"], "weight_g": meal["weight_g"]}
+            event["meal"] = summary
+            self._sessions[scale_id] = summary
@@ -0,0 +1,66 @@
+"""
+Bounded per-scale ring buffers of load-cell readings.
+
+The ingestion endpoint appends every streamed sample here; memory stays fixed
+(READINGS_PER_SCALE samples per scale, oldest dropped first) no matter how
+long a scale streams.
+"""
+import os
+import threading
+from collections import deque
+
+# 80 Hz for 5 minutes
+READINGS_PER_SCALE = int(os.environ.get("SENSOR_BUFFER_SIZE", "24000"))
+
+
+class ScaleReadings:
+    """Ring buffer of (timestamp, grams, stable) for one scale."""
+
+    def __init__(self, capacity=READINGS_PER_SCALE):
+        self._samples = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def extend(self, samples):
+        """Append (ts, grams, stable) tuples in time order."""
+        samples = list(samples)
+        with self._lock:
+            self._samples.extend(samples)
+            self.total += len(samples)
+
+    def latest(self):
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def since(self, ts, limit=None):
+        """Samples newer than ts, oldest first (at most the newest limit of them)."""
+        with self._lock:
+            out = []
+            for sample in reversed(self._samples):
+                if sample[0] <= ts or (limit is not None and len(out) >= limit):
+                    break
+                out.append(sample)
+        out.reverse()
+        return out
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class ReadingStore:
+    """scale_id -> ScaleReadings, created on first sample."""
+
+    def __init__(self, capacity=READINGS_PER_SCALE):
+        self.capacity = capacity
+        self._scales = {}
+        self._lock = threading.Lock()
+
+    def scale(self, scale_id):
+        readings = self._scales.get(scale_id)
+        if readings is None:
+            with self._lock:
+                readings = self._scales.setdefault(scale_id, ScaleReadings(self.capacity))
+        return readings
+
+    def scale_ids(self):
+        return list(self._scales)
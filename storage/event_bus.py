@@ -0,0 +1,103 @@
+"""
+Cross-process event bus for multi-worker deployments.
+
+Each gunicorn worker has its own live-update subscribers and meal-event log,
+so an event raised in one worker must reach the others. SQLiteEventBus
+appends events to a table in the shared SQLite file; every process runs one
+follower thread that polls for new rows (every LIVE_BUS_POLL_MS) and hands
+them to a local callback. Rows older than LIVE_BUS_RETENTION_S are pruned.
+
+Select with LIVE_BUS=local|sqlite (local = in-process only, no bus).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from storage.meal_store import DEFAULT_DB_PATH
+
+POLL_S = float(os.environ.get("LIVE_BUS_POLL_MS", "50")) / 1000
+RETENTION_S = float(os.environ.get("LIVE_BUS_RETENTION_S", "300"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS live_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    name TEXT NOT NULL,
+    user_id TEXT,
+    scale_id TEXT,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SQLiteEventBus:
+    """publish() from any process; follow(callback) delivers every event to this process."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, poll_s=POLL_S, retention_s=RETENTION_S):
+        self.path = path
+        self.poll_s = poll_s
+        self.retention_s = retention_s
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+        self._follow_lock = threading.Lock()
+        self._follower_pid = None
+
+    def _conn(self):
+        # Connections are per thread and per process (never reused across fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def publish(self, name, data, user_id=None, scale_id=None):
+        self._conn().execute(
+            "INSERT INTO live_events (ts, name, user_id, scale_id, data) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), name, user_id, scale_id, json.dumps(data, separators=(",", ":"))),
+        )
+
+    def follow(self, callback):
+        """Start this process's follower thread (once per process); callback(name, data, user_id, scale_id)."""
+        if self._follower_pid == os.getpid():
+            return
+        with self._follow_lock:
+            if self._follower_pid == os.getpid():
+                return
+            last = self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM live_events").fetchone()[0]
+            threading.Thread(target=self._run, args=(callback, last), name="live-bus", daemon=True).start()
+            self._follower_pid = os.getpid()
+
+    def _run(self, callback, last):
+        conn = self._conn()
+        next_prune = 0.0
+        while True:
+            rows = conn.execute(
+                "SELECT id, name, user_id, scale_id, data FROM live_events WHERE id > ? ORDER BY id",
+                (last,),
+            ).fetchall()
+            for row_id, name, user_id, scale_id, data in rows:
+                last = row_id
+                try:
+                    callback(name, json.loads(data), user_id, scale_id)
+                except Exception:
+                    pass  # one bad subscriber must not stop delivery to the rest
+            now = time.time()
+            if now >= next_prune:
+                conn.execute("DELETE FROM live_events WHERE ts < ?", (now - self.retention_s,))
+                next_prune = now + 60
+            if not rows:
+                time.sleep(self.poll_s)
+
+
+def get_event_bus():
+    """Bus selected by LIVE_BUS (local by default: returns None) and SMART_MEAL_DB."""
+    kind = os.environ.get("LIVE_BUS", "local").lower()
+    if kind == "local":
+        return None
+    if kind == "sqlite":
+        return SQLiteEventBus(os.environ.get("SMART_MEAL_DB") or DEFAULT_DB_PATH)
+    raise ValueError(f"Unknown LIVE_BUS: {kind}")
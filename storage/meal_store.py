@@ -0,0 +1,454 @@
+"""
+Persistent meal log shared by the web UI and the REST API.
+
+Meals are appended per user with a per-day key, and each insert also updates a
+precomputed daily aggregate row, so "today's total" is a single indexed lookup
+and resets naturally at local midnight. Weekly (ISO weeks, keyed by their
+Monday) and monthly aggregates are updated the same way, so history() over any
+range reads one row per period instead of the meals. The default backend is SQLite in WAL
+mode (safe with several worker processes); MemoryMealStore keeps the same
+interface for tests and throwaway runs.
+
+Every write also bumps a per-user version counter, so readers can tell in one
+lookup whether anything changed (e.g. to answer HTTP 304). add_meals_once()
+records client-side ids in the same transaction, so a device re-sending an
+upload it never saw acknowledged doesn't log its meals twice.
+
+Select with MEAL_STORE=sqlite|memory and SMART_MEAL_DB=<path>.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+DEFAULT_USER = "default"
+DEFAULT_SCALE = "default"
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "smart_meal.db")
+MACROS = ("calories", "protein", "carbs", "fat")
+GRANULARITIES = ("day", "week", "month")
+
+
+def day_key(ts=None):
+    """Local calendar day (YYYY-MM-DD) for a Unix timestamp."""
+    return time.strftime("%Y-%m-%d", time.localtime(time.time() if ts is None else ts))
+
+
+def period_key(day, granularity):
+    """Key of the period a YYYY-MM-DD day falls in: the day, its week's Monday, or YYYY-MM."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        d = date.fromisoformat(day)
+        return (d - timedelta(days=d.weekday())).isoformat()
+    if granularity == "month":
+        return day[:7]
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def make_meal(food_id, weight_g, nutrition, score, ts=None):
+    """Meal record in the shape the API and templates already use."""
+    return {
+        "food": food_id.replace("_", " ").title(),
+        "food_id": food_id,
+        "weight_g": weight_g,
+        "nutrition": nutrition,
+        "score": score,
+        "ts": time.time() if ts is None else ts,
+    }
+
+
+class MealStore:
+    """Interface shared by index(), /api/meal and /api/daily."""
+
+    def add_meal(self, meal, user_id=DEFAULT_USER):
+        """Append a meal (see make_meal) and update that day's aggregate. Returns the meal."""
+        return self.add_meals([meal], user_id)[0]
+
+    def add_meals(self, meals, user_id=DEFAULT_USER):
+        raise NotImplementedError
+
+    def add_meals_once(self, items):
+        """Idempotent bulk insert of (client_id, user_id, meal or None) in one transaction.
+
+        Each client_id is recorded once; meals of ids seen before are skipped.
+        meal may be None for items that only need their id recorded (e.g. sensor
+        readings). Returns the set of client_ids that were new.
+        """
+        raise NotImplementedError
+
+    def seen_client_ids(self, client_ids):
+        """The subset of client_ids already recorded by add_meals_once()."""
+        raise NotImplementedError
+
+    def daily_summary(self, user_id=DEFAULT_USER, day=None):
+        """Precomputed totals for one day: calories/protein/carbs/fat, meal_count, score_sum."""
+        raise NotImplementedError
+
+    def history(self, user_id=DEFAULT_USER, start=None, end=None, granularity="day"):
+        """Aggregates per day, week or month from start to end (YYYY-MM-DD, inclusive), oldest first.
+
+        Periods are whole: a week or month bucket includes all its days even if
+        start/end fall inside it. Only periods with meals are returned, each as a
+        daily_summary() dict plus "period" (the key from period_key()).
+        """
+        raise NotImplementedError
+
+    def daily_total(self, user_id=DEFAULT_USER, day=None):
+        return self.daily_summary(user_id, day)["calories"]
+
+    def recent_meals(self, user_id=DEFAULT_USER, limit=10):
+        """Newest first."""
+        raise NotImplementedError
+
+    def version(self, user_id=DEFAULT_USER):
+        """Counter that changes whenever user_id's meals do (0 before the first meal)."""
+        raise NotImplementedError
+
+    def set_sensor_weight(self, weight_g, scale_id=DEFAULT_SCALE):
+        raise NotImplementedError
+
+    def get_sensor_weight(self, scale_id=DEFAULT_SCALE):
+        raise NotImplementedError
+
+
+def _empty_summary():
+    return {"calories": 0, "protein": 0, "carbs": 0, "fat": 0, "meal_count": 0, "score_sum": 0}
+
+
+class MemoryMealStore(MealStore):
+    """Process-local store; keeps the newest max_recent meals per user."""
+
+    def __init__(self, max_recent=20):
+        self._recent = defaultdict(lambda: deque(maxlen=max_recent))
+        self._daily = defaultdict(_empty_summary)
+        self._periods = defaultdict(_empty_summary)
+        self._weights = {}
+        self._versions = defaultdict(int)
+        self._client_ids = set()
+        self._lock = threading.Lock()
+
+    def _add(self, meals, user_id):
+        self._versions[user_id] += 1
+        for meal in meals:
+            self._recent[user_id].appendleft(meal)
+            day = day_key(meal["ts"])
+            aggs = [self._daily[(user_id, day)]]
+            aggs += [self._periods[(user_id, g, period_key(day, g))] for g in ("week", "month")]
+            for agg in aggs:
+                for k in MACROS:
+                    agg[k] = round(agg[k] + meal["nutrition"][k], 2)
+                agg["meal_count"] += 1
+                agg["score_sum"] += meal["score"]
+
+    def add_meals(self, meals, user_id=DEFAULT_USER):
+        with self._lock:
+            self._add(meals, user_id)
+        return meals
+
+    def add_meals_once(self, items):
+        new = set()
+        with self._lock:
+            for client_id, user_id, meal in items:
+                if client_id in self._client_ids or client_id in new:
+                    continue
+                new.add(client_id)
+                if meal is not None:
+                    self._add([meal], user_id)
+            self._client_ids |= new
+        return new
+
+    def seen_client_ids(self, client_ids):
+        with self._lock:
+            return {c for c in client_ids if c in self._client_ids}
+
+    def daily_summary(self, user_id=DEFAULT_USER, day=None):
+        with self._lock:
+            return dict(self._daily.get((user_id, day or day_key()), _empty_summary()))
+
+    def history(self, user_id=DEFAULT_USER, start=None, end=None, granularity="day"):
+        first, last = period_key(start or day_key(), granularity), period_key(end or day_key(), granularity)
+        with self._lock:
+            if granularity == "day":
+                rows = [(day, agg) for (u, day), agg in self._daily.items() if u == user_id]
+            else:
+                rows = [(p, agg) for (u, g, p), agg in self._periods.items() if u == user_id and g == granularity]
+            return [dict(agg, period=p) for p, agg in sorted(rows) if first <= p <= last]
+
+    def recent_meals(self, user_id=DEFAULT_USER, limit=10):
+        with self._lock:
+            return list(self._recent[user_id])[:limit]
+
+    def version(self, user_id=DEFAULT_USER):
+        return self._versions.get(user_id, 0)
+
+    def set_sensor_weight(self, weight_g, scale_id=DEFAULT_SCALE):
+        self._weights[scale_id] = weight_g
+
+    def get_sensor_weight(self, scale_id=DEFAULT_SCALE):
+        return self._weights.get(scale_id)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    ts REAL NOT NULL,
+    food_id TEXT NOT NULL,
+    weight_g REAL NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meals_user_id ON meals (user_id, id);
+CREATE INDEX IF NOT EXISTS meals_user_day ON meals (user_id, day);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calories REAL NOT NULL DEFAULT 0,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fat REAL NOT NULL DEFAULT 0,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS period_totals (
+    user_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    period TEXT NOT NULL,
+    calories REAL NOT NULL DEFAULT 0,
+    protein REAL NOT NULL DEFAULT 0,
+    carbs REAL NOT NULL DEFAULT 0,
+    fat REAL NOT NULL DEFAULT 0,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, granularity, period)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meal_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS client_items (
+    client_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sensor_state (
+    scale_id TEXT PRIMARY KEY,
+    weight_g REAL,
+    ts REAL NOT NULL
+);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO daily_totals (user_id, day, calories, protein, carbs, fat, meal_count, score_sum)
+VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT (user_id, day) DO UPDATE SET
+    calories = calories + excluded.calories,
+    protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs,
+    fat = fat + excluded.fat,
+    meal_count = meal_count + 1,
+    score_sum = score_sum + excluded.score_sum
+"""
+
+_UPSERT_PERIOD = """
+INSERT INTO period_totals (user_id, granularity, period, calories, protein, carbs, fat, meal_count, score_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT (user_id, granularity, period) DO UPDATE SET
+    calories = calories + excluded.calories,
+    protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs,
+    fat = fat + excluded.fat,
+    meal_count = meal_count + 1,
+    score_sum = score_sum + excluded.score_sum
+"""
+
+# Rebuilds week/month rows from daily_totals, for databases created before period_totals.
+_BACKFILL_PERIODS = """
+INSERT INTO period_totals (user_id, granularity, period, calories, protein, carbs, fat, meal_count, score_sum)
+SELECT user_id, 'week', date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days'),
+       SUM(calories), SUM(protein), SUM(carbs), SUM(fat), SUM(meal_count), SUM(score_sum)
+FROM daily_totals GROUP BY 1, 3
+UNION ALL
+SELECT user_id, 'month', substr(day, 1, 7),
+       SUM(calories), SUM(protein), SUM(carbs), SUM(fat), SUM(meal_count), SUM(score_sum)
+FROM daily_totals GROUP BY 1, 3
+"""
+
+_SUMMARY_COLUMNS = MACROS + ("meal_count", "score_sum")
+
+
+def _summary(row):
+    summary = dict(zip(_SUMMARY_COLUMNS, row))
+    for k in MACROS:
+        summary[k] = round(summary[k], 2)
+    return summary
+
+
+class SQLiteMealStore(MealStore):
+    """SQLite (WAL) store; one connection per thread, shared file across processes."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM period_totals LIMIT 1").fetchone() is None:
+                conn.execute(_BACKFILL_PERIODS)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self):
+        # Per thread and per process: a connection opened before a fork (gunicorn
+        # preload_app) is never used by the workers.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def _insert(conn, meals, user_id):
+        """Meal rows, day/week/month aggregates and version bump; caller holds the transaction."""
+        rows = []
+        daily = []
+        periods = []
+        for meal in meals:
+            n = meal["nutrition"]
+            day = day_key(meal["ts"])
+            values = (n["calories"], n["protein"], n["carbs"], n["fat"], meal["score"])
+            rows.append((user_id, day, meal["ts"], meal["food_id"], meal["weight_g"]) + values)
+            daily.append((user_id, day) + values)
+            for g in ("week", "month"):
+                periods.append((user_id, g, period_key(day, g)) + values)
+        conn.executemany(
+            "INSERT INTO meals (user_id, day, ts, food_id, weight_g, calories, protein, carbs, fat, score)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany(_UPSERT_DAILY, daily)
+        conn.executemany(_UPSERT_PERIOD, periods)
+        conn.execute(
+            "INSERT INTO meal_versions (user_id, version) VALUES (?, 1)"
+            " ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
+
+    def add_meals(self, meals, user_id=DEFAULT_USER):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, meals, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return meals
+
+    def add_meals_once(self, items):
+        new = set()
+        by_user = defaultdict(list)
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for client_id, user_id, meal in items:
+                cur = conn.execute("INSERT OR IGNORE INTO client_items (client_id, ts) VALUES (?, ?)",
+                                   (client_id, now))
+                if cur.rowcount != 1:
+                    continue
+                new.add(client_id)
+                if meal is not None:
+                    by_user[user_id].append(meal)
+            for user_id, meals in by_user.items():
+                self._insert(conn, meals, user_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return new
+
+    def seen_client_ids(self, client_ids):
+        client_ids = list(client_ids)
+        seen = set()
+        # Chunked to stay under SQLite's host-parameter limit.
+        for i in range(0, len(client_ids), 500):
+            chunk = client_ids[i:i + 500]
+            seen.update(row[0] for row in self._conn().execute(
+                f"SELECT client_id FROM client_items WHERE client_id IN ({','.join('?' * len(chunk))})", chunk))
+        return seen
+
+    def daily_summary(self, user_id=DEFAULT_USER, day=None):
+        row = self._conn().execute(
+            "SELECT calories, protein, carbs, fat, meal_count, score_sum FROM daily_totals"
+            " WHERE user_id = ? AND day = ?",
+            (user_id, day or day_key()),
+        ).fetchone()
+        return _empty_summary() if row is None else _summary(row)
+
+    def history(self, user_id=DEFAULT_USER, start=None, end=None, granularity="day"):
+        first, last = period_key(start or day_key(), granularity), period_key(end or day_key(), granularity)
+        columns = ", ".join(_SUMMARY_COLUMNS)
+        if granularity == "day":
+            rows = self._conn().execute(
+                f"SELECT day, {columns} FROM daily_totals WHERE user_id = ? AND day BETWEEN ? AND ?"
+                " ORDER BY day",
+                (user_id, first, last),
+            )
+        else:
+            rows = self._conn().execute(
+                f"SELECT period, {columns} FROM period_totals"
+                " WHERE user_id = ? AND granularity = ? AND period BETWEEN ? AND ? ORDER BY period",
+                (user_id, granularity, first, last),
+            )
+        return [dict(_summary(row[1:]), period=row[0]) for row in rows]
+
+    def recent_meals(self, user_id=DEFAULT_USER, limit=10):
+        rows = self._conn().execute(
+            "SELECT food_id, weight_g, calories, protein, carbs, fat, score, ts FROM meals"
+            " WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [
+            make_meal(food_id, weight_g, dict(zip(MACROS, (cal, prot, carbs, fat))), score, ts)
+            for food_id, weight_g, cal, prot, carbs, fat, score, ts in rows
+        ]
+
+    def version(self, user_id=DEFAULT_USER):
+        row = self._conn().execute(
+            "SELECT version FROM meal_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def set_sensor_weight(self, weight_g, scale_id=DEFAULT_SCALE):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sensor_state (scale_id, weight_g, ts) VALUES (?, ?, ?)",
+            (scale_id, weight_g, time.time()),
+        )
+
+    def get_sensor_weight(self, scale_id=DEFAULT_SCALE):
+        row = self._conn().execute(
+            "SELECT weight_g FROM sensor_state WHERE scale_id = ?", (scale_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+def get_meal_store():
+    """Store selected by MEAL_STORE (sqlite by default) and SMART_MEAL_DB."""
+    kind = os.environ.get("MEAL_STORE", "sqlite").lower()
+    if kind == "memory":
+        return MemoryMealStore()
+    if kind == "sqlite":
+        return SQLiteMealStore(os.environ.get("SMART_MEAL_DB") or DEFAULT_DB_PATH)
+    raise ValueError(f"Unknown MEAL_STORE: {kind}")
@@ -3,12 +3,22 @@
 #
 # Provides POST /api/analyze-image for the React app (Gemini or OpenAI vision).
 # Requires: GEMINI_API_KEY and/or OPENAI_API_KEY in environment or .env at repo root.
+#
+# Provider clients are created once and reused (pooled connections). Optional:
+#   VISION_ASYNC=1   run provider calls on the shared asyncio loop (provider_pool.py)
+#   VISION_HEDGE=1   also ask the other provider if the first is slower than its p95
+#                    (server-side only: a request can send "hedge": false to opt out, not in)
+#   GEMINI_API_ENDPOINT / OPENAI_BASE_URL   point at a local stand-in server
 
 import base64
 import json
 import os
+import threading
+import time
 from pathlib import Path
 
+from metrics import METRICS_ENABLED, PROVIDER_SECONDS
+
 # Load .env from repo root (parent of web_app) so API keys are available
 try:
     from dotenv import load_dotenv
@@ -17,6 +27,15 @@ try:
 except ImportError:
     pass
 
+GEMINI_MODEL = "gemini-2.0-flash"
+OPENAI_MODEL = "gpt-4o-mini"
+
+VISION_ASYNC = os.environ.get("VISION_ASYNC", "0") == "1"
+VISION_HEDGE = os.environ.get("VISION_HEDGE", "0") == "1"
+VISION_TIMEOUT_S = float(os.environ.get("VISION_TIMEOUT_S", "60"))
+
+API_KEY_ENV = {"gemini": "GEMINI_API_KEY", "openai": "OPENAI_API_KEY"}
+
 PROMPT_TEMPLATE = """Analyze this food image. Based on the provided weight of {weight_g} grams, estimate the nutritional values per this portion: calories, protein (g), carbs (g), fat (g), fiber (g). Return ONLY a single JSON object with keys "name" (string) and "nutrition" (object with keys: calories, protein, carbs, fat, fiber). No markdown, no code block."""
 
 
@@ -52,21 +71,56 @@ def _parse_ai_json(text):
     return {"name": name, "nutrition": nutrition}
 
 
-def analyze_with_gemini(image_base64: str, weight_g: float) -> dict:
-    import io
-    import google.generativeai as genai
-    from PIL import Image
+# Longest side the vision providers need; big JPEGs are draft-decoded down to about this.
+PROVIDER_IMAGE_SIZE = (1024, 1024)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
 
-    api_key = os.environ.get("GEMINI_API_KEY")
+
+def _client(provider, create):
+    """Long-lived client per provider and API key, so connections are pooled across requests."""
+    api_key = os.environ.get(API_KEY_ENV[provider])
     if not api_key:
-        raise ValueError("GEMINI_API_KEY is not set")
+        raise ValueError(f"{API_KEY_ENV[provider]} is not set")
+    key = (provider, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = create(api_key)
+    return client
+
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.0-flash")
+def _create_gemini_model(api_key):
+    import google.generativeai as genai
+
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+def _create_openai_client(api_key):
+    from openai import OpenAI
+
+    # base_url defaults to OPENAI_BASE_URL (if set) inside the SDK.
+    return OpenAI(api_key=api_key)
+
+
+def analyze_with_gemini(image_base64: str, weight_g: float) -> dict:
+    import google.generativeai as genai
+    from ai_model.preprocess import load_image
+
+    model = _client("gemini", _create_gemini_model)
     prompt = PROMPT_TEMPLATE.format(weight_g=weight_g)
 
     image_data = base64.b64decode(image_base64)
-    img = Image.open(io.BytesIO(image_data))
+    img = load_image(image_data, target_size=PROVIDER_IMAGE_SIZE)
 
     response = model.generate_content(
         [prompt, img],
@@ -80,17 +134,11 @@ def analyze_with_gemini(image_base64: str, weight_g: float) -> dict:
 
 
 def analyze_with_openai(image_base64: str, weight_g: float) -> dict:
-    from openai import OpenAI
-
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY is not set")
-
-    client = OpenAI(api_key=api_key)
+    client = _client("openai", _create_openai_client)
     prompt = PROMPT_TEMPLATE.format(weight_g=weight_g)
 
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=OPENAI_MODEL,
         messages=[
             {
                 "role": "user",
@@ -110,6 +158,81 @@ def analyze_with_openai(image_base64: str, weight_g: float) -> dict:
     return _parse_ai_json(text)
 
 
+PROVIDERS = {"gemini": analyze_with_gemini, "openai": analyze_with_openai}
+
+
+def analyze(provider: str, image_base64: str, weight_g: float, hedge: bool = VISION_HEDGE) -> tuple:
+    """Call one provider, directly or through the shared asyncio pool; returns (provider, result).
+
+    With hedge (and both API keys set) the other provider is started if this
+    one is slower than its recent p95, and the first answer wins; the name
+    returned is the provider that answered.
+    """
+    from provider_pool import get_provider_pool
+
+    def call(name):
+        return name, lambda: _timed(name, image_base64, weight_g)
+
+    other = "openai" if provider == "gemini" else "gemini"
+    if hedge and os.environ.get(API_KEY_ENV[other]):
+        return get_provider_pool().hedged(call(provider), call(other), timeout=VISION_TIMEOUT_S)
+    if VISION_ASYNC or hedge:
+        return get_provider_pool().call(*call(provider), timeout=VISION_TIMEOUT_S)
+    return provider, _timed(provider, image_base64, weight_g)
+
+
+def _timed(provider, image_base64, weight_g):
+    """One provider call, its latency recorded for /metrics by outcome (ok / error)."""
+    if not METRICS_ENABLED:
+        return PROVIDERS[provider](image_base64, weight_g)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = PROVIDERS[provider](image_base64, weight_g)
+        outcome = "ok"
+        return result
+    finally:
+        PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, outcome)
+
+
+def analyze_cached(provider: str, image_base64: str, weight_g: float, hedge: bool = VISION_HEDGE) -> tuple:
+    """Run the provider, or answer from the result cache if this photo was seen before.
+
+    Returns (provider that answered, result). Answers are cached under the
+    provider that gave them; with hedge, a cached answer from either provider
+    is used. Cache hits within the same weight bucket are rescaled to the
+    requested weight.
+    """
+    from ai_model.result_cache import cache_key, get_result_cache
+
+    image_bytes = base64.b64decode(image_base64)
+
+    def key(name):
+        return cache_key(image_bytes, name, GEMINI_MODEL if name == "gemini" else OPENAI_MODEL, weight_g)
+
+    cache = get_result_cache()
+    other = "openai" if provider == "gemini" else "gemini"
+    for name in (provider, other) if hedge else (provider,):
+        cached = cache.get(key(name))
+        if cached is not None:
+            return name, _rescale(cached["result"], cached["weight_g"], weight_g)
+
+    answered_by, result = analyze(provider, image_base64, weight_g, hedge)
+    cache.put(key(answered_by), {"weight_g": weight_g, "result": result})
+    return answered_by, result
+
+
+def _rescale(result, from_weight_g, to_weight_g):
+    if not from_weight_g or from_weight_g == to_weight_g:
+        return result
+    factor = to_weight_g / from_weight_g
+    nutrition = {
+        k: round(v * factor, 2) if isinstance(v, (int, float)) else v
+        for k, v in result["nutrition"].items()
+    }
+    return {**result, "nutrition": nutrition}
+
+
 def register_analyze_image(app):
     """Call this from web_app/app.py with your Flask app to add POST /api/analyze-image."""
     from flask import request, jsonify
@@ -139,12 +262,10 @@ def register_analyze_image(app):
             except (TypeError, ValueError):
                 return jsonify({"error": "weightGrams must be a number"}), 400
 
-            if provider == "gemini":
-                result = analyze_with_gemini(image_base64, weight_g)
-            else:
-                result = analyze_with_openai(image_base64, weight_g)
-
-            return jsonify(result)
+            # Hedging can double paid provider calls, so only the server turns it on.
+            hedge = VISION_HEDGE and body.get("hedge", True) is not False
+            answered_by, result = analyze_cached(provider, image_base64, weight_g, hedge)
+            return jsonify({**result, "provider": answered_by})
         except ValueError as e:
             return jsonify({"error": str(e)}), 400
         except json.JSONDecodeError as e:
@@ -1,23 +1,226 @@
 # web_app/app.py – Smart Meal System: Web + IoT API
 
+import argparse
+import base64
+import binascii
+import json
 import os
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+import time
+import zlib
+from datetime import date, timedelta
+from concurrent.futures import TimeoutError as InferenceTimeout
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify
 from nutrition.load_db import load_nutrition_db
-from ai_model.food_classifier import classify_food, get_food_label
-from fusion.calorie_calc import calculate_nutrition
+from ai_model import food_classifier
+from ai_model.food_classifier import (
+    ClassifierDisabled,
+    classification_job,
+    classify_food_batched,
+    classify_foods_batched,
+    classify_regions,
+    get_batcher,
+    get_food_label,
+    get_inference_pool,
+    model_status,
+    queue_stats,
+    submit_classification_job,
+    warm_up,
+    warm_up_in_background,
+)
+from ai_model.inference_pool import InferenceBusy
+from ai_model.model_registry import add_timing_observer
+from ai_model.result_cache import get_result_cache
+from fusion.calorie_calc import calculate_meal_nutrition, calculate_nutrition
+from fusion.food_resolver import FoodResolver
+from fusion.meal_items import detect_items, split_weight
 from health_score.score_logic import compute_health_score
+from sensors.events import MealEventHub
+from sensors.readings import ReadingStore
+from storage.event_bus import get_event_bus
+from storage.meal_store import (
+    DEFAULT_SCALE, DEFAULT_USER, GRANULARITIES, MACROS, day_key, get_meal_store, make_meal,
+)
 
 app = Flask(__name__)
 
 from analyze_image import register_analyze_image
+from http_cache import Payload, VersionedPayloads, not_modified, send
+from live_updates import LivePublisher
+from metrics import REGISTRY, instrument, observe_stage, stage, stats_gauge
+from profiler import register_profiler
+instrument(app)
 register_analyze_image(app)
+register_profiler(app)
+add_timing_observer(observe_stage)
 # Load nutrition database
 db = load_nutrition_db()
+# Classifier label -> DB key (aliases + trigram index), built once
+resolver = FoodResolver(db.keys())
 
-# In-memory state (use Redis/DB in production)
-daily_total = 0
-last_sensor_weight_g = None   # last weight from IoT scale
-recent_meals = []             # list of { food, weight_g, nutrition, score }
+
+def _precompute_static():
+    """Sorted food list and /api/foods body (JSON, gzip, ETag), built once from db.
+
+    The /api/nutrition body decodes every row of the DB, which for a large
+    packed DB is seconds of work and a copy of it on the heap, so it is built
+    on its first request instead.
+    """
+    global food_options, foods_payload, nutrition_payload
+    food_options = sorted(db.keys())
+    foods_payload = Payload({"foods": food_options})
+    nutrition_payload = None
+
+
+_precompute_static()
+# /api/daily bodies per user, rebuilt when the meal store's version, the day or the weight changes
+daily_payloads = VersionedPayloads()
+# /api/history bodies per (user, range, granularity), rebuilt when the user's meals change
+history_payloads = VersionedPayloads()
+# Default range of /api/history when "from" is omitted, in days before "to"
+HISTORY_DEFAULT_DAYS = {"day": 29, "week": 7 * 12 - 1, "month": 365}
+
+
+
+def start_classifier(mode=None):
+    """Load the classifier at startup so the first photo doesn't pay for model load.
+
+    SMART_MEAL_WARMUP: "1" loads before serving (default), "background" loads on
+    a thread while requests are already served, "0" loads on the first photo.
+    Nothing is loaded when classification is disabled (SMART_MEAL_ML=0 / --no-ml).
+    """
+    mode = mode or os.environ.get("SMART_MEAL_WARMUP", "1")
+    if not food_classifier.ML_ENABLED or mode == "0":
+        return
+    if mode == "background":
+        warm_up_in_background()
+    else:
+        warm_up()
+
+
+# Run as a script, __main__ parses --no-ml first and starts it there.
+if __name__ != "__main__":
+    start_classifier()
+
+# Meal log, daily aggregates and last scale weight (SQLite by default; see storage/meal_store.py)
+store = get_meal_store()
+# Recent streamed scale samples, bounded per scale (see sensors/readings.py)
+readings = ReadingStore()
+# Plateau / meal events per scale, fed by every ingested sample (see sensors/events.py)
+meal_events = MealEventHub(last_weight=store.get_sensor_weight)
+# Server-Sent Events fan-out to web / Android clients (GET /api/live); with
+# several workers (LIVE_BUS=sqlite) updates travel between them over a bus.
+live = LivePublisher(bus=get_event_bus())
+
+# Read when /metrics is scraped, never on the request path.
+stats_gauge("smart_meal_result_cache", "Classifier/vision result cache: entries, bytes, hits, misses, evictions.",
+            lambda: get_result_cache().stats(), ("entries", "bytes", "hits", "disk_hits", "misses", "evictions"))
+stats_gauge("smart_meal_inference_queue", "Images waiting for classification and pool rejections so far.",
+            queue_stats, ("batcher_queued", "pool_pending", "pool_max_pending", "pool_rejected"))
+stats_gauge("smart_meal_live_streams", "Open /api/live streams and events dropped for slow clients.",
+            live.stats, ("subscribers", "published", "dropped"))
+REGISTRY.gauge("smart_meal_response_cache_keys", "Cached /api/daily and /api/history bodies.", ("cache",),
+               read=lambda: {("daily",): daily_payloads.stats()["keys"], ("history",): history_payloads.stats()["keys"]})
+REGISTRY.gauge("smart_meal_sensor_buffered_samples", "Scale samples held in memory per scale.", ("scale_id",),
+               read=lambda: {(scale_id,): len(readings.scale(scale_id)) for scale_id in readings.scale_ids()})
+
+
+def _deliver(name, data, user_id, scale_id):
+    """Bus follower: an update published by any worker, delivered in this one."""
+    if name == "scale_event":
+        meal_events.observe(data)
+    live.deliver(name, data, user_id, scale_id)
+
+
+@app.before_request
+def _follow_bus():
+    # Started lazily so it runs in each forked worker, not the preloading master.
+    if live.bus is not None:
+        live.bus.follow(_deliver)
+
+
+def _user_id():
+    """Optional user_id from query string, JSON body or form; defaults to a single shared user."""
+    data = request.get_json(silent=True) or {}
+    return (request.args.get("user_id") or data.get("user_id")
+            or request.form.get("user_id") or DEFAULT_USER)
+
+
+def _scale_id():
+    """Optional scale_id from query string, JSON body, form or X-Scale-Id header."""
+    data = request.get_json(silent=True) or {}
+    return (request.args.get("scale_id") or data.get("scale_id") or request.form.get("scale_id")
+            or request.headers.get("X-Scale-Id") or DEFAULT_SCALE)
+
+
+def _client_id():
+    """Optional X-Client-Id header or client_id form field: the id a Pi reuses if it queues the upload.
+
+    Raises ValueError if it is not 1-64 characters (same rule as /api/bulk ids).
+    """
+    client_id = request.headers.get("X-Client-Id") or request.form.get("client_id")
+    if client_id is not None and not 0 < len(client_id) <= 64:
+        raise ValueError("X-Client-Id must be 1-64 characters")
+    return client_id or None
+
+
+def _scale_weight(scale_id):
+    """(weight_g, plateau event) for a meal without an explicit weight.
+
+    Prefers the loaded plateau nearest to now (waiting briefly if the plate is
+    still settling), then the last sensor weight; (None, None) if neither.
+    """
+    plateau = meal_events.pair_meal(scale_id)
+    if plateau is not None:
+        return plateau["weight_g"], plateau
+    return store.get_sensor_weight(scale_id), None
+
+
+def _record_meal(food_id, weight_g, nutrition, score, user_id, plateau=None, scale_id=DEFAULT_SCALE,
+                 client_id=None):
+    """Append a meal to the store (and to the plateau it was weighed on); returns its display name.
+
+    With a client_id the meal is recorded at most once for that id, also across
+    /api/bulk (a queued copy of an upload whose response was lost).
+    """
+    meal = make_meal(food_id, weight_g, nutrition, score)
+    if client_id is None:
+        meal = store.add_meal(meal, user_id)
+    elif not store.add_meals_once([(client_id, user_id, meal)]):
+        return meal["food"]
+    if plateau is not None:
+        meal_events.attach_meal(scale_id, plateau, meal)
+    live.publish("meal", meal, user_id=user_id)
+    live.publish("daily", store.daily_summary(user_id), user_id=user_id)
+    return meal["food"]
+
+
+def _ingest_samples(scale_id, samples):
+    """Buffer (ts, grams, stable) samples, run meal-event detection and push updates."""
+    readings.scale(scale_id).extend(samples)
+    for event in meal_events.feed(scale_id, samples):
+        live.publish("scale_event", event, scale_id=scale_id)
+    ts, weight_g, stable = samples[-1]
+    store.set_sensor_weight(weight_g, scale_id)
+    live.publish("weight", {"scale_id": scale_id, "weight_g": weight_g, "stable": stable, "t": ts},
+                 scale_id=scale_id)
+
+@app.errorhandler(InferenceBusy)
+def _inference_busy(e):
+    """Inference queue full: 503 so clients back off instead of piling up."""
+    resp = jsonify({"ok": False, "error": "Classifier busy, try again later", "retry_after_s": e.retry_after_s})
+    resp.headers["Retry-After"] = str(e.retry_after_s)
+    return resp, 503
+
+
+@app.errorhandler(InferenceTimeout)
+def _inference_timeout(e):
+    return jsonify({"ok": False, "error": "Classification timed out"}), 504
+
+
+@app.errorhandler(ClassifierDisabled)
+def _classifier_disabled(e):
+    """Sensor-only node: photo endpoints are unavailable, send food_id instead."""
+    return jsonify({"ok": False, "error": str(e)}), 503
 
 # ---------------------------------------------------------------------------
 # Web UI
@@ -25,7 +228,8 @@ recent_meals = []             # list of { food, weight_g, nutrition, score }
 
 @app.route("/", methods=["GET", "POST"])
 def index():
-    global daily_total, recent_meals, last_sensor_weight_g
+    user_id = _user_id()
+    last_sensor_weight_g = store.get_sensor_weight()
     message = ""
     food_name = None
     weight = None
@@ -57,52 +261,44 @@ def index():
             try:
                 nutrition = calculate_nutrition(food_select, weight_g, db)
                 score = compute_health_score(nutrition)
-                daily_total += nutrition["calories"]
-                food_name = food_select.replace("_", " ").title()
+                food_name = _record_meal(food_select, weight_g, nutrition, score, user_id)
                 weight = weight_g
-                recent_meals.insert(0, {
-                    "food": food_name,
-                    "weight_g": weight_g,
-                    "nutrition": nutrition,
-                    "score": score,
-                })
-                recent_meals[:] = recent_meals[:20]
             except ValueError as e:
                 message = str(e) or "Food not in database."
 
         # 2) Image upload (camera / photo)
         if has_image:
-            img_path = f"temp_{uploaded_file.filename}"
+            # Classify straight from the upload bytes (no temp file on disk)
             try:
-                uploaded_file.save(img_path)
-                results = classify_food(img_path)
-                detected_food, confidence = get_food_label(results)
-                if detected_food:
-                    # Map classifier label to DB key (e.g. "apple" -> "apple")
-                    food_id = detected_food.lower().replace(" ", "_")
-                    if food_id not in db:
-                        food_id = next((k for k in db if food_id in k or k in food_id), None)
-                    if food_id:
-                        weight_g = weight_g if weight_g is not None else (last_sensor_weight_g or 100.0)
+                with stage("upload"):
+                    image = uploaded_file.read()
+                with stage("classify_food"):
+                    results = classify_food_batched(image)
+            except InferenceBusy as e:
+                results, message = None, f"Classifier busy, try again in {e.retry_after_s} s."
+            except InferenceTimeout:
+                results, message = None, "Classification timed out, try again."
+            except ClassifierDisabled as e:
+                results, message = None, f"{e}; choose the food from the list."
+            with stage("label_resolution"):
+                detected_food, confidence = get_food_label(results) if results else (None, 0)
+                # Map classifier label to DB key (e.g. "Granny_Smith" -> "apple")
+                food_id = resolver.resolve(detected_food) if detected_food else None
+            if food_id:
+                weight_g = weight_g if weight_g is not None else (last_sensor_weight_g or 100.0)
+                try:
+                    with stage("calculate_nutrition"):
                         nutrition = calculate_nutrition(food_id, weight_g, db)
+                    with stage("health_score"):
                         score = compute_health_score(nutrition)
-                        daily_total += nutrition["calories"]
-                        food_name = food_id.replace("_", " ").title()
-                        weight = weight_g
-                        recent_meals.insert(0, {
-                            "food": food_name,
-                            "weight_g": weight_g,
-                            "nutrition": nutrition,
-                            "score": score,
-                        })
-                        recent_meals[:] = recent_meals[:20]
-                    else:
-                        message = "Food not in database."
-            finally:
-                if os.path.exists(img_path):
-                    os.remove(img_path)
+                    with stage("record_meal"):
+                        food_name = _record_meal(food_id, weight_g, nutrition, score, user_id)
+                    weight = weight_g
+                except ValueError as e:
+                    message = str(e)
+            elif detected_food:
+                message = "Food not in database."
 
-    food_options = sorted(db.keys())
     return render_template(
         "index.html",
         food_options=food_options,
@@ -110,12 +306,12 @@ def index():
         weight=weight,
         nutrition=nutrition,
         score=score,
-        daily_total=daily_total,
+        daily_total=store.daily_total(user_id),
         message=message,
         detected_food=detected_food,
         confidence=confidence,
         last_sensor_weight=last_sensor_weight_g,
-        recent_meals=recent_meals[:5],
+        recent_meals=store.recent_meals(user_id, 5),
     )
 
 
@@ -126,13 +322,13 @@ def index():
 @app.route("/api/sensor/weight", methods=["POST"])
 def api_sensor_weight():
     """IoT scale or device sends current weight (grams)."""
-    global last_sensor_weight_g
     try:
         data = request.get_json(force=True, silent=True) or {}
         w = data.get("weight_g") or data.get("weight")
         if w is not None:
-            last_sensor_weight_g = float(w)
-            return jsonify({"ok": True, "weight_g": last_sensor_weight_g})
+            weight_g = float(w)
+            _ingest_samples(DEFAULT_SCALE, [(time.time(), weight_g, False)])
+            return jsonify({"ok": True, "weight_g": weight_g})
         return jsonify({"ok": False, "error": "Missing weight_g or weight"}), 400
     except (TypeError, ValueError) as e:
         return jsonify({"ok": False, "error": str(e)}), 400
@@ -141,17 +337,107 @@ def api_sensor_weight():
 @app.route("/api/sensor/weight", methods=["GET"])
 def api_sensor_weight_get():
     """Get last weight received from sensor (for UI)."""
-    return jsonify({"weight_g": last_sensor_weight_g})
+    return jsonify({"weight_g": store.get_sensor_weight()})
+
+
+# Samples are applied this many lines at a time while a stream is still open.
+STREAM_FLUSH_LINES = 16
+
+
+@app.route("/api/sensor/stream", methods=["POST"])
+def api_sensor_stream():
+    """Streamed scale samples: NDJSON lines {"t": unix_ts, "g": grams, "s": 0|1}, usually chunked.
+
+    Lines are applied as they arrive, so one long POST keeps the ring buffer and
+    last weight current. ?scale_id= (or X-Scale-Id) picks the scale.
+    """
+    scale_id = request.args.get("scale_id") or request.headers.get("X-Scale-Id") or DEFAULT_SCALE
+    pending, received, bad = [], 0, 0
+
+    def flush():
+        _ingest_samples(scale_id, pending)
+        pending.clear()
+
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            sample = json.loads(line)
+            pending.append((float(sample["t"]), float(sample["g"]), bool(sample.get("s"))))
+        except (KeyError, TypeError, ValueError):
+            bad += 1
+            continue
+        received += 1
+        if len(pending) >= STREAM_FLUSH_LINES:
+            flush()
+    if pending:
+        flush()
+    if not received and bad:
+        return jsonify({"ok": False, "error": "No valid samples", "rejected": bad}), 400
+    return jsonify({"ok": True, "scale_id": scale_id, "received": received, "rejected": bad,
+                    "weight_g": store.get_sensor_weight(scale_id)})
+
+
+@app.route("/api/sensor/readings", methods=["GET"])
+def api_sensor_readings():
+    """Buffered samples for a scale: ?scale_id=&since=<unix_ts>&limit=500."""
+    scale_id = request.args.get("scale_id", DEFAULT_SCALE)
+    try:
+        since = float(request.args.get("since", 0))
+        limit = max(1, min(int(request.args.get("limit", 500)), readings.capacity))
+    except ValueError:
+        return jsonify({"error": "since must be a number and limit an integer"}), 400
+    buf = readings.scale(scale_id)
+    latest = buf.latest()
+    return jsonify({
+        "scale_id": scale_id,
+        "samples": [[t, g, int(s)] for t, g, s in buf.since(since, limit)],
+        "latest": {"t": latest[0], "weight_g": latest[1], "stable": latest[2]} if latest else None,
+        "buffered": len(buf),
+        "total_received": buf.total,
+    })
+
+
+@app.route("/api/sensor/events", methods=["GET"])
+def api_sensor_events():
+    """Meal events after an id: ?scale_id=&since=<event id>&wait=<s, max 30> (long poll)."""
+    try:
+        since = int(request.args.get("since", 0))
+        wait_s = max(0.0, min(float(request.args.get("wait", 0)), 30.0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer and wait a number"}), 400
+    found = meal_events.events(request.args.get("scale_id"), since, wait_s)
+    return jsonify({"events": found, "last_id": found[-1]["id"] if found else since})
+
+
+@app.route("/api/live", methods=["GET"])
+def api_live():
+    """Server-Sent Events: weight, scale_event, meal and daily updates (?user_id=&scale_id=).
+
+    Starts with the current daily summary and weight; weight and daily are
+    coalesced, so a slow client only ever gets the latest value.
+    """
+    user_id = request.args.get("user_id") or DEFAULT_USER
+    scale_id = request.args.get("scale_id")
+    initial = [("daily", store.daily_summary(user_id)),
+               ("weight", {"scale_id": scale_id or DEFAULT_SCALE,
+                           "weight_g": store.get_sensor_weight(scale_id or DEFAULT_SCALE)})]
+    sub = live.subscribe(user_id, scale_id)
+    return Response(live.stream(sub, initial), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.route("/api/meal", methods=["POST"])
 def api_meal():
     """Add a meal: JSON { food_id, weight_g } or multipart with food_image."""
-    global daily_total, recent_meals
-    food_name = None
-    weight = None
-    nutrition = None
-    score = None
+    user_id = _user_id()
+    try:
+        client_id = _client_id()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    # A retry gets its answer before any wait for the scale or classification.
+    if client_id and store.seen_client_ids([client_id]):
+        return _duplicate_response(client_id, user_id)
 
     # JSON body or form: food_id + weight_g
     data = request.get_json(silent=True) or {}
@@ -166,51 +452,278 @@ def api_meal():
         except (TypeError, ValueError):
             weight_g = None
 
-    # Optional: use last sensor weight, else default 100 g
-    if weight_g is None and last_sensor_weight_g is not None:
-        weight_g = last_sensor_weight_g
+    # Optional: use the scale's plateau (or last sensor weight), else default 100 g
+    scale_id, plateau = _scale_id(), None
+    if weight_g is None:
+        weight_g, plateau = _scale_weight(scale_id)
     if weight_g is None:
         weight_g = 100.0
 
     # Multipart: image upload
     if not food_id and request.files:
-        f = request.files.get("food_image") or request.files.get("image")
-        if f and f.filename:
-            path = f"temp_api_{f.filename}"
+        with stage("upload"):
+            f = request.files.get("food_image") or request.files.get("image")
+            image = f.read() if f and f.filename else None
+        if image is not None:
+            food_id = _food_id_from_image(image)
+            if not weight_g:
+                weight_g = 100.0
+
+    return _meal_response(food_id, weight_g, user_id, plateau, scale_id, client_id)
+
+
+@app.route("/api/meal/raw", methods=["POST"])
+def api_meal_raw():
+    """Add a meal from a raw image body (no multipart or base64 to parse).
+
+    Body: JPEG/PNG bytes. Headers: X-Weight-Grams (optional; else scale plateau/weight or 100 g),
+    X-User-Id, X-Scale-Id and X-Client-Id (optional).
+    """
+    user_id = request.headers.get("X-User-Id") or _user_id()
+    try:
+        client_id = _client_id()
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    if client_id and store.seen_client_ids([client_id]):
+        return _duplicate_response(client_id, user_id)
+    with stage("upload"):
+        image = request.get_data(cache=False)
+    if not image:
+        return jsonify({"ok": False, "error": "Empty body; send the image bytes"}), 400
+    weight_g = request.headers.get("X-Weight-Grams")
+    try:
+        weight_g = float(weight_g) if weight_g else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "X-Weight-Grams must be a number"}), 400
+    scale_id, plateau = _scale_id(), None
+    if weight_g is None:
+        weight_g, plateau = _scale_weight(scale_id)
+        weight_g = weight_g or 100.0
+    return _meal_response(_food_id_from_image(image), weight_g, user_id, plateau, scale_id, client_id)
+
+
+@app.route("/api/meal/items", methods=["POST"])
+def api_meal_items():
+    """Add a plate with several foods (e.g. rice and chicken) from one photo.
+
+    Image as the raw body or multipart food_image. The whole plate and its tiles
+    are classified in one batched pass; the weight (X-Weight-Grams or weight_g,
+    else the scale plateau/weight, else 100 g) is split across the detected foods
+    and each is logged as a meal. ?record=0 only returns the breakdown.
+    """
+    user_id = request.headers.get("X-User-Id") or _user_id()
+    f = request.files.get("food_image") or request.files.get("image")
+    image = f.read() if f else request.get_data(cache=False)
+    if not image:
+        return jsonify({"ok": False, "error": "Send the image as the body or as food_image"}), 400
+    weight_g = request.headers.get("X-Weight-Grams") or request.form.get("weight_g")
+    try:
+        weight_g = float(weight_g) if weight_g else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Weight must be a number"}), 400
+    scale_id, plateau = _scale_id(), None
+    if weight_g is None:
+        weight_g, plateau = _scale_weight(scale_id)
+        weight_g = weight_g or 100.0
+    if weight_g <= 0:
+        return jsonify({"ok": False, "error": "Invalid weight"}), 400
+
+    items = detect_items(classify_regions(image), resolver)
+    if not items:
+        return jsonify({"ok": False, "error": "No known food recognized"}), 400
+    try:
+        meal = calculate_meal_nutrition(split_weight(items, weight_g), db)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    for item, detected in zip(meal["items"], items):
+        item["confidence"] = round(detected["score"], 3)
+        item["health_score"] = compute_health_score(item["nutrition"])
+    if request.args.get("record", "1") != "0":
+        for n, item in enumerate(meal["items"]):
+            item["food"] = _record_meal(item["food_id"], item["weight_g"], item["nutrition"],
+                                        item["health_score"], user_id, plateau if n == 0 else None, scale_id)
+    return jsonify({
+        "ok": True,
+        "weight_g": weight_g,
+        "items": meal["items"],
+        "nutrition": meal["total"],
+        "health_score": compute_health_score(meal["total"]),
+        "daily_total_calories": store.daily_total(user_id),
+        "scale_event_id": plateau["id"] if plateau else None,
+    })
+
+
+# Largest /api/bulk body accepted after decompression.
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def _bulk_items():
+    """The request's "items" list; the body may be gzipped (Content-Encoding: gzip)."""
+    raw = request.get_data(cache=False)
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            raw = d.decompress(raw, BULK_MAX_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"Bad gzip body: {e}")
+        if d.unconsumed_tail:
+            raise ValueError("Body too large")
+    elif len(raw) > BULK_MAX_BYTES:
+        raise ValueError("Body too large")
+    items = json.loads(raw)["items"]
+    if not isinstance(items, list):
+        raise ValueError("items must be a list")
+    return items
+
+
+def _parse_bulk_item(item):
+    """Validated copy of one /api/bulk item; raises KeyError/TypeError/ValueError."""
+    client_id = item["id"]
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 64:
+        raise ValueError("id must be a string of 1-64 characters")
+    if item["type"] == "readings":
+        samples = [(float(t), float(g), bool(st)) for t, g, st in item["samples"]]
+        if not samples:
+            raise ValueError("No samples")
+        samples.sort()
+        return {"id": client_id, "type": "readings", "scale_id": str(item.get("scale_id") or DEFAULT_SCALE),
+                "samples": samples}
+    if item["type"] == "meal":
+        meal = {"id": client_id, "type": "meal", "ts": float(item.get("ts") or time.time()),
+                "user_id": str(item.get("user_id") or DEFAULT_USER),
+                "scale_id": str(item.get("scale_id") or DEFAULT_SCALE),
+                "food_id": item.get("food_id"), "image": None, "weight_g": None}
+        if item.get("weight_g") is not None:
+            meal["weight_g"] = float(item["weight_g"])
+        if not meal["food_id"]:
             try:
-                f.save(path)
-                results = classify_food(path)
-                detected, _ = get_food_label(results)
-                if detected:
-                    food_id = detected.lower().replace(" ", "_")
-                    if food_id not in db:
-                        food_id = next((k for k in db if food_id in k or k in food_id), None)
-                if not weight_g:
-                    weight_g = 100.0
-            finally:
-                if os.path.exists(path):
-                    os.remove(path)
+                meal["image"] = base64.b64decode(item["image"], validate=True)
+            except binascii.Error:
+                raise ValueError("image must be base64")
+        return meal
+    raise ValueError(f"Unknown type: {item['type']}")
+
+
+@app.route("/api/bulk", methods=["POST"])
+def api_bulk():
+    """Ingest meals and scale readings queued by a device while it was offline.
+
+    Body (JSON, optionally Content-Encoding: gzip): {"items": [...]}; every item
+    has a client-side "id" and a "type":
+      readings  {"scale_id", "samples": [[t, g, stable], ...]}
+      meal      {"ts", "user_id", "scale_id", "weight_g" (optional), "food_id" or "image" (base64 JPEG)}
+    Ids ingested before are skipped and reported as duplicates, and all new ids
+    are stored in the same transaction as the meals, so re-sending an upload
+    whose response was lost is safe. Readings are applied first, oldest first;
+    a meal without weight_g gets the scale plateau nearest its ts. Every id
+    comes back as accepted, duplicate or rejected (with an error); the device
+    can drop them all.
+    """
+    try:
+        items = _bulk_items()
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": f"Expected JSON {{\"items\": [...]}}: {e}"}), 400
+    parsed, rejected = [], []
+    for item in items:
+        try:
+            parsed.append(_parse_bulk_item(item))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            rejected.append({"id": item.get("id") if isinstance(item, dict) else None, "error": str(e)})
+    seen = store.seen_client_ids(p["id"] for p in parsed)
+    fresh = {}
+    for p in parsed:
+        if p["id"] not in seen:
+            fresh.setdefault(p["id"], p)
+    fresh = list(fresh.values())
+
+    samples_in = 0
+    for p in sorted((p for p in fresh if p["type"] == "readings"), key=lambda p: p["samples"][0][0]):
+        # Samples the live stream already delivered (or an earlier partial upload) are skipped.
+        latest = readings.scale(p["scale_id"]).latest()
+        newer = [sample for sample in p["samples"] if latest is None or sample[0] > latest[0]]
+        if newer:
+            _ingest_samples(p["scale_id"], newer)
+            samples_in += len(newer)
+
+    meals = [p for p in fresh if p["type"] == "meal"]
+    photos = [p for p in meals if not p["food_id"]]
+    if photos:
+        try:
+            for p, results in zip(photos, classify_foods_batched([p["image"] for p in photos])):
+                label, _ = get_food_label(results)
+                p["food_id"] = resolver.resolve(label) if label else None
+        except ClassifierDisabled as e:
+            for p in photos:
+                p["error"] = str(e)
+    entries = []
+    for p in fresh:
+        if p["type"] == "meal":
+            if p["food_id"] not in db:
+                rejected.append({"id": p["id"], "error": p.get("error") or "Unknown food_id or unrecognized image"})
+                continue
+            weight_g = p["weight_g"]
+            if weight_g is None:
+                plateau = meal_events.pair_meal(p["scale_id"], p["ts"], wait_s=0)
+                weight_g = plateau["weight_g"] if plateau else 100.0
+            try:
+                nutrition = calculate_nutrition(p["food_id"], weight_g, db)
+            except ValueError as e:
+                rejected.append({"id": p["id"], "error": str(e)})
+                continue
+            p["meal"] = make_meal(p["food_id"], weight_g, nutrition, compute_health_score(nutrition), p["ts"])
+        entries.append((p["id"], p.get("user_id"), p.get("meal")))
+    accepted = store.add_meals_once(entries)
+
+    users, added = set(), 0
+    for client_id, user_id, meal in entries:
+        if meal is not None and client_id in accepted:
+            live.publish("meal", meal, user_id=user_id)
+            users.add(user_id)
+            added += 1
+    for user_id in users:
+        live.publish("daily", store.daily_summary(user_id), user_id=user_id)
+    return jsonify({
+        "ok": True,
+        "accepted": sorted(accepted),
+        "duplicates": sorted({p["id"] for p in parsed} - accepted - {r["id"] for r in rejected}),
+        "rejected": rejected,
+        "meals": added,
+        "samples": samples_in,
+    })
+
+
+def _food_id_from_image(image_bytes):
+    """Classify an uploaded image and resolve the label to a DB key (or None)."""
+    with stage("classify_food"):
+        results = classify_food_batched(image_bytes)
+    with stage("label_resolution"):
+        detected, _ = get_food_label(results)
+        return resolver.resolve(detected) if detected else None
+
 
+def _duplicate_response(client_id, user_id):
+    """Answer for an upload whose client id was already recorded (a retry after a lost response)."""
+    return jsonify({"ok": True, "duplicate": True, "client_id": client_id,
+                    "daily_total_calories": store.daily_total(user_id)})
+
+
+def _meal_response(food_id, weight_g, user_id, plateau=None, scale_id=DEFAULT_SCALE, client_id=None):
+    """Validate, score and record a meal; JSON response shared by the /api/meal endpoints."""
     if not food_id or food_id not in db:
         return jsonify({"ok": False, "error": "Unknown food_id or missing image"}), 400
     if not weight_g or weight_g <= 0:
         return jsonify({"ok": False, "error": "Invalid or missing weight_g"}), 400
 
     try:
-        nutrition = calculate_nutrition(food_id, weight_g, db)
-        score = compute_health_score(nutrition)
+        with stage("calculate_nutrition"):
+            nutrition = calculate_nutrition(food_id, weight_g, db)
+        with stage("health_score"):
+            score = compute_health_score(nutrition)
     except ValueError as e:
         return jsonify({"ok": False, "error": str(e)}), 400
 
-    daily_total += nutrition["calories"]
-    food_name = food_id.replace("_", " ").title()
-    recent_meals.insert(0, {
-        "food": food_name,
-        "weight_g": weight_g,
-        "nutrition": nutrition,
-        "score": score,
-    })
-    recent_meals[:] = recent_meals[:20]
+    with stage("record_meal"):
+        food_name = _record_meal(food_id, weight_g, nutrition, score, user_id, plateau, scale_id, client_id)
 
     return jsonify({
         "ok": True,
@@ -219,25 +732,175 @@ def api_meal():
         "weight_g": weight_g,
         "nutrition": nutrition,
         "health_score": score,
-        "daily_total_calories": daily_total,
+        "daily_total_calories": store.daily_total(user_id),
+        "scale_event_id": plateau["id"] if plateau else None,
     })
 
 
 @app.route("/api/daily", methods=["GET"])
 def api_daily():
-    """Get today's summary and recent meals."""
-    return jsonify({
-        "daily_total_calories": daily_total,
-        "last_sensor_weight_g": last_sensor_weight_g,
-        "recent_meals": recent_meals[:10],
-    })
+    """Get today's summary and recent meals.
+
+    The ETag is built from the user's meal version and the day, so an unchanged
+    state answers If-None-Match with 304 before any meal is read. The scale weight
+    (last_sensor_weight_g) changes every few seconds and is left out of it: after
+    a 304 the client's copy of it may be stale. Fresh weight comes from
+    /api/sensor/weight or the /api/live weight events.
+    """
+    user_id = _user_id()
+    version, day, weight_g = store.version(user_id), day_key(), store.get_sensor_weight()
+    etag = f"daily-{version}-{day}"
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
+    def build():
+        summary = store.daily_summary(user_id)
+        return {
+            "daily_total_calories": summary["calories"],
+            "daily_summary": summary,
+            "last_sensor_weight_g": weight_g,
+            "recent_meals": store.recent_meals(user_id, 10),
+        }
+
+    return send(daily_payloads.get(user_id, (version, day, weight_g), etag, build))
+
+
+def _with_average(summary):
+    """Rollup row for the API: rounded sums plus avg_score (None without meals)."""
+    row = {k: v for k, v in summary.items() if k != "score_sum"}
+    row["avg_score"] = round(summary["score_sum"] / summary["meal_count"], 1) if summary["meal_count"] else None
+    return row
+
+
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    """Sums and average health score per day, week or month: ?from=2026-01-01&to=2026-03-31&granularity=week.
+
+    Served from the store's incrementally updated rollups (one row per period,
+    no meal scan) and cached per user meal version, with an ETag.
+    """
+    user_id = _user_id()
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    try:
+        end = date.fromisoformat(request.args.get("to") or day_key())
+        start = (date.fromisoformat(request.args["from"]) if request.args.get("from")
+                 else end - timedelta(days=HISTORY_DEFAULT_DAYS[granularity]))
+    except ValueError:
+        return jsonify({"error": "from and to must be dates (YYYY-MM-DD)"}), 400
+    if start > end:
+        return jsonify({"error": "from must not be after to"}), 400
+
+    version = store.version(user_id)
+    etag = f"history-{version}-{start}-{end}-{granularity}"
+    resp = not_modified(etag)
+    if resp is not None:
+        return resp
+
+    def build():
+        periods = store.history(user_id, start.isoformat(), end.isoformat(), granularity)
+        total = {k: round(sum(p[k] for p in periods), 2) for k in MACROS}
+        total["meal_count"] = sum(p["meal_count"] for p in periods)
+        total["score_sum"] = sum(p["score_sum"] for p in periods)
+        return {
+            "user_id": user_id,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "granularity": granularity,
+            "periods": [_with_average(p) for p in periods],
+            "total": _with_average(total),
+        }
+
+    key = (user_id, start, end, granularity)
+    return send(history_payloads.get(key, version, etag, build))
 
 
 @app.route("/api/foods", methods=["GET"])
 def api_foods():
-    """List available foods for dropdowns / Android."""
-    return jsonify({"foods": sorted(db.keys())})
+    """List available foods for dropdowns / Android (precomputed; ETag + gzip)."""
+    return send(foods_payload)
+
+
+@app.route("/api/nutrition", methods=["GET"])
+def api_nutrition():
+    """Full nutrition table per 100 g, keyed by food_id (built on first request; ETag + gzip)."""
+    global nutrition_payload
+    payload = nutrition_payload
+    if payload is None:
+        payload = nutrition_payload = Payload({"foods": {k: db[k] for k in food_options}})
+    return send(payload)
+
+
+@app.route("/api/foods/resolve", methods=["GET"])
+def api_foods_resolve():
+    """Ranked DB keys for a free-text or classifier label: ?label=granny smith&limit=5."""
+    label = request.args.get("label", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 5)), 50))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({
+        "label": label,
+        "matches": [{"food_id": k, "score": s} for k, s in resolver.matches(label, limit)],
+    })
+
+
+@app.route("/api/classify/jobs", methods=["POST"])
+def api_classify_job_submit():
+    """Classify in the background: raw image body (or multipart food_image); 202 with a job id to poll."""
+    f = request.files.get("food_image") or request.files.get("image")
+    image = f.read() if f else request.get_data(cache=False)
+    if not image:
+        return jsonify({"ok": False, "error": "Send the image as the body or as food_image"}), 400
+    job_id = submit_classification_job(image)
+    return jsonify({"ok": True, "job_id": job_id, "status_url": url_for("api_classify_job", job_id=job_id)}), 202
+
+
+@app.route("/api/classify/jobs/<job_id>", methods=["GET"])
+def api_classify_job(job_id):
+    """Job state: 202 while pending; 200 with label, confidence and food_id when done."""
+    status, result = classification_job(job_id)
+    if status is None:
+        return jsonify({"ok": False, "error": "Unknown or expired job"}), 404
+    if status == "pending":
+        return jsonify({"ok": True, "job_id": job_id, "status": "pending"}), 202
+    if status == "error":
+        return jsonify({"ok": False, "job_id": job_id, "status": "error", "error": result}), 500
+    label, confidence = get_food_label(result)
+    return jsonify({
+        "ok": True,
+        "job_id": job_id,
+        "status": "done",
+        "label": label,
+        "confidence": confidence,
+        "food_id": resolver.resolve(label) if label else None,
+        "results": [{"source": s, "label": l, "score": p} for s, l, p in result],
+    })
+
+
+@app.route("/api/model/status", methods=["GET"])
+def api_model_status():
+    """Which classifier backends are loaded, with load and inference timings."""
+    if not food_classifier.ML_ENABLED:
+        return jsonify({"ml_enabled": False, "backends": model_status(), "cache": get_result_cache().stats()})
+    pool = get_inference_pool()
+    return jsonify({
+        "ml_enabled": True,
+        "backends": model_status(),
+        "batching": get_batcher().stats(),
+        "cache": get_result_cache().stats(),
+        "inference_pool": pool.stats() if pool else None,
+    })
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development server; for production use gunicorn -c gunicorn.conf.py (see web_app/wsgi.py).
+    parser = argparse.ArgumentParser(description="Smart Meal web app (development server)")
+    parser.add_argument("--no-ml", action="store_true",
+                        help="sensor-only node: never load a food classifier (same as SMART_MEAL_ML=0)")
+    if parser.parse_args().no_ml:
+        food_classifier.disable_ml()
+    start_classifier()
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG", "1") == "1")
@@ -0,0 +1,89 @@
+# web_app/http_cache.py – precomputed JSON responses with ETag and gzip
+#
+# Payload serializes a JSON document once and keeps its gzip form and an ETag
+# next to it; send() answers If-None-Match with 304 and gzips for clients that
+# accept it, without touching the data again. Static data (food list,
+# nutrition table) is one Payload built at startup; per-user data goes through
+# VersionedPayloads, which rebuilds a key's Payload only when its version
+# (e.g. the meal store's per-user counter) changes.
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Smaller bodies are sent as is: gzip would save less than its own overhead.
+GZIP_MIN_BYTES = int(os.environ.get("HTTP_GZIP_MIN_BYTES", "1024"))
+
+
+class Payload:
+    """One JSON body, its gzip form (when worth it) and its ETag."""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, data, etag=None):
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.etag = etag or hashlib.sha1(self.body).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """304 response if the request's If-None-Match already has etag, else None."""
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.cache_control.no_cache = True
+        return resp
+    return None
+
+
+def send(payload):
+    """Response for payload: 304 if the client has it, gzip if accepted and worth it."""
+    resp = not_modified(payload.etag)
+    if resp is not None:
+        return resp
+    use_gzip = payload.gzipped is not None and request.accept_encodings["gzip"] > 0
+    resp = Response(payload.gzipped if use_gzip else payload.body, mimetype="application/json")
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    if payload.gzipped is not None:
+        resp.vary.add("Accept-Encoding")
+    resp.set_etag(payload.etag)
+    # Clients may keep it but must revalidate; an unchanged resource costs a 304.
+    resp.cache_control.no_cache = True
+    return resp
+
+
+class VersionedPayloads:
+    """Latest Payload per key, rebuilt only when the key's version changes (LRU over max_keys)."""
+
+    def __init__(self, max_keys=1024):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key, version, etag, build):
+        """Payload for key at version; build() returns its data when not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        payload = Payload(build(), etag)
+        with self._lock:
+            self.builds += 1
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return payload
+
+    def stats(self):
+        return {"keys": len(self._entries), "hits": self.hits, "builds": self.builds}
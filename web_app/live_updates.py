@@ -0,0 +1,139 @@
+# web_app/live_updates.py – Server-Sent Events fan-out for live weight, meals and totals
+#
+# One LivePublisher per process. Request handlers publish(); each connected
+# client has a Subscription mailbox and its own SSE generator draining it, so
+# publishing never waits on a client socket.
+#
+# Coalescing: "weight" and "daily" keep only the latest value per client (a
+# slow client skips intermediate weights instead of falling behind); "meal"
+# and "scale_event" are queued, bounded by LIVE_QUEUE_SIZE (oldest dropped).
+#
+# With several worker processes, pass a bus (storage/event_bus.py): publish()
+# then goes through the bus and every worker's follower calls deliver().
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "100"))
+LIVE_HEARTBEAT_S = float(os.environ.get("LIVE_HEARTBEAT_S", "15"))
+# At most one write per client per interval; updates in between are coalesced.
+LIVE_MIN_INTERVAL_S = float(os.environ.get("LIVE_MIN_INTERVAL_S", "0.1"))
+
+COALESCED = frozenset({"weight", "daily"})
+
+
+def format_sse(name, data, event_id=None):
+    out = f"event: {name}\n"
+    if event_id is not None:
+        out += f"id: {event_id}\n"
+    return out + f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """Mailbox for one client: latest coalesced values plus a bounded queue."""
+
+    def __init__(self, user_id=None, scale_id=None, max_queue=LIVE_QUEUE_SIZE):
+        self.user_id = user_id
+        self.scale_id = scale_id
+        self._latest = {}
+        self._queue = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def matches(self, user_id, scale_id):
+        return ((user_id is None or self.user_id is None or user_id == self.user_id)
+                and (scale_id is None or self.scale_id is None or scale_id == self.scale_id))
+
+    def offer(self, name, data):
+        with self._cond:
+            if name in COALESCED:
+                self._latest[name] = data
+            else:
+                if len(self._queue) == self._queue.maxlen:
+                    self.dropped += 1
+                self._queue.append((name, data))
+            self._cond.notify()
+
+    def take(self, timeout):
+        """Pending (name, data) pairs, queued first; [] after timeout or close."""
+        with self._cond:
+            if not (self._queue or self._latest or self.closed):
+                self._cond.wait(timeout)
+            items = list(self._queue) + list(self._latest.items())
+            self._queue.clear()
+            self._latest.clear()
+            return items
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class LivePublisher:
+    """Fans published updates out to every matching subscription."""
+
+    def __init__(self, max_queue=LIVE_QUEUE_SIZE, bus=None):
+        self.max_queue = max_queue
+        self.bus = bus
+        self._subs = ()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, user_id=None, scale_id=None):
+        sub = Subscription(user_id, scale_id, self.max_queue)
+        with self._lock:
+            self._subs = self._subs + (sub,)
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            self._subs = tuple(s for s in self._subs if s is not sub)
+
+    def publish(self, name, data, user_id=None, scale_id=None):
+        """Send to subscribers of user_id / scale_id (None = everyone), in every worker if there is a bus."""
+        self.published += 1
+        if self.bus is not None:
+            self.bus.publish(name, data, user_id, scale_id)
+        else:
+            self.deliver(name, data, user_id, scale_id)
+
+    def deliver(self, name, data, user_id=None, scale_id=None):
+        """Fan out to this process's subscribers."""
+        for sub in self._subs:
+            if sub.matches(user_id, scale_id):
+                sub.offer(name, data)
+
+    def stream(self, sub, initial=(), heartbeat_s=LIVE_HEARTBEAT_S, min_interval_s=LIVE_MIN_INTERVAL_S):
+        """SSE text for one subscription until the client disconnects."""
+        try:
+            yield "retry: 3000\n\n"
+            for name, data in initial:
+                yield format_sse(name, data, next(self._ids))
+            while not sub.closed:
+                started = time.monotonic()
+                items = sub.take(heartbeat_s)
+                if not items:
+                    yield ": ping\n\n"
+                    continue
+                yield "".join(format_sse(name, data, next(self._ids)) for name, data in items)
+                pause = min_interval_s - (time.monotonic() - started)
+                if pause > 0:
+                    time.sleep(pause)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        subs = self._subs
+        return {
+            "subscribers": len(subs),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in subs),
+        }
@@ -0,0 +1,289 @@
+# web_app/metrics.py – in-process latency histograms and gauges for GET /metrics
+#
+# Histograms and counters are plain lists of numbers behind one lock per
+# metric: observing costs a bisect and a few additions, cheap enough to stay
+# on in production. Gauges for caches and queues are read from callbacks when
+# /metrics is scraped, so the hot path never touches them. render() produces
+# the Prometheus text exposition format (version 0.0.4), no client library
+# needed.
+#
+# Each process keeps its own numbers. Under Gunicorn a scrape reaches one
+# worker, which reports itself with a "pid" label on smart_meal_process_info;
+# scrape every worker (or run one) for exact totals. Stages that run in the
+# inference pool's processes (image decode, model inference) are not recorded;
+# the web process still records the whole classify_food stage.
+#
+# Set SMART_MEAL_METRICS=0 to turn recording and the endpoint off.
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, request
+
+METRICS_ENABLED = os.environ.get("SMART_MEAL_METRICS", "1") != "0"
+# Seconds; covers a sub-millisecond DB lookup up to a slow vision provider call.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [count per bucket..., +Inf count, sum]
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *labelvalues):
+        """Context manager observing the seconds its block takes."""
+        return _Timer(self, labelvalues)
+
+    def render(self):
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        lines = []
+        for labelvalues, counts in sorted(series.items()):
+            total = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                total += n
+                le = _labels(self.labelnames, labelvalues, (("le", _number(bound)),))
+                lines.append(f"{self.name}_bucket{le} {total}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in sorted(values.items())]
+
+
+class Gauge:
+    """Value per label set, either set directly or read from a callback at scrape time.
+
+    The callback returns a number, or a dict of {labelvalues tuple: number}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), read=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.read = read
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def render(self):
+        if self.read is not None:
+            try:
+                values = self.read()
+            except Exception:
+                return []
+            if values is None:
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}"
+                for k, v in sorted(values.items()) if v is not None]
+
+
+class MetricsRegistry:
+    """Ordered set of metrics rendered together by /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), read=None):
+        return self.register(Gauge(name, help, labelnames, read))
+
+    def render(self):
+        out = []
+        for metric in self._metrics.values():
+            lines = metric.render()
+            if not lines and metric.kind != "histogram":
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "smart_meal_stage_seconds", "Time spent in one stage of the meal pipeline.", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "smart_meal_http_request_seconds", "HTTP request latency by route.", ("method", "endpoint"))
+REQUESTS = REGISTRY.counter(
+    "smart_meal_http_requests_total", "HTTP requests by route and status code.", ("method", "endpoint", "status"))
+IN_FLIGHT = REGISTRY.gauge(
+    "smart_meal_http_requests_in_flight", "Requests being handled right now.", ("endpoint",))
+PROVIDER_SECONDS = REGISTRY.histogram(
+    "smart_meal_vision_provider_seconds", "Vision provider (Gemini / OpenAI) call latency.", ("provider", "outcome"))
+REGISTRY.gauge("smart_meal_process_info", "Process serving this scrape.", ("pid",),
+               read=lambda: {(os.getpid(),): 1})
+REGISTRY.gauge("smart_meal_process_start_time_seconds", "Unix time the process imported the app.",
+               read=lambda: _START_TIME)
+_START_TIME = time.time()
+
+
+def stage(name):
+    """Context manager timing one pipeline stage: `with stage("classify_food"): ...`."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(STAGE_SECONDS, (name,))
+
+
+def observe_stage(name, seconds):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stats_gauge(name, help, stats, keys, labelname="kind"):
+    """Gauge reading several numeric fields of a stats() dict (e.g. cache hits, entries) as labels."""
+    def read():
+        values = stats()
+        if values is None:
+            return None
+        return {(k,): values.get(k) for k in keys if isinstance(values.get(k), (int, float))}
+    return REGISTRY.gauge(name, help, (labelname,), read=read)
+
+
+def instrument(app):
+    """Time every request of app by route, count in-flight requests, and serve GET /metrics."""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _metrics_start():
+        request.environ["smart_meal.start"] = time.perf_counter()
+        IN_FLIGHT.inc(request.endpoint or "unmatched")
+
+    @app.after_request
+    def _metrics_status(resp):
+        request.environ["smart_meal.status"] = resp.status_code
+        return resp
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        start = request.environ.pop("smart_meal.start", None)
+        if start is None:
+            return
+        endpoint = request.endpoint or "unmatched"
+        IN_FLIGHT.dec(endpoint)
+        if endpoint == "metrics":
+            return
+        # Streaming responses (/api/live) are timed up to their first byte.
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, endpoint)
+        status = request.environ.get("smart_meal.status", 500 if exc else 200)
+        REQUESTS.inc(request.method, endpoint, status)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Prometheus text format: stage and request latency histograms, in-flight requests, caches, queues."""
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
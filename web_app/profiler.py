@@ -0,0 +1,351 @@
+# web_app/profiler.py – on-demand sampling profiler for a live worker
+#
+# Whole-process profiles are sampled: a background thread wakes every
+# PROFILE_INTERVAL_MS, reads every thread's Python stack with
+# sys._current_frames() and counts identical stacks. Nothing is hooked into the
+# code being profiled, so requests run at full speed; the cost is one stack walk
+# per thread per tick while a profile runs, and nothing at all otherwise.
+#
+# Request profiles are sampled the same way, while the request runs, from the
+# thread serving it plus the threads that do its work (the micro-batcher and the
+# vision provider threads, WORKER_THREAD_PREFIXES); a photo request mostly waits
+# on those, and waits are left out. Inference in INFERENCE_PROCESSES pool
+# workers runs in other processes and is not seen; profile with
+# INFERENCE_PROCESSES=0 to include it. A fast request may get only a few
+# samples, so profiling the next K requests to a route adds them up.
+#
+# Admin endpoints (need SMART_MEAL_ADMIN_TOKEN, sent as "Authorization: Bearer
+# <token>" or X-Admin-Token; they answer 404 while it is unset):
+#
+#   POST /admin/profile?seconds=10            whole process for N seconds
+#   POST /admin/profile/requests?route=/api/meal&count=5
+#                                             the next K requests to that route
+#
+# and with the same token, any request sent with "X-Profile: 1" returns its own
+# profile instead of its normal body. Results are JSON with the top functions
+# by self and total time plus collapsed stacks ("a;b;c 12" per line, the input
+# of flamegraph.pl and speedscope; weights are samples); ?format=collapsed (or "X-Profile: collapsed") returns just
+# the collapsed stacks as text.
+#
+# Under Gunicorn only the worker that receives the admin request is profiled.
+
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, jsonify, request
+
+ADMIN_TOKEN = os.environ.get("SMART_MEAL_ADMIN_TOKEN") or None
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "120"))
+PROFILE_TOP = 30
+# Names of the threads that do work on behalf of a request (MicroBatcher, provider_pool)
+WORKER_THREAD_PREFIXES = ("food-batcher", "vision")
+
+# Leaf frames of threads that are blocked waiting, not working; left out unless ?idle=1.
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("base_events.py", "_run_once"),
+}
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is already running in this process."""
+
+
+def _code_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapsed(stacks):
+    """Flamegraph input: one "root;...;leaf weight" line per distinct stack, heaviest first."""
+    return "".join(f"{';'.join(stack)} {round(n)}\n" for stack, n in stacks.most_common() if round(n))
+
+
+def top_functions(stacks, limit=PROFILE_TOP):
+    """Functions by self weight (leaf of a stack), with total weight (anywhere in a stack)."""
+    own, total = Counter(), Counter()
+    for stack, n in stacks.items():
+        own[stack[-1]] += n
+        for name in set(stack):
+            total[name] += n
+    weight = sum(stacks.values()) or 1
+    return [
+        {"function": name, "self": round(n, 1), "self_pct": round(100.0 * n / weight, 1),
+         "total": round(total[name], 1), "total_pct": round(100.0 * total[name] / weight, 1)}
+        for name, n in own.most_common(limit)
+    ]
+
+
+def _result(stacks, unit, seconds, **extra):
+    return {
+        **extra,
+        "seconds": round(seconds, 3),
+        "unit": unit,
+        "weight": round(sum(stacks.values()), 1),
+        "top_self": top_functions(stacks),
+        "collapsed": collapsed(stacks),
+    }
+
+
+def worker_threads():
+    """Ids of the live threads named with a WORKER_THREAD_PREFIXES prefix."""
+    return {t.ident for t in threading.enumerate() if t.name.startswith(WORKER_THREAD_PREFIXES)}
+
+
+class StackSampler:
+    """Counts the Python stacks of all threads (but exclude) every interval_s.
+
+    With include, a callable returning a set of thread ids, only those threads
+    are sampled (checked on every tick).
+    """
+
+    def __init__(self, interval_s, exclude=(), idle=False, include=None):
+        self.interval_s = interval_s
+        self.exclude = set(exclude)
+        self.idle = idle
+        self.include = include
+        self.stacks = Counter()
+        self.ticks = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.elapsed_s = 0.0
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (_code_label(code), (os.path.basename(code.co_filename), code.co_name))
+        return label
+
+    def sample(self):
+        """Take one sample of every selected thread now."""
+        me = threading.get_ident()
+        include = self.include() if self.include is not None else None
+        for ident, frame in sys._current_frames().items():
+            if ident == me or ident in self.exclude or (include is not None and ident not in include):
+                continue
+            if not self.idle and self._label(frame.f_code)[1] in IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code)[0])
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+        self.ticks += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; calling it again does nothing."""
+        if self._stop.is_set():
+            return self
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed_s = time.perf_counter() - self._started
+        return self
+
+    def result(self, **extra):
+        return _result(self.stacks, "samples", self.elapsed_s, **extra,
+                       interval_ms=self.interval_s * 1000, ticks=self.ticks)
+
+
+class RouteProfile:
+    """Samples the next count requests to one route, with their worker threads, and adds up their stacks.
+
+    One sampler runs for the whole profile and samples only while a request to
+    the route is being served.
+    """
+
+    def __init__(self, route, count, interval_s=PROFILE_INTERVAL_MS / 1000):
+        self.route = route
+        self.count = count
+        self.seconds = 0.0
+        self.finished = 0
+        self.done = threading.Event()
+        self._active = {}  # thread id -> requests to the route it is serving (>1 only if one nests)
+        self._lock = threading.Lock()
+        self.sampler = StackSampler(interval_s, include=self._threads)
+
+    def _threads(self):
+        with self._lock:
+            active = set(self._active)
+        return active | worker_threads() if active else set()
+
+    def begin(self):
+        """Sample the calling thread until end(); False once enough requests were seen."""
+        ident = threading.get_ident()
+        with self._lock:
+            if self.finished + len(self._active) >= self.count:
+                return False
+            self._active[ident] = self._active.get(ident, 0) + 1
+            return True
+
+    def end(self, seconds):
+        ident = threading.get_ident()
+        with self._lock:
+            if self._active.get(ident, 0) > 1:
+                self._active[ident] -= 1
+            else:
+                self._active.pop(ident, None)
+            self.seconds += seconds
+            self.finished += 1
+            if self.finished >= self.count:
+                self.done.set()
+
+
+_busy = threading.Lock()
+_route_profile = None
+
+
+def authorized():
+    """True if the request carries the admin token (never when none is configured)."""
+    if ADMIN_TOKEN is None:
+        return False
+    auth = request.headers.get("Authorization", "")
+    token = auth[7:] if auth.startswith("Bearer ") else request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _admin_error():
+    if ADMIN_TOKEN is None:
+        return jsonify({"error": "Not found"}), 404
+    resp = jsonify({"error": "Admin token required"})
+    resp.headers["WWW-Authenticate"] = "Bearer"
+    return resp, 401
+
+
+def _float_arg(name, default, low, high):
+    return max(low, min(float(request.args.get(name, default)), high))
+
+
+def _profile_response(result, fmt):
+    if fmt == "collapsed":
+        return Response(result["collapsed"], mimetype="text/plain")
+    return jsonify(result)
+
+
+def profile_process(seconds, interval_s=PROFILE_INTERVAL_MS / 1000, idle=False):
+    """Sample every thread (except the caller) for seconds; returns the result dict."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        sampler = StackSampler(interval_s, exclude={threading.get_ident()}, idle=idle).start()
+        time.sleep(seconds)
+        return sampler.stop().result(mode="process", pid=os.getpid())
+    finally:
+        _busy.release()
+
+
+def profile_route(route, count, timeout_s):
+    """Sample the next count requests to route (a URL rule like /api/meal), or those within timeout_s."""
+    global _route_profile
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        profile = RouteProfile(route, count)
+        profile.sampler.start()
+        _route_profile = profile
+        try:
+            profile.done.wait(timeout_s)
+        finally:
+            _route_profile = None
+            profile.sampler.stop()
+        with profile._lock:
+            return _result(profile.sampler.stacks, "samples", profile.seconds, mode="route", route=route,
+                           requests=profile.finished, requested=count, pid=os.getpid(),
+                           interval_ms=profile.sampler.interval_s * 1000, ticks=profile.sampler.ticks)
+    finally:
+        _busy.release()
+
+
+def register_profiler(app):
+    """Add the /admin/profile endpoints and the X-Profile request header to app."""
+
+    @app.errorhandler(ProfilerBusy)
+    def _profiler_busy(e):
+        return jsonify({"error": str(e)}), 409
+
+    @app.route("/admin/profile", methods=["POST"])
+    def admin_profile():
+        """Sample the whole process: ?seconds=10&interval_ms=5&idle=0&format=json|collapsed."""
+        if not authorized():
+            return _admin_error()
+        try:
+            seconds = _float_arg("seconds", 10, 0.1, PROFILE_MAX_SECONDS)
+            interval_s = _float_arg("interval_ms", PROFILE_INTERVAL_MS, 0.5, 1000) / 1000
+        except ValueError:
+            return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+        result = profile_process(seconds, interval_s, request.args.get("idle") == "1")
+        return _profile_response(result, request.args.get("format"))
+
+    @app.route("/admin/profile/requests", methods=["POST"])
+    def admin_profile_requests():
+        """Profile the next requests to a route: ?route=/api/meal&count=5&timeout=60&format=json|collapsed."""
+        if not authorized():
+            return _admin_error()
+        route = request.args.get("route", "")
+        if not any(rule.rule == route for rule in app.url_map.iter_rules()):
+            return jsonify({"error": f"Unknown route: {route!r} (use the URL rule, e.g. /api/meal)"}), 400
+        try:
+            count = max(1, min(int(request.args.get("count", 1)), 1000))
+            timeout_s = _float_arg("timeout", 60, 0.1, PROFILE_MAX_SECONDS)
+        except ValueError:
+            return jsonify({"error": "count and timeout must be numbers"}), 400
+        result = profile_route(route, count, timeout_s)
+        return _profile_response(result, request.args.get("format"))
+
+    @app.before_request
+    def _profile_start():
+        profile = _route_profile
+        if (profile is not None and request.url_rule is not None and request.url_rule.rule == profile.route
+                and profile.begin()):
+            g.route_profile = (profile, time.perf_counter())
+        mode = request.headers.get("X-Profile")
+        if mode and mode != "0" and authorized():
+            g.request_profile_format = mode
+            me = threading.get_ident()
+            g.request_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000,
+                                             include=lambda: worker_threads() | {me}).start()
+
+    @app.after_request
+    def _profile_finish(resp):
+        sampler = g.pop("request_sampler", None)
+        if sampler is None:
+            return resp
+        result = sampler.stop().result(mode="request", path=request.path, status=resp.status_code,
+                                       response_bytes=resp.calculate_content_length())
+        out = _profile_response(result, g.pop("request_profile_format"))
+        out.headers["X-Profiled-Status"] = str(resp.status_code)
+        return out
+
+    @app.teardown_request
+    def _profile_teardown(exc):
+        # Runs even when the request raised, so no sampler or route slot is left behind.
+        sampler = g.pop("request_sampler", None)
+        if sampler is not None:
+            sampler.stop()
+        route = g.pop("route_profile", None)
+        if route is not None:
+            profile, started = route
+            profile.end(time.perf_counter() - started)
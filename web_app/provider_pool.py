@@ -0,0 +1,140 @@
+# web_app/provider_pool.py – asyncio runner for AI vision provider calls
+#
+# One background event loop (own thread) runs every provider call, with a
+# bounded thread pool for the blocking SDK requests. Flask workers submit a
+# call and wait on its future; concurrency towards the providers is capped by
+# VISION_MAX_CONCURRENCY.
+#
+# Hedged mode: start the primary provider; if it has not answered within its
+# own recent latency percentile (VISION_HEDGE_PERCENTILE, default p95), also
+# start the secondary and return whichever succeeds first.
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENCY = int(os.environ.get("VISION_MAX_CONCURRENCY", "8"))
+HEDGE_PERCENTILE = float(os.environ.get("VISION_HEDGE_PERCENTILE", "95"))
+# Hedge delay used until a provider has enough latency samples, and its bounds.
+HEDGE_DEFAULT_DELAY_S = float(os.environ.get("VISION_HEDGE_DELAY_S", "2.0"))
+HEDGE_MIN_DELAY_S = 0.25
+HEDGE_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+        return samples[idx]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class ProviderPool:
+    """Runs provider callables on a shared event loop, optionally hedged."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="vision")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="vision-loop", daemon=True)
+        self._thread.start()
+        self._latency = {}
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    def latency(self, name):
+        return self._latency.setdefault(name, LatencyTracker())
+
+    def hedge_delay(self, name):
+        tracker = self.latency(name)
+        if len(tracker) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_S
+        return max(HEDGE_MIN_DELAY_S, tracker.percentile(HEDGE_PERCENTILE))
+
+    async def _call(self, name, fn):
+        start = time.perf_counter()
+        result = await self._loop.run_in_executor(self._executor, fn)
+        self.latency(name).record(time.perf_counter() - start)
+        return name, result
+
+    async def call_async(self, name, fn):
+        """Await fn() (a blocking provider call) on the pool; returns (name, result)."""
+        return await self._call(name, fn)
+
+    async def hedged_async(self, primary, secondary):
+        """primary and secondary are (name, fn). Returns (name, result) of the first success."""
+        first = asyncio.ensure_future(self._call(*primary))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(primary[0]))
+        if done and first.exception() is None:
+            return first.result()
+        self.hedges_started += 1
+        pending = {first, asyncio.ensure_future(self._call(*secondary))} - done
+        errors = [first.exception()] if done else []
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task.result()[0] == secondary[0]:
+                        self.hedges_won += 1
+                    return task.result()
+                errors.append(task.exception())
+        raise errors[0]
+
+    def call(self, name, fn, timeout=None):
+        """Blocking call_async() for Flask workers."""
+        fut = asyncio.run_coroutine_threadsafe(self.call_async(name, fn), self._loop)
+        return fut.result(timeout=timeout)
+
+    def hedged(self, primary, secondary, timeout=None):
+        """Blocking hedged_async() for Flask workers."""
+        fut = asyncio.run_coroutine_threadsafe(self.hedged_async(primary, secondary), self._loop)
+        return fut.result(timeout=timeout)
+
+    def stats(self):
+        return {
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+            "latency_p50_s": {n: t.percentile(50) for n, t in self._latency.items()},
+            "latency_p95_s": {n: t.percentile(95) for n, t in self._latency.items()},
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_provider_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProviderPool()
+    return _pool
+
+
+def _reset_pool():
+    # The event loop thread doesn't survive fork (gunicorn preload_app).
+    global _pool
+    _pool = None
+
+
+os.register_at_fork(after_in_child=_reset_pool)
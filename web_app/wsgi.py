@@ -0,0 +1,25 @@
+# web_app/wsgi.py – production entry point
+#
+#   gunicorn -c gunicorn.conf.py          (from the repo root)
+#
+# With gunicorn's preload_app the master imports this once: the nutrition DB,
+# resolver and classifier are loaded before forking and shared copy-on-write
+# by every worker. Meals, daily totals and scale weights live in the shared
+# SQLite store; live updates and meal events cross workers over the SQLite
+# event bus (LIVE_BUS=sqlite, set automatically when WEB_WORKERS > 1).
+
+import os
+
+
+def create_app():
+    """Configured Flask app for a WSGI server (the app module is imported once per process)."""
+    workers = int(os.environ.get("WEB_WORKERS", "1"))
+    if workers > 1:
+        if os.environ.get("MEAL_STORE", "sqlite").lower() == "memory":
+            raise RuntimeError("MEAL_STORE=memory is per process; use sqlite with more than one worker")
+        os.environ.setdefault("LIVE_BUS", "sqlite")
+    import app as web_app
+    return web_app.app
+
+
+app = application = create_app()